@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Rolling-origin backtesting engine for Chronos Bolt.
+
+Evaluates an exported model (or the eager wrapper) over thousands of forecast
+origins per series without re-parsing or re-copying the history per window:
+1. All series are written once into a memory-mapped float32 array [S, L + T]
+   whose first L = context_length columns are NaN, so the context for origin t
+   is simply columns [t, t + L).
+2. Context and target windows are strided zero-copy views over that array
+   (np.lib.stride_tricks.sliding_window_view + basic slicing). Only the batch
+   handed to the model is gathered into a contiguous buffer.
+3. Quantile (pinball) loss and MASE are scored vectorized per batch.
+4. Contiguous chunks of series are spread across a process pool; each worker
+   loads the model once and opens the memmap read-only.
+
+Example:
+    python backtest.py --csv daily.csv --id-column store --value-column sales \\
+        --time-column date --backend onnx --model-path model/chronos-bolt-tiny-dynbatch.onnx \\
+        --stride 7 --workers 8 --output backtest_metrics.csv
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from extract_chronos import STATIC_CONTEXT_LENGTH
+from batch_forecast import BACKENDS, load_long_series, make_predictor
+
+# Chronos Bolt quantile heads (quantile_preds dim 1)
+QUANTILE_LEVELS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+MEDIAN_INDEX = QUANTILE_LEVELS.index(0.5)
+
+
+# -------------------------------------------------------------------------
+# MEMORY-MAPPED SERIES ARRAY
+# -------------------------------------------------------------------------
+def write_backtest_array(series_list, work_dir, context_length=STATIC_CONTEXT_LENGTH):
+    """
+    Writes series into values.npy [S, context_length + T_max] (NaN prefix and
+    right-padding) plus lengths.npy [S]. Returns (values_path, lengths_path).
+    """
+    os.makedirs(work_dir, exist_ok=True)
+    lengths = np.array([len(s) for s in series_list], dtype=np.int64)
+    values_path = os.path.join(work_dir, "values.npy")
+    lengths_path = os.path.join(work_dir, "lengths.npy")
+
+    values = np.lib.format.open_memmap(
+        values_path, mode="w+", dtype=np.float32,
+        shape=(len(series_list), context_length + int(lengths.max(initial=0))),
+    )
+    values[:] = np.nan
+    for row, series in enumerate(series_list):
+        values[row, context_length:context_length + len(series)] = series
+    values.flush()
+    del values
+    np.save(lengths_path, lengths)
+    return values_path, lengths_path
+
+
+# -------------------------------------------------------------------------
+# SCORING
+# -------------------------------------------------------------------------
+def mase_scale_cumsums(history, season):
+    """
+    Cumulative sums of the in-sample seasonal-naive errors |x_t - x_{t-m}|, so the
+    MASE scale for any origin t is cum_err[:, t] / cum_count[:, t] in O(1).
+    history: [n, T] -> (cum_err, cum_count), each [n, T + 1]
+    """
+    diffs = np.abs(history[:, season:] - history[:, :-season])
+    valid = ~np.isnan(diffs)
+    diffs = np.where(valid, diffs, 0.0)
+    pad = np.zeros((history.shape[0], season + 1), dtype=np.float64)
+    cum_err = np.concatenate([pad, np.cumsum(diffs, axis=1, dtype=np.float64)], axis=1)
+    cum_count = np.concatenate([pad, np.cumsum(valid, axis=1, dtype=np.float64)], axis=1)
+    return cum_err, cum_count
+
+def score_batch(preds, targets, scales, quantile_levels=QUANTILE_LEVELS):
+    """
+    preds [B, Q, H], targets [B, H] (NaN = missing), scales [B].
+    Returns per-window (pinball_sum, abs_target_sum, mase, n_points).
+    """
+    levels = np.asarray(quantile_levels, dtype=np.float32)[None, :, None]
+    observed = ~np.isnan(targets)
+    y = np.where(observed, targets, 0.0)
+
+    diff = y[:, None, :] - preds
+    pinball = np.maximum(levels * diff, (levels - 1.0) * diff)
+    pinball_sum = (pinball * observed[:, None, :]).sum(axis=(1, 2))
+
+    n_points = observed.sum(axis=1)
+    abs_error = np.abs(y - preds[:, MEDIAN_INDEX, :]) * observed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mae = abs_error.sum(axis=1) / n_points
+        mase = mae / scales
+    return pinball_sum, np.abs(y).sum(axis=1), mase, n_points
+
+
+# -------------------------------------------------------------------------
+# WORKER
+# -------------------------------------------------------------------------
+_WORKER = {}
+
+def _init_worker(backend, model_path, threads):
+    if threads:
+        import torch
+        torch.set_num_threads(threads)
+    _WORKER["predict"], _WORKER["static_batch"] = make_predictor(backend, model_path)
+
+def backtest_chunk(values_path, lengths_path, row_start, row_stop, context_length, horizon,
+                   stride, min_history, season, batch_size):
+    """Backtests series rows [row_start, row_stop). Returns per-series aggregates."""
+    predict, static_batch = _WORKER["predict"], _WORKER["static_batch"]
+    if static_batch is not None:
+        batch_size = static_batch
+
+    values = np.load(values_path, mmap_mode="r")[row_start:row_stop]
+    lengths = np.load(lengths_path)[row_start:row_stop]
+    n_rows = values.shape[0]
+    total_length = values.shape[1] - context_length
+
+    # Origins t = min_history, min_history + stride, ... (series coordinates)
+    origins = np.arange(min_history, total_length - horizon + 1, stride)
+    stats = {
+        "pinball_sum": np.zeros(n_rows), "abs_target_sum": np.zeros(n_rows),
+        "mase_sum": np.zeros(n_rows), "n_windows": np.zeros(n_rows, dtype=np.int64),
+    }
+    if origins.size == 0:
+        return row_start, stats
+
+    stop = origins[-1] + 1
+    # Zero-copy views: contexts [n, K, L] and targets [n, K, H] over the memmap
+    contexts = sliding_window_view(values, context_length, axis=1)[:, min_history:stop:stride]
+    targets = sliding_window_view(values, horizon, axis=1)[:, context_length + min_history:context_length + stop:stride]
+
+    cum_err, cum_count = mase_scale_cumsums(values[:, context_length:], season)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scales = cum_err[:, origins] / cum_count[:, origins]
+
+    valid = (origins[None, :] + horizon <= lengths[:, None]) & (scales > 0)
+    rows, windows = np.nonzero(valid)
+
+    for start in range(0, rows.size, batch_size):
+        r, w = rows[start:start + batch_size], windows[start:start + batch_size]
+        n_valid = r.size
+        batch = np.ascontiguousarray(contexts[r, w], dtype=np.float32)
+        if static_batch is not None and n_valid < static_batch:
+            padding = np.full((static_batch - n_valid, context_length), np.nan, dtype=np.float32)
+            batch = np.concatenate([batch, padding])
+        preds = predict(batch)[:n_valid, :, :horizon]
+
+        pinball_sum, abs_target_sum, mase, _ = score_batch(preds, targets[r, w], scales[r, w])
+        np.add.at(stats["pinball_sum"], r, pinball_sum)
+        np.add.at(stats["abs_target_sum"], r, abs_target_sum)
+        np.add.at(stats["mase_sum"], r, np.nan_to_num(mase))
+        np.add.at(stats["n_windows"], r, 1)
+    return row_start, stats
+
+def _backtest_chunk_star(args):
+    return backtest_chunk(*args)
+
+
+# -------------------------------------------------------------------------
+# DRIVER
+# -------------------------------------------------------------------------
+def run_backtest(values_path, lengths_path, backend, model_path, context_length=STATIC_CONTEXT_LENGTH,
+                 horizon=12, stride=1, min_history=32, season=1, batch_size=256, workers=1,
+                 threads_per_worker=None, rows_per_chunk=None):
+    n_series = np.load(lengths_path).shape[0]
+    rows_per_chunk = rows_per_chunk or max(1, int(np.ceil(n_series / (4 * workers))))
+    chunks = [
+        (values_path, lengths_path, start, min(start + rows_per_chunk, n_series), context_length,
+         horizon, stride, min_history, season, batch_size)
+        for start in range(0, n_series, rows_per_chunk)
+    ]
+
+    totals = {
+        "pinball_sum": np.zeros(n_series), "abs_target_sum": np.zeros(n_series),
+        "mase_sum": np.zeros(n_series), "n_windows": np.zeros(n_series, dtype=np.int64),
+    }
+    print(f"[Info] Backtesting {n_series} series in {len(chunks)} chunks on {workers} worker(s)...")
+    t0 = time.perf_counter()
+    if workers <= 1:
+        _init_worker(backend, model_path, threads_per_worker)
+        results = map(_backtest_chunk_star, chunks)
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker,
+                                   initargs=(backend, model_path, threads_per_worker or 1))
+        results = pool.map(_backtest_chunk_star, chunks)
+    for row_start, stats in results:
+        for key, value in stats.items():
+            totals[key][row_start:row_start + value.shape[0]] += value
+    if workers > 1:
+        pool.shutdown()
+    elapsed = time.perf_counter() - t0
+
+    n_windows = int(totals["n_windows"].sum())
+    print(f"[Success] {n_windows} windows in {elapsed:.2f}s ({n_windows / max(elapsed, 1e-9):.1f} windows/s)")
+    return totals
+
+def summarize(totals, ids, num_quantiles=len(QUANTILE_LEVELS)):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        per_series = pd.DataFrame({
+            "series_id": ids,
+            "n_windows": totals["n_windows"],
+            # Weighted quantile loss, averaged over the quantile levels
+            "wql": 2.0 * totals["pinball_sum"] / (num_quantiles * totals["abs_target_sum"]),
+            "mase": totals["mase_sum"] / totals["n_windows"],
+        })
+        overall_wql = 2.0 * totals["pinball_sum"].sum() / (num_quantiles * totals["abs_target_sum"].sum())
+        overall_mase = totals["mase_sum"].sum() / totals["n_windows"].sum()
+    print("\n" + "=" * 50)
+    print("BACKTEST SUMMARY")
+    print("=" * 50)
+    print(f"Series: {len(ids)}  Windows: {int(totals['n_windows'].sum())}")
+    print(f"WQL : {overall_wql:.4f}")
+    print(f"MASE: {overall_mase:.4f}")
+    print("=" * 50 + "\n")
+    return per_series
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest for Chronos Bolt.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--csv", help="Long-format CSV (one row per observation).")
+    source.add_argument("--npy", help="Wide [S, T] float32 .npy, NaN right-padded.")
+    source.add_argument("--reuse-work-dir", action="store_true",
+                        help="Reuse values.npy/lengths.npy already in --work-dir.")
+    parser.add_argument("--id-column", default="series_id")
+    parser.add_argument("--value-column", default="value")
+    parser.add_argument("--time-column", default=None)
+    parser.add_argument("--backend", choices=BACKENDS, default="onnx")
+    parser.add_argument("--model-path", help="Exported artifact, or a model id for --backend wrapper.")
+    parser.add_argument("--context-length", type=int, default=STATIC_CONTEXT_LENGTH)
+    parser.add_argument("--horizon", type=int, default=12)
+    parser.add_argument("--stride", type=int, default=1, help="Steps between forecast origins.")
+    parser.add_argument("--min-history", type=int, default=32, help="First origin (observed points before it).")
+    parser.add_argument("--season", type=int, default=1, help="Seasonal period m of the MASE scale.")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--threads-per-worker", type=int, default=None)
+    parser.add_argument("--work-dir", default="backtest_data")
+    parser.add_argument("--output", default="backtest_metrics.csv")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.backend != "wrapper" and not args.model_path:
+        raise SystemExit(f"--model-path is required for --backend {args.backend}")
+
+    values_path = os.path.join(args.work_dir, "values.npy")
+    lengths_path = os.path.join(args.work_dir, "lengths.npy")
+    if args.csv:
+        ids, series = load_long_series(args.csv, args.id_column, args.value_column, args.time_column)
+        values_path, lengths_path = write_backtest_array(series, args.work_dir, args.context_length)
+    elif args.npy:
+        wide = np.load(args.npy, mmap_mode="r")
+        series = []
+        for row in wide:
+            observed = np.flatnonzero(~np.isnan(row))
+            series.append(row[:observed[-1] + 1] if observed.size else row[:0])
+        ids = [str(i) for i in range(len(series))]
+        values_path, lengths_path = write_backtest_array(series, args.work_dir, args.context_length)
+    else:
+        ids = [str(i) for i in range(np.load(lengths_path).shape[0])]
+    print(f"[Info] Series array: {values_path}")
+
+    totals = run_backtest(
+        values_path, lengths_path, args.backend, args.model_path, args.context_length, args.horizon,
+        args.stride, args.min_history, args.season, args.batch_size, args.workers, args.threads_per_worker,
+    )
+    per_series = summarize(totals, ids)
+    per_series.to_csv(args.output, index=False)
+    print(f"[Info] Per-series metrics saved to {args.output}")
+
+if __name__ == "__main__":
+    main()
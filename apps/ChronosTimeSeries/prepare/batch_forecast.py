@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Batch forecasting entry point for Chronos Bolt.
+
+Forecasts many series in one run instead of a Python loop over batch-size-1 calls:
+1. Loads series from a wide CSV (one column per series) or a long-format CSV (id, value rows)
+2. Left-pads all of them into one static [N, STATIC_CONTEXT_LENGTH] float32 buffer
+3. Runs the buffer through the export wrapper or an exported artifact (.pt / .pt2 / .onnx)
+   in configurable batch sizes
+4. Streams the quantile predictions to a memory-mapped .npy file ([N, num_quantiles, pred_len])
+
+With --contexts, a prebuilt [N, L] float32 context file (ingest_long_csv.py streams
+multi-GB CSVs into one) is memory-mapped and read batch by batch instead.
+
+With --cache-dir, forecasts are looked up in a content-addressed cache first
+(forecast_cache.py) and only contexts that changed since the last run are inferred.
+
+Example:
+    python batch_forecast.py --csv sales.csv --format long --id-column sku \\
+        --value-column units --time-column date --backend onnx \\
+        --model-path model/chronos-bolt-tiny.onnx --batch-size 128 --output-dir forecasts
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from extract_chronos import CSV_DATA, STATIC_CONTEXT_LENGTH, left_pad_batch
+
+BACKENDS = ("wrapper", "torchscript", "pt2", "onnx")
+
+
+# -------------------------------------------------------------------------
+# SERIES LOADING
+# -------------------------------------------------------------------------
+def load_wide_series(csv_source, columns=None, time_column="date"):
+    """One series per numeric column. Returns (ids, [1-D float32 arrays])."""
+    df = pd.read_csv(csv_source)
+    if columns is None:
+        columns = [c for c in df.columns if c != time_column and pd.api.types.is_numeric_dtype(df[c])]
+    values = df[columns].to_numpy(dtype=np.float32)
+    return list(columns), list(values.T)
+
+def load_long_series(csv_source, id_column, value_column, time_column=None):
+    """Long format (one row per observation). Returns (ids, [1-D float32 arrays])."""
+    usecols = [id_column, value_column] + ([time_column] if time_column else [])
+    df = pd.read_csv(csv_source, usecols=usecols)
+    sort_keys = [id_column, time_column] if time_column else [id_column]
+    df = df.sort_values(sort_keys, kind="stable")
+
+    ids = df[id_column].to_numpy()
+    values = df[value_column].to_numpy(dtype=np.float32)
+    # Rows are grouped by id after the sort: split once at the group boundaries
+    unique_ids, starts = np.unique(ids, return_index=True)
+    order = np.argsort(starts)
+    unique_ids, starts = unique_ids[order], starts[order]
+    return [str(i) for i in unique_ids], np.split(values, starts[1:])
+
+def load_contexts(contexts_path):
+    """Memory-maps a prebuilt [N, L] context file. Returns (contexts, ids)."""
+    contexts = np.load(contexts_path, mmap_mode="r")
+    ids_path = os.path.join(os.path.dirname(contexts_path), "series_ids.json")
+    if os.path.exists(ids_path):
+        with open(ids_path, "r", encoding="utf-8") as f:
+            ids = json.load(f)
+    else:
+        ids = [str(i) for i in range(contexts.shape[0])]
+    if len(ids) != contexts.shape[0]:
+        raise ValueError(f"{ids_path} has {len(ids)} ids for {contexts.shape[0]} contexts")
+    print(f"[Info] Memory-mapped {contexts.shape[0]} contexts from {contexts_path}")
+    return contexts, ids
+
+
+# -------------------------------------------------------------------------
+# BACKENDS
+# -------------------------------------------------------------------------
+def _static_batch_of_onnx(sess):
+    dim = sess.get_inputs()[0].shape[0]
+    return dim if isinstance(dim, int) else None
+
+def _static_batch_of_pt2(exported_program):
+    user_inputs = set(exported_program.graph_signature.user_inputs)
+    for node in exported_program.graph.nodes:
+        if node.op == "placeholder" and node.name in user_inputs:
+            dim = node.meta["val"].shape[0]
+            return dim if isinstance(dim, int) else None
+    return None
+
+def make_predictor(backend, model_path=None):
+    """
+    Returns (predict, static_batch). predict maps a float32 [B, L] ndarray to
+    a float32 [B, num_quantiles, pred_len] ndarray. static_batch is the batch
+    size the artifact was exported with, or None if the batch dim is dynamic.
+    """
+    if backend == "onnx":
+        import onnxruntime as ort
+        sess = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        input_name = sess.get_inputs()[0].name
+
+        def predict(batch):
+            return sess.run(None, {input_name: batch})[0]
+        return predict, _static_batch_of_onnx(sess)
+
+    import torch
+
+    if backend == "wrapper":
+        from extract_chronos import ChronosExportWrapper, MODEL_ID, load_export_model
+        _, model = load_export_model(model_path or MODEL_ID)
+        module = ChronosExportWrapper(model).eval()
+        static_batch = None
+    elif backend == "torchscript":
+        module = torch.jit.load(model_path)
+        module.eval()
+        # Traced graphs keep shape arithmetic symbolic, the batch dim follows the input
+        static_batch = None
+    elif backend == "pt2":
+        exported_program = torch.export.load(model_path)
+        static_batch = _static_batch_of_pt2(exported_program)
+        module = exported_program.module()
+    else:
+        raise ValueError(f"Unknown backend '{backend}', expected one of {BACKENDS}")
+
+    def predict(batch):
+        with torch.no_grad():
+            return module(torch.from_numpy(batch)).numpy()
+    return predict, static_batch
+
+
+# -------------------------------------------------------------------------
+# BATCH FORECAST
+# -------------------------------------------------------------------------
+def forecast_batches(predict, contexts, batch_size, output_path, static_batch=None):
+    """
+    Runs contexts [N, L] through predict in chunks of batch_size and streams the
+    results into a .npy memmap at output_path. Returns the memmap.
+    With a static_batch artifact the last partial chunk is padded with NaN rows.
+    """
+    n_series = contexts.shape[0]
+    preds = None
+    for start in range(0, n_series, batch_size):
+        # np.ascontiguousarray is a no-op for in-memory buffers and pages in memmap slices
+        batch = np.ascontiguousarray(contexts[start:start + batch_size], dtype=np.float32)
+        n_valid = batch.shape[0]
+        if static_batch is not None and n_valid < static_batch:
+            padding = np.full((static_batch - n_valid, batch.shape[1]), np.nan, dtype=np.float32)
+            batch = np.concatenate([batch, padding])
+        out = predict(batch)[:n_valid]
+        if preds is None:
+            preds = np.lib.format.open_memmap(
+                output_path, mode="w+", dtype=np.float32,
+                shape=(n_series,) + tuple(out.shape[1:]),
+            )
+        preds[start:start + n_valid] = out
+        if (start // batch_size) % 50 == 0:
+            print(f"[Info] Forecast {start + n_valid}/{n_series} series...")
+    if preds is not None:
+        preds.flush()
+    return preds
+
+def make_cache(backend, model_path, cache_dir, memory_items, disk_max_mb):
+    from forecast_cache import ForecastCache, artifact_digest
+    if backend == "wrapper":
+        import extract_chronos
+        # The eager wrapper depends on the weights and on the export-time patches
+        digest = artifact_digest(model_path or extract_chronos.MODEL_ID, extra_files=[extract_chronos.__file__])
+    else:
+        digest = artifact_digest(model_path)
+    print(f"[Info] Forecast cache at {cache_dir} (artifact digest {digest[:12]})")
+    return ForecastCache(digest, cache_dir, memory_items, disk_max_mb * 1024 * 1024)
+
+def run_batch_forecast(contexts, ids, backend, model_path, batch_size, output_dir,
+                       cache_dir=None, cache_memory_items=4096, cache_disk_mb=1024):
+    os.makedirs(output_dir, exist_ok=True)
+    predict, static_batch = make_predictor(backend, model_path)
+    cache = None
+    if cache_dir:
+        from forecast_cache import CachedPredictor
+        cache = make_cache(backend, model_path, cache_dir, cache_memory_items, cache_disk_mb)
+        # The cached predictor pads its misses to the static batch itself
+        predict, static_batch = CachedPredictor(predict, cache, static_batch), None
+    elif static_batch is not None and static_batch != batch_size:
+        print(f"[Warning] {model_path} was exported with a static batch of {static_batch}; "
+              f"using batch size {static_batch} instead of {batch_size}.")
+        batch_size = static_batch
+
+    preds_path = os.path.join(output_dir, "quantile_preds.npy")
+    ids_path = os.path.join(output_dir, "series_ids.json")
+    with open(ids_path, "w", encoding="utf-8") as f:
+        json.dump([str(i) for i in ids], f)
+
+    print(f"[Info] Forecasting {contexts.shape[0]} series with backend={backend}, batch_size={batch_size}...")
+    t0 = time.perf_counter()
+    preds = forecast_batches(predict, contexts, batch_size, preds_path, static_batch)
+    elapsed = time.perf_counter() - t0
+    rate = contexts.shape[0] / elapsed if elapsed > 0 else float("inf")
+    print(f"[Success] {contexts.shape[0]} series in {elapsed:.2f}s ({rate:.1f} series/s)")
+    print(f"[Info] Quantile predictions {None if preds is None else preds.shape} saved to {preds_path}")
+    print(f"[Info] Series ids saved to {ids_path}")
+    if cache is not None:
+        cache.print_stats()
+        stats_path = os.path.join(output_dir, "cache_stats.json")
+        with open(stats_path, "w", encoding="utf-8") as f:
+            json.dump(cache.stats(), f, indent=2)
+    return preds
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch forecasting with Chronos Bolt.")
+    parser.add_argument("--csv", help="Input CSV. Defaults to the sample CSV_DATA in extract_chronos.py.")
+    parser.add_argument("--contexts", help="Context .npy [N, L] from ingest_long_csv.py (ids from series_ids.json beside it).")
+    parser.add_argument("--format", choices=("wide", "long"), default="wide")
+    parser.add_argument("--columns", nargs="+", help="[wide] Series columns (default: all numeric columns).")
+    parser.add_argument("--id-column", default="series_id", help="[long] Series id column.")
+    parser.add_argument("--value-column", default="value", help="[long] Target value column.")
+    parser.add_argument("--time-column", default=None, help="Timestamp column used for ordering.")
+    parser.add_argument("--backend", choices=BACKENDS, default="wrapper")
+    parser.add_argument("--model-path", help="Exported artifact (.pt/.pt2/.onnx), or a model id for --backend wrapper.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--context-length", type=int, default=STATIC_CONTEXT_LENGTH)
+    parser.add_argument("--output-dir", default="forecasts")
+    parser.add_argument("--cache-dir", default=None, help="Enable the forecast cache (on-disk tier location).")
+    parser.add_argument("--cache-memory-items", type=int, default=4096)
+    parser.add_argument("--cache-disk-mb", type=int, default=1024)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.backend != "wrapper" and not args.model_path:
+        raise SystemExit(f"--model-path is required for --backend {args.backend}")
+
+    if args.contexts:
+        contexts, ids = load_contexts(args.contexts)
+    else:
+        csv_source = args.csv if args.csv else io.StringIO(CSV_DATA)
+        if args.format == "wide":
+            ids, series = load_wide_series(csv_source, args.columns, args.time_column or "date")
+        else:
+            ids, series = load_long_series(csv_source, args.id_column, args.value_column, args.time_column)
+        print(f"[Info] Loaded {len(ids)} series.")
+        contexts = left_pad_batch(series, args.context_length)
+    print(f"[Info] Context buffer: {contexts.shape} {contexts.dtype}")
+    run_batch_forecast(contexts, ids, args.backend, args.model_path, args.batch_size, args.output_dir,
+                       args.cache_dir, args.cache_memory_items, args.cache_disk_mb)
+
+if __name__ == "__main__":
+    main()
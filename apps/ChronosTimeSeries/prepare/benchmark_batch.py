@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Throughput benchmark for the batched Chronos Bolt exports.
+
+Reports series/second against batch size for TorchScript, PT2 and ONNX Runtime,
+using the artifacts written by export_dynamic_batch.py (either profile).
+
+Example:
+    python export_dynamic_batch.py --profile dynamic
+    python benchmark_batch.py --profile dynamic --batch-sizes 1 8 32 128 --json bench.json
+"""
+
+import argparse
+import json
+import os
+import time
+
+import torch
+
+from extract_chronos import BASE_DIR, STATIC_CONTEXT_LENGTH
+from export_dynamic_batch import (
+    ENUMERATED_BATCH_SIZES,
+    FORMATS,
+    PROFILES,
+    artifact_path,
+    load_artifact,
+    make_sample_batch,
+)
+
+
+def time_runner(runner, context, warmup=2, min_time=1.0, min_iters=3):
+    """Returns (iterations, seconds) after warming up."""
+    with torch.no_grad():
+        for _ in range(warmup):
+            runner(context)
+        iters = 0
+        t0 = time.perf_counter()
+        while True:
+            runner(context)
+            iters += 1
+            elapsed = time.perf_counter() - t0
+            if iters >= min_iters and elapsed >= min_time:
+                return iters, elapsed
+
+def run_benchmark(profile, model_dir, formats, batch_sizes, context_length=STATIC_CONTEXT_LENGTH,
+                  min_time=1.0):
+    results = []
+    for fmt in formats:
+        runner = None
+        if profile == "dynamic":
+            path = artifact_path(model_dir, fmt, None, context_length)
+            if not os.path.exists(path):
+                print(f"[Warning] Missing {path}, skipping {fmt}.")
+                continue
+            runner = load_artifact(fmt, path)
+
+        for batch_size in batch_sizes:
+            if profile == "enumerated":
+                path = artifact_path(model_dir, fmt, batch_size, context_length)
+                if not os.path.exists(path):
+                    print(f"[Warning] Missing {path}, skipping.")
+                    continue
+                runner = load_artifact(fmt, path)
+
+            context = make_sample_batch(batch_size, context_length)
+            iters, elapsed = time_runner(runner, context, min_time=min_time)
+            result = {
+                "format": fmt,
+                "profile": profile,
+                "batch_size": batch_size,
+                "latency_ms": 1000.0 * elapsed / iters,
+                "series_per_s": batch_size * iters / elapsed,
+            }
+            results.append(result)
+            print(f"  {fmt:<12} batch={batch_size:<5} {result['latency_ms']:9.2f} ms/batch "
+                  f"{result['series_per_s']:10.1f} series/s")
+    return results
+
+def print_table(results, batch_sizes):
+    formats = sorted({r["format"] for r in results}, key=FORMATS.index)
+    print("\n" + "=" * 60)
+    print("THROUGHPUT (series/s)")
+    print("=" * 60)
+    print(f"{'batch':>8} " + " ".join(f"{fmt:>14}" for fmt in formats))
+    for batch_size in batch_sizes:
+        row = []
+        for fmt in formats:
+            match = [r for r in results if r["format"] == fmt and r["batch_size"] == batch_size]
+            row.append(f"{match[0]['series_per_s']:14.1f}" if match else f"{'-':>14}")
+        print(f"{batch_size:>8} " + " ".join(row))
+    print("=" * 60)
+    for fmt in formats:
+        best = max((r for r in results if r["format"] == fmt), key=lambda r: r["series_per_s"])
+        print(f"[Info] Best {fmt}: batch={best['batch_size']} ({best['series_per_s']:.1f} series/s)")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Series/s vs batch size for Chronos Bolt exports.")
+    parser.add_argument("--profile", choices=PROFILES, default="dynamic")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(ENUMERATED_BATCH_SIZES))
+    parser.add_argument("--model-dir", default=os.path.join(BASE_DIR, "model"))
+    parser.add_argument("--min-time", type=float, default=1.0, help="Seconds of timed runs per point.")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads for the torch backends.")
+    parser.add_argument("--json", default=None, help="Write the raw results to this JSON file.")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    print(f"[Info] Benchmarking {args.profile} profile from {args.model_dir}...")
+    results = run_benchmark(args.profile, args.model_dir, args.formats, args.batch_sizes,
+                            min_time=args.min_time)
+    if results:
+        print_table(results, args.batch_sizes)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"[Info] Results saved to {args.json}")
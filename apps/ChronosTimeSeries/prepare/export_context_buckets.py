@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Context-length bucket exporter for Chronos Bolt.
+
+STATIC_CONTEXT_LENGTH = 512 makes short histories (the sample CSV has 21 points) pay
+for encoder attention over mostly NaN padding. This script exports one static
+[1, L] artifact per bucket in CONTEXT_BUCKETS (64/128/256/512/1024 by default),
+then reports per bucket:
+  - latency of the exported artifact,
+  - forecast drift against the 512 reference, for histories the bucket covers
+    and for all histories (longer ones are truncated to the bucket).
+
+At runtime, ContextBucketRouter picks the smallest bucket covering the observed
+history (select_context_bucket in extract_chronos.py).
+"""
+
+import argparse
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+from extract_chronos import (
+    BASE_DIR,
+    CONTEXT_BUCKETS,
+    CSV_DATA,
+    MODEL_ID,
+    STATIC_CONTEXT_LENGTH,
+    ChronosExportWrapper,
+    left_pad_batch,
+    load_export_model,
+    observed_length,
+    select_context_bucket,
+)
+from export_dynamic_batch import (
+    FORMATS,
+    artifact_path,
+    export_artifact,
+    load_artifact,
+    make_sample_series,
+)
+from benchmark_batch import time_runner
+
+REFERENCE_CONTEXT_LENGTH = STATIC_CONTEXT_LENGTH
+
+
+def bucket_artifact_path(model_dir, fmt, bucket):
+    return artifact_path(model_dir, fmt, 1, bucket)
+
+def validate_buckets(buckets, model):
+    patch_size = model.chronos_config.input_patch_size
+    max_length = model.chronos_config.context_length
+    for bucket in buckets:
+        if bucket % patch_size != 0:
+            raise ValueError(f"Bucket {bucket} is not a multiple of the patch size {patch_size}")
+        if bucket > max_length:
+            raise ValueError(f"Bucket {bucket} exceeds the model context length {max_length}")
+
+
+class ContextBucketRouter:
+    """Routes each series to the smallest exported bucket covering its observed history."""
+
+    def __init__(self, model_dir, fmt="onnx", buckets=CONTEXT_BUCKETS):
+        self.runners = {}
+        for bucket in buckets:
+            path = bucket_artifact_path(model_dir, fmt, bucket)
+            if os.path.exists(path):
+                self.runners[bucket] = load_artifact(fmt, path)
+        if not self.runners:
+            raise FileNotFoundError(f"No {fmt} bucket artifacts found in {model_dir}")
+
+    def bucket_for(self, series):
+        return select_context_bucket(observed_length(series), self.runners.keys())
+
+    def predict(self, series):
+        """series: 1-D history. Returns quantile_preds [1, num_quantiles, pred_len]."""
+        bucket = self.bucket_for(series)
+        context = torch.from_numpy(left_pad_batch([series], bucket))
+        with torch.no_grad():
+            return self.runners[bucket](context)
+
+
+def bucket_report(runner, bucket, histories, reference_outputs):
+    """Latency of the bucket artifact and its drift against the 512 reference."""
+    lengths = np.array([observed_length(h) for h in histories])
+    drifts = []
+    for history, reference in zip(histories, reference_outputs):
+        context = torch.from_numpy(left_pad_batch([history], bucket))
+        with torch.no_grad():
+            output = runner(context)
+        scale = max(reference.abs().max().item(), 1.0)
+        drifts.append((output - reference).abs().max().item() / scale)
+    drifts = np.array(drifts)
+    covered = lengths <= bucket
+
+    iters, elapsed = time_runner(runner, torch.from_numpy(left_pad_batch([histories[0]], bucket)))
+    return {
+        "bucket": bucket,
+        "latency_ms": 1000.0 * elapsed / iters,
+        "covered_histories": int(covered.sum()),
+        "max_drift_covered": float(drifts[covered].max()) if covered.any() else None,
+        "max_drift_all": float(drifts.max()),
+    }
+
+def print_report(fmt, rows):
+    reference = next((r for r in rows if r["bucket"] == REFERENCE_CONTEXT_LENGTH), None)
+    print("\n" + "=" * 78)
+    print(f"CONTEXT BUCKETS ({fmt}) - drift is max |q - q_512| / max|q_512|")
+    print("=" * 78)
+    print(f"{'bucket':>7} {'latency ms':>11} {'speedup':>8} {'covered':>8} {'drift(covered)':>15} {'drift(all)':>11}")
+    for r in rows:
+        speedup = f"{reference['latency_ms'] / r['latency_ms']:7.2f}x" if reference else "      -"
+        covered_drift = "-" if r["max_drift_covered"] is None else f"{r['max_drift_covered']:.2e}"
+        print(f"{r['bucket']:>7} {r['latency_ms']:>11.2f} {speedup:>8} {r['covered_histories']:>8} "
+              f"{covered_drift:>15} {r['max_drift_all']:>11.2e}")
+    print("=" * 78)
+
+def export_buckets(model_dir, buckets=CONTEXT_BUCKETS, formats=FORMATS, model_id=MODEL_ID,
+                   n_histories=32, report_path=None):
+    os.makedirs(model_dir, exist_ok=True)
+    _, model = load_export_model(model_id)
+    validate_buckets(buckets, model)
+    wrapper = ChronosExportWrapper(model).eval()
+
+    # Histories spanning every bucket, plus the 21-point sample CSV series
+    histories = make_sample_series(n_histories, max(buckets), seed=1)
+    histories.insert(0, pd.read_csv(io.StringIO(CSV_DATA))["daily_spend_usd"].to_numpy(dtype=np.float32))
+    print(f"[Info] Computing {REFERENCE_CONTEXT_LENGTH} reference forecasts for {len(histories)} histories...")
+    with torch.no_grad():
+        reference_outputs = [
+            wrapper(torch.from_numpy(left_pad_batch([h], REFERENCE_CONTEXT_LENGTH))) for h in histories
+        ]
+
+    report = {}
+    for fmt in formats:
+        rows = []
+        for bucket in sorted(buckets):
+            path = bucket_artifact_path(model_dir, fmt, bucket)
+            try:
+                context = torch.from_numpy(left_pad_batch([histories[0]], bucket))
+                export_artifact(wrapper, fmt, path, context, dynamic=False)
+                rows.append(bucket_report(load_artifact(fmt, path), bucket, histories, reference_outputs))
+            except Exception as e:
+                print(f"[Error] {fmt} bucket {bucket} export/report failed: {e}")
+                import traceback
+                traceback.print_exc()
+        if rows:
+            print_report(fmt, rows)
+        report[fmt] = rows
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[Info] Report saved to {report_path}")
+    return report
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export Chronos Bolt context-length buckets.")
+    parser.add_argument("--buckets", nargs="+", type=int, default=list(CONTEXT_BUCKETS))
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--model-dir", default=os.path.join(BASE_DIR, "model"))
+    parser.add_argument("--model-id", default=MODEL_ID, help="Hugging Face id or local model directory.")
+    parser.add_argument("--histories", type=int, default=32, help="Synthetic histories used for the drift report.")
+    parser.add_argument("--report", default=None, help="Write the latency/drift report to this JSON file.")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    export_buckets(args.model_dir, args.buckets, args.formats, args.model_id, args.histories, args.report)
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Server-side batch export profiles for Chronos Bolt.
+
+extract_chronos.py exports strictly static [1, STATIC_CONTEXT_LENGTH] artifacts for the
+NPU demo app. For server-side CPU inference we want real batches, so this script
+keeps the sequence length static and either:
+  - dynamic:    makes the batch dimension dynamic (one artifact per format), or
+  - enumerated: exports one static artifact per batch size (1/8/32/128 by default).
+
+Each artifact is verified against the eager wrapper at several batch sizes.
+Use benchmark_batch.py afterwards to pick an operating point.
+"""
+
+import argparse
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+
+from extract_chronos import (
+    BASE_DIR,
+    CSV_DATA,
+    MODEL_ID,
+    PROJECT_NAME,
+    STATIC_CONTEXT_LENGTH,
+    ChronosExportWrapper,
+    export_onnx,
+    export_pt2,
+    export_torchscript,
+    left_pad_batch,
+    load_export_model,
+)
+
+PROFILES = ("dynamic", "enumerated")
+FORMATS = ("torchscript", "pt2", "onnx")
+FORMAT_EXTENSIONS = {"torchscript": "pt", "pt2": "pt2", "onnx": "onnx"}
+ENUMERATED_BATCH_SIZES = (1, 8, 32, 128)
+MAX_DYNAMIC_BATCH = 1024
+# torch.export specializes size-1 dims, so dynamic graphs are traced with a batch of 2
+DYNAMIC_TRACE_BATCH = 2
+
+
+def artifact_path(model_dir, fmt, batch_size=None, context_length=STATIC_CONTEXT_LENGTH):
+    """batch_size=None names the dynamic-batch artifact."""
+    tag = "dynbatch" if batch_size is None else f"b{batch_size}"
+    if context_length != STATIC_CONTEXT_LENGTH:
+        tag += f"-ctx{context_length}"
+    return os.path.join(model_dir, f"{PROJECT_NAME}-{tag}.{FORMAT_EXTENSIONS[fmt]}")
+
+def make_sample_series(n_series, max_length=STATIC_CONTEXT_LENGTH, seed=0):
+    """Distinct series built from the sample CSV: random rescaling, shifts and history lengths."""
+    base = pd.read_csv(io.StringIO(CSV_DATA))["daily_spend_usd"].to_numpy(dtype=np.float32)
+    rng = np.random.default_rng(seed)
+    reps = int(np.ceil(max_length / len(base))) + 1
+    tiled = np.tile(base, reps)
+    series = []
+    for _ in range(n_series):
+        length = int(rng.integers(len(base), len(tiled)))
+        scale, shift = rng.uniform(0.1, 10.0), rng.uniform(-20.0, 20.0)
+        noise = rng.normal(0.0, 1.0, size=length).astype(np.float32)
+        series.append(tiled[-length:] * scale + shift + noise)
+    return series
+
+def make_sample_batch(batch_size, context_length=STATIC_CONTEXT_LENGTH, seed=0):
+    return torch.from_numpy(left_pad_batch(make_sample_series(batch_size, context_length, seed), context_length))
+
+def export_artifact(wrapper, fmt, path, context, dynamic):
+    print(f"[Info] Exporting {fmt} to {path} (batch={'dynamic' if dynamic else context.shape[0]})...")
+    if fmt == "torchscript":
+        # Traced shape arithmetic stays symbolic, so the batch dim follows the input
+        export_torchscript(wrapper, context, path)
+    elif fmt == "pt2":
+        dynamic_shapes = None
+        if dynamic:
+            batch = torch.export.Dim("batch", min=1, max=MAX_DYNAMIC_BATCH)
+            dynamic_shapes = {"context": {0: batch}}
+        export_pt2(wrapper, context, path, dynamic_shapes=dynamic_shapes)
+    elif fmt == "onnx":
+        dynamic_axes = None
+        if dynamic:
+            # Sequence length (dim 1) stays static; only the batch dim is symbolic
+            dynamic_axes = {"context": {0: "batch"}, "quantile_preds": {0: "batch"}}
+        export_onnx(wrapper, context, path, dynamic_axes=dynamic_axes)
+    print(f"[Success] {fmt} export successful.")
+
+def load_artifact(fmt, path):
+    """Returns a callable mapping a float32 [B, L] tensor to quantile_preds."""
+    if fmt == "torchscript":
+        module = torch.jit.load(path)
+        module.eval()
+        return module
+    if fmt == "pt2":
+        return torch.export.load(path).module()
+    if fmt == "onnx":
+        import onnxruntime as ort
+        sess = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        return lambda context: torch.from_numpy(sess.run(None, {"context": context.numpy()})[0])
+    raise ValueError(f"Unknown format '{fmt}'")
+
+def verify_artifact(fmt, path, wrapper, batch_sizes, context_length, rtol=1e-4):
+    """Sample rows are rescaled up to 10x, so the max diff is checked relative to the output scale."""
+    print(f"[Verify] Verifying {path} at batch sizes {list(batch_sizes)}...")
+    runner = load_artifact(fmt, path)
+    for batch_size in batch_sizes:
+        context = make_sample_batch(batch_size, context_length, seed=batch_size)
+        with torch.no_grad():
+            expected = wrapper(context)
+            actual = runner(context)
+        diff = (actual - expected).abs().max().item()
+        rel_diff = diff / max(expected.abs().max().item(), 1.0)
+        print(f"  batch={batch_size:<4} max diff: {diff:.3e} (relative {rel_diff:.3e})")
+        if rel_diff > rtol:
+            raise ValueError(f"{fmt} verification failed at batch {batch_size}: max diff {diff}")
+    print(f"[Success] {fmt} outputs match.")
+
+def export_profile(profile, model_dir, formats=FORMATS, batch_sizes=ENUMERATED_BATCH_SIZES,
+                   context_length=STATIC_CONTEXT_LENGTH, model_id=MODEL_ID):
+    os.makedirs(model_dir, exist_ok=True)
+    _, model = load_export_model(model_id)
+    wrapper = ChronosExportWrapper(model).eval()
+
+    exported = {}
+    for fmt in formats:
+        try:
+            if profile == "dynamic":
+                path = artifact_path(model_dir, fmt, None, context_length)
+                export_artifact(wrapper, fmt, path, make_sample_batch(DYNAMIC_TRACE_BATCH, context_length), True)
+                verify_artifact(fmt, path, wrapper, batch_sizes, context_length)
+                exported[(fmt, None)] = path
+            else:
+                for batch_size in batch_sizes:
+                    path = artifact_path(model_dir, fmt, batch_size, context_length)
+                    export_artifact(wrapper, fmt, path, make_sample_batch(batch_size, context_length), False)
+                    verify_artifact(fmt, path, wrapper, [batch_size], context_length)
+                    exported[(fmt, batch_size)] = path
+        except Exception as e:
+            print(f"[Error] {fmt} export/verify failed: {e}")
+            import traceback
+            traceback.print_exc()
+
+    print(f"\n[Summary] {profile} profile: {len(exported)} artifacts exported to {model_dir}")
+    for (fmt, batch_size), path in exported.items():
+        print(f"  {fmt:<12} batch={'dynamic' if batch_size is None else batch_size:<8} {path}")
+    return exported
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export Chronos Bolt with a batched profile.")
+    parser.add_argument("--profile", choices=PROFILES, default="dynamic")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(ENUMERATED_BATCH_SIZES),
+                        help="Enumerated batch sizes (also the verification sizes for --profile dynamic).")
+    parser.add_argument("--model-dir", default=os.path.join(BASE_DIR, "model"))
+    parser.add_argument("--model-id", default=MODEL_ID, help="Hugging Face id or local model directory.")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    export_profile(args.profile, args.model_dir, args.formats, args.batch_sizes, model_id=args.model_id)
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Content-addressed forecast cache for Chronos Bolt.
+
+Series refreshed without new data points produce a byte-identical padded context,
+so their quantile forecast can be reused instead of re-running the encoder/decoder.
+
+Keys are sha256(artifact digest + canonical float32 context bytes):
+  - artifact digest: sha256 of the exported .pt/.pt2/.onnx file, or of the weights
+    (+ extract_chronos.py patches) for the eager wrapper,
+  - canonical context: every NaN mapped to one bit pattern and -0.0 to 0.0.
+
+Two tiers:
+  - in-memory LRU (bounded item count),
+  - on-disk .npy files (bounded total bytes, least recently used evicted first).
+
+CachedPredictor wraps any batch predict function and only runs the misses.
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+_CHUNK_SIZE = 1 << 20
+_WEIGHT_SUFFIXES = (".safetensors", ".bin", ".json")
+
+
+def _hash_file(path, digest):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+def artifact_digest(model_path, extra_files=()):
+    """
+    sha256 of an exported artifact file, or of the weight/config files of a local
+    model directory or cached Hugging Face model id. extra_files (e.g. the patch
+    source) are folded in as well.
+    """
+    digest = hashlib.sha256()
+    if os.path.isfile(model_path):
+        _hash_file(model_path, digest)
+    else:
+        model_dir = model_path
+        if not os.path.isdir(model_dir):
+            from huggingface_hub import snapshot_download
+            model_dir = snapshot_download(model_path, local_files_only=True)
+        for root, _, files in sorted(os.walk(model_dir)):
+            for name in sorted(files):
+                if name.endswith(_WEIGHT_SUFFIXES):
+                    digest.update(name.encode("utf-8"))
+                    _hash_file(os.path.join(root, name), digest)
+    for path in extra_files:
+        _hash_file(path, digest)
+    return digest.hexdigest()
+
+def canonical_contexts(contexts):
+    """Single NaN bit pattern and no negative zeros, so equal contexts hash equally."""
+    contexts = np.asarray(contexts, dtype=np.float32)
+    return np.where(np.isnan(contexts), np.float32(np.nan), contexts + np.float32(0.0))
+
+
+class ForecastCache:
+    def __init__(self, artifact_digest, cache_dir=None, memory_items=4096, disk_max_bytes=1 << 30):
+        self.artifact_digest = artifact_digest
+        self.cache_dir = cache_dir
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._disk = OrderedDict()  # key -> size in bytes, least recently used first
+        self._disk_bytes = 0
+        self.counters = {
+            "hits_memory": 0, "hits_disk": 0, "misses": 0,
+            "evictions_memory": 0, "evictions_disk": 0,
+        }
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._load_disk_index()
+
+    # --- keys ---
+    def keys_for(self, contexts):
+        """One hex key per row of a [B, L] context batch."""
+        contexts = canonical_contexts(contexts)
+        prefix = hashlib.sha256(self.artifact_digest.encode("utf-8"))
+        prefix.update(str(contexts.shape[1:]).encode("utf-8"))
+        keys = []
+        for row in contexts:
+            digest = prefix.copy()
+            digest.update(row.tobytes())
+            keys.append(digest.hexdigest())
+        return keys
+
+    # --- disk tier ---
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def _load_disk_index(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".npy"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, name[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.disk_max_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            self.counters["evictions_disk"] += 1
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _put_disk(self, key, value):
+        if key in self._disk:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, value)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        self._disk[key] = size
+        self._disk_bytes += size
+        self._evict_disk()
+
+    def _get_disk(self, key):
+        if key not in self._disk:
+            return None
+        path = self._path(key)
+        try:
+            value = np.load(path)
+        except (FileNotFoundError, ValueError):
+            self._disk_bytes -= self._disk.pop(key)
+            return None
+        self._disk.move_to_end(key)
+        os.utime(path)  # keep the LRU order across runs
+        return value
+
+    # --- memory tier ---
+    def _put_memory(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+            self.counters["evictions_memory"] += 1
+
+    # --- public API ---
+    def get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            self.counters["hits_memory"] += 1
+            return value
+        if self.cache_dir:
+            value = self._get_disk(key)
+            if value is not None:
+                self._put_memory(key, value)
+                self.counters["hits_disk"] += 1
+                return value
+        self.counters["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        value = np.asarray(value, dtype=np.float32)
+        self._put_memory(key, value)
+        if self.cache_dir:
+            self._put_disk(key, value)
+
+    def stats(self):
+        stats = dict(self.counters)
+        lookups = stats["hits_memory"] + stats["hits_disk"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = (stats["hits_memory"] + stats["hits_disk"]) / lookups if lookups else 0.0
+        stats["memory_items"] = len(self._memory)
+        stats["disk_items"] = len(self._disk)
+        stats["disk_bytes"] = self._disk_bytes
+        return stats
+
+    def print_stats(self):
+        stats = self.stats()
+        hits = stats["hits_memory"] + stats["hits_disk"]
+        print(f"[Cache] {hits}/{stats['lookups']} forecasts served from cache "
+              f"({100.0 * stats['hit_rate']:.1f}%): memory={stats['hits_memory']} disk={stats['hits_disk']} "
+              f"misses={stats['misses']}")
+        print(f"[Cache] memory items={stats['memory_items']}, disk items={stats['disk_items']} "
+              f"({stats['disk_bytes'] / 1024 / 1024:.1f} MB), evictions memory={stats['evictions_memory']} "
+              f"disk={stats['evictions_disk']}")
+
+
+class CachedPredictor:
+    """
+    Wraps predict([B, L] -> [B, Q, H]) so only cache misses reach the model, in one
+    batch. static_batch pads the misses for artifacts exported with a fixed batch.
+    """
+
+    def __init__(self, predict, cache, static_batch=None):
+        self.predict = predict
+        self.cache = cache
+        self.static_batch = static_batch
+
+    def __call__(self, batch):
+        keys = self.cache.keys_for(batch)
+        cached = [self.cache.get(key) for key in keys]
+        miss_rows = [i for i, value in enumerate(cached) if value is None]
+
+        if miss_rows:
+            misses = np.ascontiguousarray(batch[miss_rows], dtype=np.float32)
+            n_missing = misses.shape[0]
+            if self.static_batch is not None and n_missing % self.static_batch:
+                pad_rows = self.static_batch - n_missing % self.static_batch
+                padding = np.full((pad_rows, misses.shape[1]), np.nan, dtype=np.float32)
+                misses = np.concatenate([misses, padding])
+            step = self.static_batch or misses.shape[0]
+            computed = np.concatenate([self.predict(misses[i:i + step]) for i in range(0, misses.shape[0], step)])
+            for row, value in zip(miss_rows, computed[:n_missing]):
+                self.cache.put(keys[row], value)
+                cached[row] = value
+        return np.stack(cached)
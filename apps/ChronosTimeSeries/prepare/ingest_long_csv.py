@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Streaming ingestion of large long-format CSVs into a Chronos context file.
+
+load_long_series (batch_forecast.py) reads the whole CSV into pandas, which does
+not scale to multi-GB exports. This script streams the file in fixed-size chunks
+(pyarrow's streaming CSV reader, or pandas chunks) and never holds more than one
+chunk of rows in memory:
+1. Each row is mapped to a series index (ids are assigned in order of first appearance)
+2. Its value goes into a per-series ring buffer of the last context_length points,
+   kept in a raw file-backed memmap that grows with the number of series
+3. At the end the rings are rotated (oldest first) and left-padded with NaN into a
+   preallocated [N, context_length] float32 .npy memmap, block by block
+
+Memory is O(chunk rows + number of series), independent of the file size.
+Rows of a series must appear in time order (checked when --time-column is given).
+
+Outputs in --output-dir:
+  contexts.npy     [N, context_length] float32 (np.load(..., mmap_mode="r"))
+  series_ids.json  series ids, row order of contexts.npy
+  lengths.npy      [N] int64 number of observations per series
+
+Each row holds the same values as load_long_series + left_pad_batch, but rows follow
+the first appearance of each id in the file, not load_long_series' sort by id: match
+series by series_ids.json (batch_forecast.py --contexts does), not by row position.
+
+Example:
+    python ingest_long_csv.py --csv sales.csv --id-column sku --value-column units \\
+        --time-column date --output-dir contexts
+    python batch_forecast.py --contexts contexts/contexts.npy --backend onnx \\
+        --model-path model/chronos-bolt-tiny-dynbatch.onnx --batch-size 128
+"""
+
+import argparse
+import json
+import os
+import resource
+import time
+
+import numpy as np
+import pandas as pd
+
+# Same as extract_chronos.STATIC_CONTEXT_LENGTH; not imported so that ingestion
+# does not pull torch and chronos into the process.
+STATIC_CONTEXT_LENGTH = 512
+ENGINES = ("pyarrow", "pandas")
+DEFAULT_CHUNK_ROWS = 1 << 20
+# pyarrow reads several blocks ahead, so memory is a multiple of the block size
+PYARROW_BLOCK_BYTES = 1 << 22
+_INITIAL_CAPACITY = 1024
+_ROTATE_BLOCK_ROWS = 1024
+
+
+# -------------------------------------------------------------------------
+# CHUNKED READERS
+# -------------------------------------------------------------------------
+def iter_csv_chunks(csv_path, id_column, value_column, time_column=None,
+                    chunk_rows=DEFAULT_CHUNK_ROWS, engine="pyarrow"):
+    """
+    Yields (ids, values, times) per chunk: object ndarray, float32 ndarray, int64 ndarray
+    or None. chunk_rows applies to the pandas engine; pyarrow chunks are PYARROW_BLOCK_BYTES.
+    """
+    columns = [id_column, value_column] + ([time_column] if time_column else [])
+    if engine == "pyarrow":
+        from pyarrow import csv as pa_csv
+        import pyarrow as pa
+        reader = pa_csv.open_csv(
+            csv_path,
+            read_options=pa_csv.ReadOptions(block_size=PYARROW_BLOCK_BYTES),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=columns,
+                column_types={id_column: pa.string(), value_column: pa.float32()},
+            ),
+        )
+        for batch in reader:
+            frame = batch.to_pandas()
+            yield _chunk_arrays(frame, id_column, value_column, time_column)
+    elif engine == "pandas":
+        for frame in pd.read_csv(csv_path, usecols=columns, dtype={id_column: str}, chunksize=chunk_rows):
+            yield _chunk_arrays(frame, id_column, value_column, time_column)
+    else:
+        raise ValueError(f"Unknown engine '{engine}', expected one of {ENGINES}")
+
+def _chunk_arrays(frame, id_column, value_column, time_column):
+    ids = frame[id_column].to_numpy(dtype=object)
+    values = frame[value_column].to_numpy(dtype=np.float32)
+    times = None
+    if time_column:
+        column = frame[time_column]
+        if pd.api.types.is_numeric_dtype(column):
+            times = column.to_numpy(dtype=np.int64)
+        else:
+            times = pd.to_datetime(column).to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    return ids, values, times
+
+
+# -------------------------------------------------------------------------
+# RING BUFFER INGESTION
+# -------------------------------------------------------------------------
+class _Grow:
+    """In-memory per-series state arrays that double in capacity."""
+
+    def __init__(self, dtype, fill):
+        self.dtype, self.fill = dtype, fill
+        self.array = np.full(_INITIAL_CAPACITY, fill, dtype=dtype)
+
+    def ensure(self, size):
+        if size > len(self.array):
+            grown = np.full(max(size, 2 * len(self.array)), self.fill, dtype=self.dtype)
+            grown[:len(self.array)] = self.array
+            self.array = grown
+
+
+class RingFile:
+    """Raw float32 [capacity, context_length] memmap; grows by extending the file."""
+
+    def __init__(self, path, context_length):
+        self.path, self.context_length = path, context_length
+        self.capacity = 0
+        self.rows = None
+        open(path, "wb").close()
+        self.ensure(_INITIAL_CAPACITY)
+
+    def ensure(self, n_series):
+        if n_series <= self.capacity:
+            return
+        new_capacity = max(n_series, 2 * self.capacity)
+        if self.rows is not None:
+            self.rows.flush()
+            del self.rows
+        with open(self.path, "r+b") as f:
+            f.truncate(new_capacity * self.context_length * 4)
+        self.rows = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(new_capacity, self.context_length))
+        self.capacity = new_capacity
+
+
+def _chunk_positions(idx):
+    """0-based occurrence number of each row within its series, in row order."""
+    order = np.argsort(idx, kind="stable")
+    sorted_idx = idx[order]
+    starts = np.flatnonzero(np.r_[True, sorted_idx[1:] != sorted_idx[:-1]])
+    run_start = np.repeat(starts, np.diff(np.r_[starts, len(idx)]))
+    positions = np.empty(len(idx), dtype=np.int64)
+    positions[order] = np.arange(len(idx)) - run_start
+    return positions, order, sorted_idx, starts
+
+def ingest_long_csv(csv_path, id_column, value_column, output_dir, time_column=None,
+                    context_length=STATIC_CONTEXT_LENGTH, chunk_rows=DEFAULT_CHUNK_ROWS, engine="pyarrow"):
+    """Streams csv_path into output_dir/contexts.npy. Returns (contexts memmap, ids)."""
+    os.makedirs(output_dir, exist_ok=True)
+    ring_path = os.path.join(output_dir, "contexts.ring.tmp")
+    ring = RingFile(ring_path, context_length)
+    id_to_index = {}
+    ids = []
+    counts = _Grow(np.int64, 0)
+    last_times = _Grow(np.int64, np.iinfo(np.int64).min)
+
+    t0 = time.perf_counter()
+    n_rows = 0
+    for chunk_number, (chunk_ids, values, times) in enumerate(
+            iter_csv_chunks(csv_path, id_column, value_column, time_column, chunk_rows, engine)):
+        # Series index per row: factorize the chunk, then look up (or assign) each unique id once
+        codes, uniques = pd.factorize(chunk_ids)
+        lookup = np.empty(len(uniques), dtype=np.int64)
+        for i, series_id in enumerate(uniques):
+            index = id_to_index.get(series_id)
+            if index is None:
+                index = id_to_index[series_id] = len(ids)
+                ids.append(str(series_id))
+            lookup[i] = index
+        idx = lookup[codes]
+        n_series = len(ids)
+        ring.ensure(n_series)
+        counts.ensure(n_series)
+        last_times.ensure(n_series)
+
+        positions, order, sorted_idx, starts = _chunk_positions(idx)
+        if times is not None:
+            _check_time_order(times, order, sorted_idx, starts, last_times.array, ids)
+
+        positions += counts.array[idx]
+        counts.array[:n_series] += np.bincount(idx, minlength=n_series)
+        # Only the last context_length rows of each series can survive: no slot is written twice
+        keep = positions >= counts.array[idx] - context_length
+        ring.rows[idx[keep], positions[keep] % context_length] = values[keep]
+
+        n_rows += len(idx)
+        if chunk_number % 10 == 0:
+            print(f"[Info] {n_rows} rows, {n_series} series ingested...")
+
+    n_series = len(ids)
+    if n_series == 0:
+        raise ValueError(f"No rows found in {csv_path}")
+    ring.rows.flush()
+    counts = counts.array[:n_series]
+
+    contexts_path = os.path.join(output_dir, "contexts.npy")
+    contexts = np.lib.format.open_memmap(contexts_path, mode="w+", dtype=np.float32, shape=(n_series, context_length))
+    _rotate_rings(ring.rows, counts, contexts, context_length)
+    contexts.flush()
+    del ring
+    os.remove(ring_path)
+
+    np.save(os.path.join(output_dir, "lengths.npy"), counts)
+    with open(os.path.join(output_dir, "series_ids.json"), "w", encoding="utf-8") as f:
+        json.dump(ids, f)
+
+    elapsed = time.perf_counter() - t0
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"[Success] {n_rows} rows, {n_series} series in {elapsed:.1f}s (peak RSS {peak_rss_mb:.0f} MB)")
+    print(f"[Info] Contexts {contexts.shape} saved to {contexts_path}")
+    return contexts, ids
+
+def _check_time_order(times, order, sorted_idx, starts, last_times, ids):
+    sorted_times = times[order]
+    same_series = sorted_idx[1:] == sorted_idx[:-1]
+    backwards = same_series & (sorted_times[1:] < sorted_times[:-1])
+    first_times = sorted_times[starts]
+    first_series = sorted_idx[starts]
+    backwards_first = first_times < last_times[first_series]
+    if backwards.any() or backwards_first.any():
+        bad = sorted_idx[1:][backwards][0] if backwards.any() else first_series[backwards_first][0]
+        raise ValueError(f"Rows of series '{ids[bad]}' are not in time order; sort the file by (id, time) first.")
+    ends = np.r_[starts[1:], len(sorted_idx)] - 1
+    last_times[sorted_idx[ends]] = sorted_times[ends]
+
+def _rotate_rings(rings, counts, contexts, context_length):
+    """Ring slot (p % L) holds observation p. Writes oldest-first rows, NaN-left-padded."""
+    columns = np.arange(context_length)
+    for start in range(0, len(counts), _ROTATE_BLOCK_ROWS):
+        stop = min(start + _ROTATE_BLOCK_ROWS, len(counts))
+        block_counts = counts[start:stop, None]
+        observed = np.minimum(block_counts, context_length)
+        # Column c holds observation (count - L + c); negative means padding
+        observation = block_counts - context_length + columns
+        slots = np.mod(observation, context_length)
+        block = np.take_along_axis(np.asarray(rings[start:stop]), slots, axis=1)
+        block[columns < context_length - observed] = np.nan
+        contexts[start:stop] = block
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stream a long-format CSV into a Chronos context memmap.")
+    parser.add_argument("--csv", required=True)
+    parser.add_argument("--id-column", default="series_id")
+    parser.add_argument("--value-column", default="value")
+    parser.add_argument("--time-column", default=None, help="Only used to check that rows are in time order.")
+    parser.add_argument("--context-length", type=int, default=STATIC_CONTEXT_LENGTH)
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--engine", choices=ENGINES, default="pyarrow")
+    parser.add_argument("--output-dir", default="contexts")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    ingest_long_csv(args.csv, args.id_column, args.value_column, args.output_dir, args.time_column,
+                    args.context_length, args.chunk_rows, args.engine)
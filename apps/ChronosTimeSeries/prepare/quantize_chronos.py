@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Accuracy-gated quantized exports for Chronos Bolt.
+
+extract_chronos.py only emits float32 artifacts. This script builds the static
+[1, STATIC_CONTEXT_LENGTH] graph in reduced precision:
+  - onnx-int8-dynamic: onnxruntime dynamic quantization (int8 weights, per-call activation scales)
+  - onnx-fp16:         fp16 weights/activations with float32 inputs/outputs (needs onnxconverter-common)
+  - pt2-int8-weight:   ExportedProgram with int8 Linear weights + per-channel scales, fp32 compute
+
+Every variant is compared against the fp32 wrapper's quantile_preds on a corpus of
+contexts (synthetic series built from the sample CSV, or --corpus-npy [N, L]). The
+deviation of a series is max |q - q_fp32| divided by the series scale (mean |context|,
+the same scale Chronos normalizes inputs with). Variants whose worst-case deviation
+exceeds --tolerance fail the gate and their artifact is removed.
+
+The report gives size on disk, CPU latency (batch 1) and the worst-case deviation.
+
+Example:
+    python quantize_chronos.py --variants onnx-int8-dynamic pt2-int8-weight --tolerance 0.05
+"""
+
+import argparse
+import copy
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from extract_chronos import (
+    BASE_DIR,
+    CSV_DATA,
+    MODEL_ID,
+    PROJECT_NAME,
+    STATIC_CONTEXT_LENGTH,
+    ChronosExportWrapper,
+    export_onnx,
+    export_pt2,
+    left_pad_batch,
+    load_export_model,
+)
+from export_dynamic_batch import load_artifact, make_sample_series
+from benchmark_batch import time_runner
+
+VARIANTS = ("onnx-int8-dynamic", "onnx-fp16", "pt2-int8-weight")
+BASELINES = ("onnx-fp32", "pt2-fp32")
+VARIANT_FORMATS = {
+    "onnx-fp32": "onnx", "pt2-fp32": "pt2",
+    "onnx-int8-dynamic": "onnx", "onnx-fp16": "onnx", "pt2-int8-weight": "pt2",
+}
+DEFAULT_TOLERANCE = 0.05
+
+
+def variant_path(model_dir, variant):
+    return os.path.join(model_dir, f"{PROJECT_NAME}-{variant}.{VARIANT_FORMATS[variant]}")
+
+
+# -------------------------------------------------------------------------
+# WEIGHT-ONLY INT8 (PT2)
+# -------------------------------------------------------------------------
+class Int8WeightOnlyLinear(nn.Module):
+    """
+    nn.Linear with symmetric per-output-channel int8 weights. The int8 tensor and
+    the scales are buffers, so the ExportedProgram stores 1 byte per weight; the
+    weight is dequantized in the graph and the matmul stays in float32.
+    """
+
+    def __init__(self, linear):
+        super().__init__()
+        weight = linear.weight.detach().float()
+        scale = weight.abs().amax(dim=1, keepdim=True).clamp(min=1e-12) / 127.0
+        # Named "weight" so HF blocks checking `wo.weight.dtype` see int8 and skip their cast
+        self.register_buffer("weight", torch.round(weight / scale).clamp(-127, 127).to(torch.int8))
+        self.register_buffer("scale", scale)
+        self.bias = None if linear.bias is None else nn.Parameter(linear.bias.detach().clone())
+
+    def forward(self, x):
+        return F.linear(x, self.weight.to(x.dtype) * self.scale, self.bias)
+
+def quantize_linear_weights(module):
+    """Replaces every nn.Linear under module in place. Returns the number replaced."""
+    count = 0
+    for name, child in module.named_children():
+        if isinstance(child, nn.Linear):
+            setattr(module, name, Int8WeightOnlyLinear(child))
+            count += 1
+        else:
+            count += quantize_linear_weights(child)
+    return count
+
+
+# -------------------------------------------------------------------------
+# VARIANT EXPORTS
+# -------------------------------------------------------------------------
+def export_variant(variant, wrapper, context, model_dir):
+    """Writes one variant (fp32 ONNX is built first for the ONNX variants). Returns its path."""
+    path = variant_path(model_dir, variant)
+    fp32_onnx = variant_path(model_dir, "onnx-fp32")
+    print(f"[Info] Exporting {variant} to {path}...")
+
+    if variant == "onnx-fp32":
+        export_onnx(wrapper, context, path)
+    elif variant == "pt2-fp32":
+        export_pt2(wrapper, context, path)
+    elif variant == "onnx-int8-dynamic":
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(fp32_onnx, path, weight_type=QuantType.QInt8, per_channel=True)
+    elif variant == "onnx-fp16":
+        try:
+            from onnxconverter_common import float16
+        except ImportError:
+            raise RuntimeError("onnx-fp16 requires onnxconverter-common (pip install onnxconverter-common)")
+        import onnx
+        # keep_io_types: the app keeps feeding float32 contexts and reading float32 quantiles
+        model_fp16 = float16.convert_float_to_float16(onnx.load(fp32_onnx), keep_io_types=True)
+        onnx.save(model_fp16, path)
+    elif variant == "pt2-int8-weight":
+        quantized = copy.deepcopy(wrapper)
+        n_linear = quantize_linear_weights(quantized)
+        print(f"[Info] Quantized {n_linear} Linear layers to int8 weights.")
+        export_pt2(quantized, context, path)
+    else:
+        raise ValueError(f"Unknown variant '{variant}', expected one of {VARIANTS + BASELINES}")
+    print(f"[Success] {variant} export successful.")
+    return path
+
+
+# -------------------------------------------------------------------------
+# CORPUS & GATE
+# -------------------------------------------------------------------------
+def make_corpus(n_series, seed=7, corpus_npy=None):
+    """[N, STATIC_CONTEXT_LENGTH] float32 contexts: --corpus-npy, or synthetic series plus the sample CSV."""
+    if corpus_npy:
+        corpus = np.load(corpus_npy, mmap_mode="r")
+        if corpus.ndim != 2 or corpus.shape[1] != STATIC_CONTEXT_LENGTH:
+            raise ValueError(f"{corpus_npy} must be [N, {STATIC_CONTEXT_LENGTH}], got {corpus.shape}")
+        return np.ascontiguousarray(corpus[:n_series], dtype=np.float32)
+    series = make_sample_series(n_series - 1, STATIC_CONTEXT_LENGTH, seed)
+    series.insert(0, pd.read_csv(io.StringIO(CSV_DATA))["daily_spend_usd"].to_numpy(dtype=np.float32))
+    return left_pad_batch(series, STATIC_CONTEXT_LENGTH)
+
+def series_scales(corpus):
+    """Mean |context| per series (Chronos' input scale), 1.0 for empty or all-zero rows."""
+    with np.errstate(invalid="ignore"):
+        scales = np.nanmean(np.abs(corpus), axis=1)
+    return np.where(np.isfinite(scales) & (scales > 0), scales, 1.0)
+
+def run_corpus(runner, corpus):
+    """Runs a batch-1 artifact over every context. Returns [N, Q, H]."""
+    with torch.no_grad():
+        return np.concatenate([runner(torch.from_numpy(corpus[i:i + 1])).float().numpy() for i in range(len(corpus))])
+
+def evaluate_variant(variant, path, corpus, reference, scales, tolerance):
+    runner = load_artifact(VARIANT_FORMATS[variant], path)
+    preds = run_corpus(runner, corpus)
+    abs_dev = np.abs(preds - reference).reshape(len(corpus), -1).max(axis=1)
+    rel_dev = abs_dev / scales
+    worst = int(np.nanargmax(rel_dev)) if np.isfinite(rel_dev).any() else 0
+    iters, elapsed = time_runner(runner, torch.from_numpy(corpus[:1]))
+    max_rel = float(np.max(rel_dev))  # NaN propagates and fails the gate
+    return {
+        "variant": variant,
+        "path": path,
+        "size_mb": os.path.getsize(path) / 1024 / 1024,
+        "latency_ms": 1000.0 * elapsed / iters,
+        "max_abs_dev": float(np.max(abs_dev)),
+        "max_rel_dev": max_rel,
+        "mean_rel_dev": float(np.mean(rel_dev)),
+        "worst_series": worst,
+        "passed": bool(max_rel <= tolerance),
+    }
+
+def print_report(rows, tolerance):
+    fp32 = {VARIANT_FORMATS[r["variant"]]: r for r in rows if r["variant"] in BASELINES}
+    print("\n" + "=" * 96)
+    print(f"QUANTIZED EXPORTS - deviation is max |q - q_fp32| / mean|context|, gate <= {tolerance:g}")
+    print("=" * 96)
+    print(f"{'variant':<18} {'size MB':>8} {'vs fp32':>8} {'latency ms':>11} {'speedup':>8} "
+          f"{'max abs dev':>12} {'max rel dev':>12} {'mean rel':>9} {'gate':>5}")
+    for r in rows:
+        base = fp32.get(VARIANT_FORMATS[r["variant"]])
+        size_ratio = f"{r['size_mb'] / base['size_mb']:7.2f}x" if base else "       -"
+        speedup = f"{base['latency_ms'] / r['latency_ms']:7.2f}x" if base else "       -"
+        gate = "-" if r["variant"] in BASELINES else ("PASS" if r["passed"] else "FAIL")
+        print(f"{r['variant']:<18} {r['size_mb']:>8.2f} {size_ratio:>8} {r['latency_ms']:>11.2f} {speedup:>8} "
+              f"{r['max_abs_dev']:>12.3e} {r['max_rel_dev']:>12.3e} {r['mean_rel_dev']:>9.2e} {gate:>5}")
+    print("=" * 96)
+
+def quantize_and_gate(model_dir, variants=VARIANTS, tolerance=DEFAULT_TOLERANCE, n_series=64,
+                      corpus_npy=None, model_id=MODEL_ID, report_path=None, keep_rejected=False):
+    os.makedirs(model_dir, exist_ok=True)
+    _, model = load_export_model(model_id)
+    wrapper = ChronosExportWrapper(model).eval()
+
+    corpus = make_corpus(n_series, corpus_npy=corpus_npy)
+    scales = series_scales(corpus)
+    print(f"[Info] Computing fp32 reference quantiles for {len(corpus)} contexts...")
+    with torch.no_grad():
+        reference = wrapper(torch.from_numpy(corpus)).numpy()
+    context = torch.from_numpy(corpus[:1])
+
+    baselines = ["pt2-fp32"] if all(VARIANT_FORMATS[v] == "pt2" for v in variants) else list(BASELINES)
+    # Variants that could not be exported or evaluated are kept as failed rows with an "error"
+    rows, failed = [], []
+    onnx_failed = False
+    for variant in baselines + list(variants):
+        if onnx_failed and VARIANT_FORMATS[variant] == "onnx":
+            failed.append({"variant": variant, "error": "the fp32 ONNX export failed", "passed": False})
+            continue
+        try:
+            path = export_variant(variant, wrapper, context, model_dir)
+            rows.append(evaluate_variant(variant, path, corpus, reference, scales, tolerance))
+        except Exception as e:
+            print(f"[Error] {variant} export/evaluation failed: {e}")
+            import traceback
+            traceback.print_exc()
+            failed.append({"variant": variant, "error": str(e), "passed": False})
+            if variant == "onnx-fp32":
+                print("[Warning] The ONNX variants need the fp32 ONNX graph, skipping them.")
+                onnx_failed = True
+    if rows:
+        print_report(rows, tolerance)
+    for r in failed:
+        print(f"[Warning] {r['variant']} was not gated: {r['error']}")
+
+    for r in rows:
+        if r["variant"] in BASELINES or r["passed"]:
+            continue
+        print(f"[Warning] {r['variant']} failed the accuracy gate (max rel dev {r['max_rel_dev']:.3e} "
+              f"on series {r['worst_series']} > {tolerance:g}).")
+        if not keep_rejected:
+            os.remove(r["path"])
+            print(f"[Info] Removed {r['path']}")
+
+    if report_path:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump({"tolerance": tolerance, "corpus_size": len(corpus), "variants": rows + failed}, f, indent=2)
+        print(f"[Info] Report saved to {report_path}")
+    return rows + failed
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Accuracy-gated int8/fp16 exports of Chronos Bolt.")
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Max allowed |q - q_fp32| / mean|context| over the corpus.")
+    parser.add_argument("--corpus-size", type=int, default=64)
+    parser.add_argument("--corpus-npy", default=None, help=f"Contexts [N, {STATIC_CONTEXT_LENGTH}] to gate on.")
+    parser.add_argument("--model-dir", default=os.path.join(BASE_DIR, "model"))
+    parser.add_argument("--model-id", default=MODEL_ID, help="Hugging Face id or local model directory.")
+    parser.add_argument("--report", default=None, help="Write the size/latency/deviation report to this JSON file.")
+    parser.add_argument("--keep-rejected", action="store_true", help="Keep artifacts that fail the gate.")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    rows = quantize_and_gate(args.model_dir, args.variants, args.tolerance, args.corpus_size, args.corpus_npy,
+                             args.model_id, args.report, args.keep_rejected)
+    # Export failures count as gate failures, baselines included
+    if any("error" in r or (not r["passed"] and r["variant"] not in BASELINES) for r in rows):
+        raise SystemExit(1)
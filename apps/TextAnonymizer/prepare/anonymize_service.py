@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Local anonymization service with micro-batching.
+
+One process loads the exported model once and serves it to every producer on the
+machine, over HTTP on localhost or over a Unix socket (standard library only):
+
+    POST /anonymize   {"texts": ["...", ...]} or {"text": "..."}
+                      -> {"results": [{"anonymized": "...", "entities": [...]}, ...]}
+    GET  /metrics     queue depth, batch-size histogram, latency percentiles
+    GET  /health      {"status": "ok"}
+
+Every text of every request goes into one queue. A batcher takes a free model
+worker, waits for the first text, then keeps collecting until --max-batch texts
+or --max-wait-ms have passed, and hands the batch to the worker (a thread running
+BatchAnonymizer on the shared model). While all workers are busy the queue keeps
+growing, so batches grow with the load.
+
+Usage:
+    python anonymize_service.py serve --port 8765 --workers 2
+    python anonymize_service.py serve --unix /tmp/anonymizer.sock
+    python anonymize_service.py bench --port 8765 --concurrency 32 --requests 2000
+    python anonymize_service.py selftest     # server + load test + parity check in one process
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from batch_anonymize import DEFAULT_MODEL_PATH, BatchAnonymizer, load_labels, load_runner
+from extract_tanaos_trace import MODEL_ID, SAMPLE_TEXT
+
+DEFAULT_PORT = 8765
+DEFAULT_WORKERS = 2
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT_MS = 5.0
+BATCH_HISTOGRAM = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+LATENCY_WINDOW = 10000  # requests / batches kept for the percentiles
+MAX_BODY_BYTES = 8 * 2**20
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+BENCH_TEXTS = [
+    SAMPLE_TEXT,
+    "You can reach me at sarah.connor@example.com or call 555-123-4567.",
+    "Ticket 4411 closed by John Smith on 2024-03-14 from the Berlin office.",
+    "No personal data in this line.",
+    "Card 4111 1111 1111 1111 was charged for Maria Garcia, 12 Baker Street, London.",
+]
+
+
+# -------------------------------------------------------------------------
+# METRICS
+# -------------------------------------------------------------------------
+def percentiles(values):
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    p50, p95, p99 = np.percentile(np.array(values) * 1000, (50, 95, 99))
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3)}
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = 0
+        self.texts = 0
+        self.errors = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = Counter()
+        self.request_latency = deque(maxlen=LATENCY_WINDOW)
+        self.batch_latency = deque(maxlen=LATENCY_WINDOW)
+
+    def record_batch(self, size, seconds):
+        self.batches += 1
+        self.batch_sizes[next((b for b in BATCH_HISTOGRAM if size <= b), "+Inf")] += 1
+        self.batch_latency.append(seconds)
+
+    def snapshot(self, queue_depth, busy_workers, workers):
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "texts": self.texts,
+            "errors": self.errors,
+            "batches": self.batches,
+            "mean_batch_size": round(self.texts / self.batches, 2) if self.batches else None,
+            "queue_depth": queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "busy_workers": busy_workers,
+            "workers": workers,
+            # texts per batch, counted in the smallest bucket that holds the batch
+            "batch_size_histogram": {f"<={b}": self.batch_sizes[b] for b in BATCH_HISTOGRAM}
+                                    | {"+Inf": self.batch_sizes["+Inf"]},
+            "request_latency_ms": percentiles(self.request_latency),
+            "batch_latency_ms": percentiles(self.batch_latency),
+        }
+
+
+# -------------------------------------------------------------------------
+# MICRO-BATCHING
+# -------------------------------------------------------------------------
+class MicroBatcher:
+    """Collects texts from concurrent requests into batches for a pool of model workers."""
+
+    def __init__(self, anonymizers, max_batch=DEFAULT_MAX_BATCH, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.anonymizers = anonymizers
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = Metrics()
+        self.queue = asyncio.Queue()
+        self.free = asyncio.Queue()
+        for anonymizer in anonymizers:
+            self.free.put_nowait(anonymizer)
+        self.executor = ThreadPoolExecutor(max_workers=len(anonymizers), thread_name_prefix="anonymizer")
+        self._tasks = set()
+        self._batcher = asyncio.create_task(self._run_batcher())
+
+    async def anonymize(self, texts):
+        """(anonymized, spans) per text, once the batches holding them have run."""
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in texts]
+        for text, future in zip(texts, futures):
+            self.queue.put_nowait((text, future))
+        self.metrics.max_queue_depth = max(self.metrics.max_queue_depth, self.queue.qsize())
+        return await asyncio.gather(*futures)
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run_batcher(self):
+        while True:
+            # Wait for a free worker first: meanwhile the queue fills and the next batch grows
+            anonymizer = await self.free.get()
+            batch = await self._collect()
+            task = asyncio.create_task(self._run_batch(anonymizer, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, anonymizer, batch):
+        texts = [text for text, _ in batch]
+        t0 = time.perf_counter()
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, anonymizer.anonymize, texts)
+        except Exception as e:
+            self.metrics.errors += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.metrics.record_batch(len(batch), time.perf_counter() - t0)
+            self.free.put_nowait(anonymizer)
+
+    def snapshot(self):
+        return self.metrics.snapshot(self.queue.qsize(), len(self._tasks), len(self.anonymizers))
+
+    async def close(self):
+        self._batcher.cancel()
+        await asyncio.gather(self._batcher, *self._tasks, return_exceptions=True)
+        self.executor.shutdown(wait=True)
+
+
+# -------------------------------------------------------------------------
+# HTTP (over TCP or a Unix socket)
+# -------------------------------------------------------------------------
+class MessageError(ValueError):
+    """An HTTP message that cannot be read; answered with `status` and the connection closed."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+async def read_message(reader):
+    """(first line, headers, body) of one HTTP/1.1 message, or None at EOF."""
+    first_line = await reader.readline()
+    if not first_line:
+        return None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise MessageError(400, "invalid Content-Length") from None
+    if length < 0:
+        raise MessageError(400, "invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise MessageError(413, "body too large")
+    body = await reader.readexactly(length)
+    return first_line.decode("latin-1").strip(), headers, body
+
+class AnonymizerService:
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        if method == "GET" and path == "/metrics":
+            return 200, self.batcher.snapshot()
+        if method != "POST" or path != "/anonymize":
+            return 404, {"error": f"no route {method} {path}"}
+        try:
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise TypeError("body must be a JSON object")
+            texts = payload["texts"] if "texts" in payload else [payload["text"]]
+            if not isinstance(texts, list):
+                raise TypeError("texts must be a list")
+            if not all(isinstance(text, str) for text in texts):
+                raise TypeError("texts must be strings")
+        except (ValueError, KeyError, TypeError) as e:
+            return 400, {"error": f"expected {{\"texts\": [...]}} or {{\"text\": \"...\"}}: {e}"}
+
+        t0 = time.perf_counter()
+        results = await self.batcher.anonymize(texts) if texts else []
+        metrics = self.batcher.metrics
+        metrics.requests += 1
+        metrics.texts += len(texts)
+        metrics.request_latency.append(time.perf_counter() - t0)
+        return 200, {"results": [{"anonymized": masked, "entities": spans} for masked, spans in results]}
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    message = await read_message(reader)
+                except MessageError as e:
+                    status, payload, headers = e.status, {"error": str(e)}, {"connection": "close"}
+                else:
+                    if message is None:
+                        break
+                    first_line, headers, body = message
+                    method, path = (first_line.split(" ") + ["", ""])[:2]
+                    try:
+                        status, payload = await self.route(method, path, body)
+                    except Exception as e:
+                        status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                             f"Content-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+async def start_server(service, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None):
+    if unix_path:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        return await asyncio.start_unix_server(service.handle, path=unix_path)
+    return await asyncio.start_server(service.handle, host, port)
+
+def build_anonymizers(model_path, model_id, workers, threads=None):
+    """
+    One BatchAnonymizer per worker, all sharing a single loaded model. Each gets its own
+    tokenizer: a fast tokenizer must not be called from two threads at once.
+    """
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+    run, static_shape = load_runner(model_path, threads)
+    labels = load_labels(model_id)
+    return [BatchAnonymizer(run, AutoTokenizer.from_pretrained(model_id), labels, static_shape=static_shape)
+            for _ in range(workers)]
+
+
+# -------------------------------------------------------------------------
+# CLIENT / LOAD TEST
+# -------------------------------------------------------------------------
+class Client:
+    """Minimal keep-alive HTTP client for the service (TCP or Unix socket)."""
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None):
+        self.host, self.port, self.unix_path = host, port, unix_path
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            if self.unix_path:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.unix_path)
+            else:
+                self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        self.writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                          f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1")
+                          + body)
+        await self.writer.drain()
+        status_line, _, data = await read_message(self.reader)
+        return int(status_line.split(" ")[1]), json.loads(data)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+async def load_test(texts, concurrency, n_requests, texts_per_request=1, **address):
+    """Sends n_requests from `concurrency` connections; returns (results in request order, seconds, latencies)."""
+    counter = itertools.count()
+    results = [None] * n_requests
+    latencies = []
+
+    async def connection():
+        client = Client(**address)
+        try:
+            while (i := next(counter)) < n_requests:
+                batch = [texts[(i * texts_per_request + k) % len(texts)] for k in range(texts_per_request)]
+                t0 = time.perf_counter()
+                status, payload = await client.request("POST", "/anonymize", {"texts": batch})
+                latencies.append(time.perf_counter() - t0)
+                if status != 200:
+                    raise RuntimeError(f"HTTP {status}: {payload}")
+                results[i] = payload["results"]
+        finally:
+            await client.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(connection() for _ in range(concurrency)))
+    return results, time.perf_counter() - t0, latencies
+
+def print_load_test(n_requests, texts_per_request, seconds, latencies, metrics):
+    client_ms = percentiles(latencies)
+    print(f"[INFO] ✓ {n_requests} requests ({n_requests * texts_per_request} texts) in {seconds:.2f}s: "
+          f"{n_requests / seconds:,.0f} req/s, client latency p50 {client_ms['p50']} ms / p95 {client_ms['p95']} ms "
+          f"/ p99 {client_ms['p99']} ms")
+    print(f"[INFO] Server: {metrics['batches']} batches, mean size {metrics['mean_batch_size']}, "
+          f"max queue depth {metrics['max_queue_depth']}")
+    print(json.dumps(metrics["batch_size_histogram"]))
+
+
+# -------------------------------------------------------------------------
+# COMMANDS
+# -------------------------------------------------------------------------
+def read_texts(path):
+    if path is None:
+        return BENCH_TEXTS
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+async def serve(args):
+    anonymizers = build_anonymizers(args.model, args.model_id, args.workers, args.threads)
+    batcher = MicroBatcher(anonymizers, args.max_batch, args.max_wait_ms)
+    server = await start_server(AnonymizerService(batcher), args.host, args.port, args.unix)
+    where = args.unix or f"http://{args.host}:{args.port}"
+    print(f"[INFO] ✓ Serving {args.model} on {where} ({args.workers} workers, max batch {args.max_batch}, "
+          f"max wait {args.max_wait_ms} ms)")
+
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        asyncio.get_running_loop().add_signal_handler(sig, stop.set)
+    async with server:
+        await stop.wait()
+    await batcher.close()
+    if args.unix and os.path.exists(args.unix):
+        os.unlink(args.unix)
+    print("[INFO] Stopped.")
+
+async def bench(args):
+    address = {"unix_path": args.unix} if args.unix else {"host": args.host, "port": args.port}
+    texts = read_texts(args.corpus)
+    _, seconds, latencies = await load_test(texts, args.concurrency, args.requests, args.texts_per_request, **address)
+    client = Client(**address)
+    _, metrics = await client.request("GET", "/metrics")
+    await client.close()
+    print_load_test(args.requests, args.texts_per_request, seconds, latencies, metrics)
+
+async def selftest(args):
+    """Starts the service on a temporary Unix socket (or a free port), load-tests it and checks parity."""
+    anonymizers = build_anonymizers(args.model, args.model_id, args.workers, args.threads)
+    batcher = MicroBatcher(anonymizers, args.max_batch, args.max_wait_ms)
+    service = AnonymizerService(batcher)
+    texts = read_texts(args.corpus)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if hasattr(asyncio, "start_unix_server") and not args.tcp:
+            address = {"unix_path": os.path.join(tmp, "anonymizer.sock")}
+            server = await start_server(service, unix_path=address["unix_path"])
+        else:
+            server = await start_server(service, "127.0.0.1", 0)
+            address = {"host": "127.0.0.1", "port": server.sockets[0].getsockname()[1]}
+        async with server:
+            results, seconds, latencies = await load_test(texts, args.concurrency, args.requests,
+                                                          args.texts_per_request, **address)
+            client = Client(**address)
+            _, metrics = await client.request("GET", "/metrics")
+            await client.close()
+    await batcher.close()
+    print_load_test(args.requests, args.texts_per_request, seconds, latencies, metrics)
+
+    # Same texts, one direct batch: micro-batching must not change any result
+    expected = {text: masked for text, (masked, _) in zip(texts, anonymizers[0].anonymize(texts))}
+    mismatches = sum(result["anonymized"] != expected[texts[(i * args.texts_per_request + k) % len(texts)]]
+                     for i, request in enumerate(results) for k, result in enumerate(request))
+    if mismatches:
+        print(f"[ERROR] {mismatches} texts differ from direct BatchAnonymizer output.")
+        sys.exit(1)
+    print("[INFO] ✓ All responses match direct BatchAnonymizer output.")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local micro-batching anonymization service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_address(p):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=DEFAULT_PORT)
+        p.add_argument("--unix", default=None, help="Unix socket path (instead of TCP).")
+
+    def add_model(p):
+        p.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Traced .pt, .pt2 or .onnx model.")
+        p.add_argument("--model-id", default=MODEL_ID, help="Tokenizer and label set.")
+        p.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Batches run concurrently.")
+        p.add_argument("--threads", type=int, default=None, help="Intra-op threads (default: cpu_count / workers).")
+        p.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="Texts per micro-batch.")
+        p.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                       help="How long a batch waits for more texts after its first one.")
+
+    def add_load(p):
+        p.add_argument("--corpus", default=None, help="Texts, one per line (default: built-in samples).")
+        p.add_argument("--concurrency", type=int, default=32, help="Concurrent client connections.")
+        p.add_argument("--requests", type=int, default=2000)
+        p.add_argument("--texts-per-request", type=int, default=1)
+
+    serve_parser = commands.add_parser("serve", help="Run the service.")
+    add_address(serve_parser)
+    add_model(serve_parser)
+    bench_parser = commands.add_parser("bench", help="Load-test a running service.")
+    add_address(bench_parser)
+    add_load(bench_parser)
+    selftest_parser = commands.add_parser("selftest", help="Serve on a temporary socket, load-test, check parity.")
+    add_model(selftest_parser)
+    add_load(selftest_parser)
+    selftest_parser.add_argument("--tcp", action="store_true", help="Use a free localhost port instead of a socket.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    asyncio.run({"serve": serve, "bench": bench, "selftest": selftest}[args.command](args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Batch anonymizer for JSONL / CSV text streams with the exported tanaos model.
+
+The script:
+1. Streams records from a JSONL or CSV file (or stdin) in chunks of --chunk-size
+2. Tokenizes each chunk in one call (with character offsets, truncated to MAX_LENGTH)
+3. Sorts the chunk by token length and cuts it into batches, each padded only to the
+   smallest length bucket (16/32/64/128) that holds its longest row
+4. Runs the traced TorchScript (.pt), Exported Program (.pt2) or ONNX model on every batch
+5. Turns the logits into spans for the whole batch at once (span_decoder.py), replaces
+   them with the README placeholders and writes the records back in input order
+
+Usage:
+    python batch_anonymize.py --input logs.jsonl --output logs.anonymized.jsonl
+    python batch_anonymize.py --input users.csv --text-field comment --output users.anonymized.csv
+    cat logs.jsonl | python batch_anonymize.py --format jsonl --model model.onnx > out.jsonl
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from transformers import AutoConfig, AutoTokenizer
+
+from extract_tanaos_trace import MAX_LENGTH, MODEL_ID, PROJECT_NAME
+from span_decoder import SpanDecoder, padded_offsets
+
+DEFAULT_MODEL_PATH = os.path.join("model_zoo", PROJECT_NAME, "model", f"{PROJECT_NAME}.pt")
+LENGTH_BUCKETS = (16, 32, 64, MAX_LENGTH)
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_CHUNK_SIZE = 4096
+
+
+# -------------------------------------------------------------------------
+# MODEL
+# -------------------------------------------------------------------------
+def load_runner(model_path, num_threads=None):
+    """
+    Returns (run, static_shape): run(input_ids, attention_mask) -> logits as numpy
+    [batch, seq_len, num_labels]. static_shape is (batch, seq_len) with None for the
+    dynamic axes; the traced .pt (and the .pt2, up to its exported bounds) takes any shape.
+    """
+    if model_path.endswith(".onnx"):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        names = [i.name for i in session.get_inputs()]
+        shape = session.get_inputs()[0].shape
+        static_shape = tuple(dim if isinstance(dim, int) else None for dim in shape[:2])
+
+        def run(input_ids, attention_mask):
+            return session.run(None, {names[0]: input_ids, names[1]: attention_mask})[0]
+        return run, static_shape
+
+    import torch
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if model_path.endswith(".pt2"):
+        model = torch.export.load(model_path).module()
+    else:
+        model = torch.jit.load(model_path).eval()
+
+    def run(input_ids, attention_mask):
+        with torch.inference_mode():
+            return model(torch.from_numpy(input_ids), torch.from_numpy(attention_mask)).numpy()
+    return run, (None, None)
+
+def load_labels(model_id=MODEL_ID):
+    """id -> entity name, with the B-/I- prefixes of a BIO label set kept."""
+    config = AutoConfig.from_pretrained(model_id)
+    return [config.id2label[i] for i in range(config.num_labels)]
+
+
+# -------------------------------------------------------------------------
+# BATCHING
+# -------------------------------------------------------------------------
+class BatchAnonymizer:
+    """
+    anonymize(texts) -> [(masked_text, spans)] in input order. Rows are sorted by
+    token length, so each batch is padded to a bucket close to its own longest row
+    instead of to MAX_LENGTH.
+    """
+
+    def __init__(self, run, tokenizer, labels, batch_size=DEFAULT_BATCH_SIZE, buckets=LENGTH_BUCKETS,
+                 static_shape=(None, None)):
+        self.run = run
+        self.tokenizer = tokenizer
+        self.labels = labels
+        self.decoder = SpanDecoder(labels)
+        static_batch, static_length = static_shape
+        # A static ONNX graph fixes the batch and / or the padded length
+        self.batch_size = static_batch or batch_size
+        self.static_batch = static_batch
+        self.buckets = (static_length,) if static_length else tuple(sorted(buckets))
+        self.stats = {"records": 0, "truncated": 0, "batches": 0, "tokens": 0, "padded_tokens": 0}
+
+    def bucket_length(self, length):
+        for bucket in self.buckets:
+            if length <= bucket:
+                return bucket
+        return self.buckets[-1]
+
+    def forward(self, rows):
+        """Logits of the token rows (lists of ids), padded to one bucket."""
+        length = self.bucket_length(max(len(ids) for ids in rows))
+        n_rows = self.static_batch or len(rows)
+        input_ids = np.full((n_rows, length), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((n_rows, length), dtype=np.int64)
+        for i, ids in enumerate(rows):
+            input_ids[i, :len(ids)] = ids
+            attention_mask[i, :len(ids)] = 1
+        self.stats["batches"] += 1
+        self.stats["padded_tokens"] += n_rows * length
+        return self.run(input_ids, attention_mask)[:len(rows)]
+
+    def anonymize(self, texts):
+        if not texts:
+            return []
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.buckets[-1],
+                                 return_offsets_mapping=True)
+        all_ids = encoded["input_ids"]
+        all_offsets = encoded["offset_mapping"]
+        self.stats["records"] += len(texts)
+        self.stats["tokens"] += sum(len(ids) for ids in all_ids)
+
+        results = [None] * len(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(all_ids[i]))
+        for begin in range(0, len(order), self.batch_size):
+            batch = order[begin:begin + self.batch_size]
+            logits = self.forward([all_ids[i] for i in batch])
+            batch_texts = [texts[i] for i in batch]
+            spans = self.decoder.decode(logits, padded_offsets([all_offsets[i] for i in batch], logits.shape[1]))
+            masked = self.decoder.apply_placeholders(batch_texts, spans)
+            for i, text, row_masked, row_spans in zip(batch, batch_texts, masked,
+                                                      self.decoder.to_lists(spans, len(batch))):
+                results[i] = (row_masked, row_spans)
+                # The tokens past the window were never seen by the model
+                last_end = max((end for _, end in all_offsets[i]), default=0)
+                if text[last_end:].strip():
+                    self.stats["truncated"] += 1
+        return results
+
+
+# -------------------------------------------------------------------------
+# STREAMS
+# -------------------------------------------------------------------------
+def detect_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if extension in (".csv", ".tsv"):
+        return "csv"
+    raise ValueError(f"Cannot tell the format of {path}; pass --format jsonl|csv")
+
+def open_stream(path, mode):
+    if path == "-":
+        return sys.stdin if mode == "r" else sys.stdout
+    return open(path, mode, encoding="utf-8", newline="")
+
+def read_records(f, fmt):
+    if fmt == "jsonl":
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(f)
+
+def iter_chunks(records, chunk_size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def anonymize_records(anonymizer, records, text_field, output_field, entities_field=None,
+                      chunk_size=DEFAULT_CHUNK_SIZE):
+    """Streams the records back in input order with `output_field` anonymized."""
+    for chunk in iter_chunks(records, chunk_size):
+        # Records without a text value pass through untouched
+        rows = [i for i, record in enumerate(chunk) if isinstance(record.get(text_field), str)]
+        results = anonymizer.anonymize([chunk[i][text_field] for i in rows])
+        for i, (masked, spans) in zip(rows, results):
+            chunk[i][output_field] = masked
+            if entities_field:
+                chunk[i][entities_field] = spans
+        yield from chunk
+
+def write_records(f, fmt, records, extra_fields=()):
+    if fmt == "jsonl":
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        return
+    writer = None
+    for record in records:
+        if writer is None:
+            fieldnames = list(record) + [name for name in extra_fields if name and name not in record]
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+        writer.writerow({key: json.dumps(value) if isinstance(value, list) else value
+                         for key, value in record.items()})
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Anonymize JSONL / CSV text streams in length-bucketed batches.")
+    parser.add_argument("--input", default="-", help="JSONL or CSV file ('-' = stdin).")
+    parser.add_argument("--output", default="-", help="Output file in the input format ('-' = stdout).")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None,
+                        help="Stream format (default: from the input file extension).")
+    parser.add_argument("--text-field", default="text", help="JSON key / CSV column holding the text.")
+    parser.add_argument("--output-field", default=None,
+                        help="Where to write the anonymized text (default: overwrite --text-field).")
+    parser.add_argument("--entities-field", default=None,
+                        help="Also write the detected spans (label, start, end) to this field.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Traced .pt, .pt2 or .onnx model.")
+    parser.add_argument("--model-id", default=MODEL_ID, help="Tokenizer and label set.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Records read, sorted and written back per chunk.")
+    parser.add_argument("--buckets", type=int, nargs="+", default=list(LENGTH_BUCKETS),
+                        help="Padded lengths (the largest one is the truncation length).")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads of the model.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if max(args.buckets) > MAX_LENGTH:
+        print(f"[ERROR] Buckets must not exceed the model's {MAX_LENGTH} positions.", file=sys.stderr)
+        sys.exit(1)
+    fmt = args.format or detect_format(args.input if args.input != "-" else args.output)
+    output_field = args.output_field or args.text_field
+
+    # Progress goes to stderr: stdout may be the record stream
+    log = sys.stderr
+    print(f"[INFO] Loading {args.model}...", file=log)
+    run, static_shape = load_runner(args.model, args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    anonymizer = BatchAnonymizer(run, tokenizer, load_labels(args.model_id), args.batch_size, args.buckets,
+                                 static_shape)
+    print(f"[INFO] Buckets: {list(anonymizer.buckets)}, batch size: {anonymizer.batch_size}", file=log)
+
+    t0 = time.perf_counter()
+    with open_stream(args.input, "r") as fin, open_stream(args.output, "w") as fout:
+        records = anonymize_records(anonymizer, read_records(fin, fmt), args.text_field, output_field,
+                                    args.entities_field, args.chunk_size)
+        write_records(fout, fmt, records, (output_field, args.entities_field))
+    elapsed = time.perf_counter() - t0
+
+    stats = anonymizer.stats
+    print(f"[INFO] ✓ Anonymized {stats['records']} records in {elapsed:.1f}s "
+          f"({stats['records'] / elapsed * 60:,.0f} records/min, {stats['batches']} batches)", file=log)
+    if stats["padded_tokens"]:
+        print(f"[INFO] Padding efficiency: {stats['tokens'] / stats['padded_tokens']:.1%} "
+              f"of {stats['padded_tokens']} positions are real tokens", file=log)
+    if stats["truncated"]:
+        print(f"[WARN] {stats['truncated']} records are longer than {anonymizer.buckets[-1]} tokens; "
+              f"text past the window was NOT anonymized (see long_text_anonymize.py).", file=log)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Accuracy, CPU latency and size of the exported anonymizer variants.
+
+For every variant (.pt, .pt2, .onnx, -int8.onnx) this reports:
+- entity-level precision / recall / F1 on a labeled corpus: a predicted span counts
+  only if its label, start and end match a gold span exactly
+- CPU latency of one [1, MAX_LENGTH] forward pass (the app's input shape), p50 / p95
+- file size
+
+extract_tanaos_trace.py uses it to accept or reject the int8 ONNX model; it can also
+be run on its own against the artifacts in model_zoo.
+
+The labeled corpus is JSONL: {"text": "...", "entities": [{"label", "start", "end"}]}
+with character offsets (default: samples/labeled_pii.jsonl).
+
+Usage:
+    python evaluate_variants.py
+    python evaluate_variants.py --corpus my_labeled.jsonl --output report.json
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from batch_anonymize import BatchAnonymizer, load_labels, load_runner
+from extract_tanaos_trace import EVAL_CORPUS, MAX_LENGTH, MODEL_ID, SAMPLE_TEXT, variant_paths
+
+LATENCY_REPEATS = 50
+
+
+def read_labeled_corpus(path=EVAL_CORPUS):
+    texts, gold = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                texts.append(example["text"])
+                gold.append(example["entities"])
+    return texts, gold
+
+def entity_f1(predicted, gold):
+    """Exact-match entity precision / recall / F1 over lists of per-text span lists."""
+    def as_set(spans_per_text):
+        return {(row, s["label"], s["start"], s["end"]) for row, spans in enumerate(spans_per_text) for s in spans}
+
+    predicted, gold = as_set(predicted), as_set(gold)
+    hits = len(predicted & gold)
+    precision = hits / len(predicted) if predicted else 0.0
+    recall = hits / len(gold) if gold else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
+
+def f1_resolution(gold):
+    """
+    F1 change caused by one mismatched span. It is 2 / (predicted + gold spans), so
+    about 1 / gold spans when the model predicts roughly as many spans as there are.
+    """
+    n_gold = sum(len(spans) for spans in gold)
+    return 1.0 / n_gold if n_gold else 1.0
+
+def cpu_latency(run, input_ids, attention_mask, repeats=LATENCY_REPEATS, warmup=5):
+    for _ in range(warmup):
+        run(input_ids, attention_mask)
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        run(input_ids, attention_mask)
+        times.append(time.perf_counter() - t0)
+    p50, p95 = np.percentile(np.array(times) * 1000, (50, 95))
+    return float(p50), float(p95)
+
+def evaluate_variant(path, tokenizer, labels, texts, gold, num_threads=None):
+    run, static_shape = load_runner(path, num_threads)
+    anonymizer = BatchAnonymizer(run, tokenizer, labels, buckets=(MAX_LENGTH,), static_shape=static_shape)
+    predicted = [spans for _, spans in anonymizer.anonymize(texts)]
+
+    sample = tokenizer(SAMPLE_TEXT, padding="max_length", max_length=MAX_LENGTH, truncation=True,
+                       return_tensors="np")
+    p50, p95 = cpu_latency(run, sample["input_ids"].astype(np.int64), sample["attention_mask"].astype(np.int64))
+    return {
+        "size_mb": os.path.getsize(path) / 2**20,
+        "latency_ms_p50": p50,
+        "latency_ms_p95": p95,
+        **entity_f1(predicted, gold),
+    }
+
+def evaluate_variants(paths, model_id=MODEL_ID, corpus=EVAL_CORPUS, num_threads=None):
+    """{variant name: metrics} for every existing path of {name: path}."""
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    labels = load_labels(model_id)
+    texts, gold = read_labeled_corpus(corpus)
+    return {name: evaluate_variant(path, tokenizer, labels, texts, gold, num_threads)
+            for name, path in paths.items() if os.path.exists(path)}
+
+def print_report(results):
+    print(f"\n{'variant':<14}{'size MB':>9}{'p50 ms':>9}{'p95 ms':>9}{'precision':>11}{'recall':>8}{'F1':>8}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['size_mb']:>9.1f}{r['latency_ms_p50']:>9.2f}{r['latency_ms_p95']:>9.2f}"
+              f"{r['precision']:>11.3f}{r['recall']:>8.3f}{r['f1']:>8.3f}")
+
+def write_report(path, results, **meta):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "variants": {name: {k: round(v, 4) for k, v in r.items()}
+                                              for name, r in results.items()}}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Entity F1, CPU latency and size of the exported variants.")
+    parser.add_argument("--corpus", default=EVAL_CORPUS, help="Labeled JSONL corpus.")
+    parser.add_argument("--model-id", default=MODEL_ID, help="Tokenizer and label set.")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads of the model.")
+    parser.add_argument("--output", default=None, help="JSON report file.")
+    args = parser.parse_args()
+
+    results = evaluate_variants(variant_paths(), args.model_id, args.corpus, args.threads)
+    if not results:
+        print("[ERROR] No exported variants found; run extract_tanaos_trace.py first.")
+        exit(1)
+    print_report(results)
+    if args.output:
+        write_report(args.output, results, model_id=args.model_id, corpus=os.path.basename(args.corpus))
+        print(f"\n[INFO] ✓ Report saved to {args.output}")
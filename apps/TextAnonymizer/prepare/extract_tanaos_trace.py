@@ -8,17 +8,152 @@ This script:
 3. Creates a wrapper (Token Classification)
 4. Traces it to TorchScript format (.pt)
 5. Saves sequential input token IDs as .npy files
+6. Also exports an Exported Program (.pt2) and ONNX (.onnx), both with dynamic
+   batch / sequence axes, and a dynamically quantized int8 ONNX (-int8.onnx)
+7. Accepts the int8 model only if its entity F1 on a labeled corpus is within
+   --f1-delta of the fp32 ONNX model, and reports the size, CPU latency and F1 of
+   every variant (variants_report.json, see evaluate_variants.py)
+
+Outputs are cached (export_cache.py): a re-run with unchanged weights, wrapper and
+settings reuses them and only rewrites export_manifest.json. --force rebuilds.
 """
 
+import argparse
 import os
+import sys
 import numpy as np
 import torch
 import torch.nn as nn
 from transformers import AutoModelForTokenClassification, AutoTokenizer
 
-def main():
+# export_cache.py is shared by the apps' prepare scripts (tools/ at the repository root)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "tools"))
+from export_cache import ExportCache, library_versions, source_digest
+
+PROJECT_NAME = "tanaos-text-anonymizer-v1"
+MODEL_ID = "tanaos/tanaos-text-anonymizer-v1"
+MAX_LENGTH = 128  # Fixed length is preferred for static graph compilation
+SAMPLE_TEXT = "My name is Sarah Connor and I live in Los Angeles."
+ONNX_OPSET = 18
+MAX_BATCH = 1024  # upper bound of the .pt2 batch axis
+DEFAULT_F1_DELTA = 0.01  # largest entity-F1 drop accepted for the int8 ONNX model, on large corpora
+EVAL_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples", "labeled_pii.jsonl")
+
+
+class TanaosModelWrapper(nn.Module):
+    """
+    Wraps the Token Classification model to return raw logits.
+    Required because TorchScript works with Tensors, not dicts.
+    """
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        """
+        Args:
+            input_ids: [batch, seq_len]
+            attention_mask: [batch, seq_len]
+        Returns:
+            logits: [batch, seq_len, num_labels]
+        """
+        # return_dict=True allows us to access .logits safely
+        outputs = self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)
+        return outputs.logits
+
+
+def variant_paths(model_dir=os.path.join("model_zoo", PROJECT_NAME, "model")):
+    """Artifact path of every exported variant."""
+    return {
+        "torchscript": os.path.join(model_dir, f"{PROJECT_NAME}.pt"),
+        "pt2": os.path.join(model_dir, f"{PROJECT_NAME}.pt2"),
+        "onnx": os.path.join(model_dir, f"{PROJECT_NAME}.onnx"),
+        "onnx-int8": os.path.join(model_dir, f"{PROJECT_NAME}-int8.onnx"),
+    }
+
+def export_cache_keys(cache, eval_corpus=EVAL_CORPUS, f1_delta=DEFAULT_F1_DELTA):
+    """Cache keys of the sample inputs and of each variant (None until the weights are local)."""
+    weights = cache.weights_digest(MODEL_ID)
+    inputs_key = cache.key(weights=weights, text=SAMPLE_TEXT, max_length=MAX_LENGTH, dtype="int64")
+    common = dict(weights=weights, wrapper=source_digest(TanaosModelWrapper), inputs=inputs_key, dtype="float32")
+    pt_key = cache.key(
+        **common, versions=library_versions("torch", "transformers"), format="torchscript",
+        trace={"strict": False, "check_trace": False},
+    )
+    onnx_key = cache.key(
+        **common, versions=library_versions("torch", "onnx", "transformers"), format="onnx",
+        opset=ONNX_OPSET, dynamic_axes=["batch", "seq"],
+    )
+    format_keys = {
+        "torchscript": pt_key,
+        "pt2": cache.key(
+            **common, versions=library_versions("torch", "transformers"), format="pt2",
+            dynamic_shapes={"batch": [1, MAX_BATCH], "seq": [2, MAX_LENGTH]},
+        ),
+        "onnx": onnx_key,
+        # Acceptance depends on the labeled corpus and the allowed F1 drop
+        "onnx-int8": cache.key(
+            onnx=onnx_key, versions=library_versions("onnxruntime"), format="onnx-int8",
+            quantization={"mode": "dynamic", "weight_type": "QInt8"},
+            eval_corpus=cache.file_digest(eval_corpus), f1_delta=f1_delta,
+        ),
+    }
+    return inputs_key, format_keys
+
+def export_pt2(wrapped_model, example_inputs, pt2_path):
+    batch = torch.export.Dim("batch", min=1, max=MAX_BATCH)
+    seq = torch.export.Dim("seq", min=2, max=MAX_LENGTH)
+    exported_program = torch.export.export(
+        wrapped_model, example_inputs, dynamic_shapes=({0: batch, 1: seq}, {0: batch, 1: seq}), strict=False,
+    )
+    torch.export.save(exported_program, pt2_path)
+
+def export_onnx(wrapped_model, example_inputs, onnx_path):
+    import inspect
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        export_kwargs["dynamo"] = False
+    axes = {0: "batch", 1: "seq"}
+    torch.onnx.export(
+        wrapped_model,
+        example_inputs,
+        onnx_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        opset_version=ONNX_OPSET,
+        dynamic_axes={"input_ids": axes, "attention_mask": axes, "logits": axes},
+        **export_kwargs
+    )
+
+def quantize_int8(onnx_path, int8_path):
+    """Dynamic quantization: int8 weights, activations quantized on the fly at run time."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+
+def print_test_command(base_dir, pt_path, input_ids_path, attention_mask_path):
+    print("\n" + "="*60)
+    print("READY TO RUN TEST")
+    print("="*60)
+    print("Copy and run this command:")
+    print(f"./unit_test/test_bash/test_qnn_converter.sh \\")
+    print(f"  {pt_path} \\")
+    print(f"  {input_ids_path},{attention_mask_path} \\")
+    print(f"  {base_dir}/output_results")
+    print("="*60)
+
+def default_f1_delta(eval_corpus=EVAL_CORPUS):
+    """
+    DEFAULT_F1_DELTA, or the corpus' F1 resolution when that is coarser: on a small corpus
+    one span moves F1 by more than 0.01, so a 0.01 gate would reject any single difference.
+    """
+    from evaluate_variants import f1_resolution, read_labeled_corpus
+
+    _, gold = read_labeled_corpus(eval_corpus)
+    return max(DEFAULT_F1_DELTA, f1_resolution(gold))
+
+def main(force=False, f1_delta=None, eval_corpus=EVAL_CORPUS):
     # 1. Setup Directories
-    project_name = "tanaos-text-anonymizer-v1"
+    project_name = PROJECT_NAME
     
     # Create structure relative to current working directory
     base_dir = os.path.join("model_zoo", project_name)
@@ -32,8 +167,33 @@ def main():
     print(f"[INFO] Model directory: {model_dir}")
     print(f"[INFO] Inputs directory: {inputs_dir}")
 
+    if f1_delta is None:
+        f1_delta = default_f1_delta(eval_corpus)
+        print(f"[INFO] int8 F1 gate: {f1_delta:.4f} (one span of {os.path.basename(eval_corpus)} "
+              f"moves F1 by about that much)")
+
+    input_ids_path = os.path.join(inputs_dir, "input_ids.npy")
+    attention_mask_path = os.path.join(inputs_dir, "attention_mask.npy")
+    paths = variant_paths(model_dir)
+    pt_path = paths["torchscript"]
+    report_path = os.path.join(model_dir, "variants_report.json")
+
+    # Skip the export when the artifacts were built from the same weights/wrapper/settings
+    cache = ExportCache(base_dir, force=force)
+    inputs_key, format_keys = export_cache_keys(cache, eval_corpus, f1_delta)
+    inputs_fresh = all(cache.is_fresh(path, inputs_key) for path in (input_ids_path, attention_mask_path))
+    if inputs_fresh:
+        cache.reuse(input_ids_path, inputs_key)
+        cache.reuse(attention_mask_path, inputs_key)
+    fresh = {fmt: cache.reuse(path, format_keys[fmt]) for fmt, path in paths.items()}
+    if inputs_fresh and all(fresh.values()):
+        print("[INFO] ✓ All artifacts are up to date, nothing to export (use --force to rebuild).")
+        cache.write_manifest()
+        print_test_command(base_dir, pt_path, input_ids_path, attention_mask_path)
+        return
+
     # 2. Load Model and Tokenizer
-    model_id = "tanaos/tanaos-text-anonymizer-v1"
+    model_id = MODEL_ID
     print(f"\n[INFO] Loading model: {model_id}...")
 
     try:
@@ -53,38 +213,22 @@ def main():
         print(f"[ERROR] Failed to load model. Error: {e}")
         exit(1)
 
-    # 3. Model Wrapper
-    class TanaosModelWrapper(nn.Module):
-        """
-        Wraps the Token Classification model to return raw logits.
-        Required because TorchScript works with Tensors, not dicts.
-        """
-        def __init__(self, model):
-            super().__init__()
-            self.model = model
-
-        def forward(self, input_ids, attention_mask):
-            """
-            Args:
-                input_ids: [batch, seq_len]
-                attention_mask: [batch, seq_len]
-            Returns:
-                logits: [batch, seq_len, num_labels]
-            """
-            # return_dict=True allows us to access .logits safely
-            outputs = self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=True)
-            return outputs.logits
+    if inputs_key is None or None in format_keys.values():
+        # Weights were just downloaded: now they can be digested
+        inputs_key, format_keys = export_cache_keys(cache, eval_corpus, f1_delta)
+
+    # 3. Model Wrapper: TanaosModelWrapper (module level, hashed into the cache key)
 
     # 4. Prepare Sequential Inputs
     print(f"\n[INFO] Preparing sequential input tokens...")
     # Sample text containing PII (Name, Location)
-    sample_text = "My name is Sarah Connor and I live in Los Angeles."
+    sample_text = SAMPLE_TEXT
 
     inputs = tokenizer(
         sample_text,
         return_tensors="pt",
         padding="max_length", 
-        max_length=128,       # Fixed length is preferred for static graph compilation
+        max_length=MAX_LENGTH,
         truncation=True
     )
 
@@ -95,58 +239,134 @@ def main():
     print(f"[INFO] Input shapes: ids={input_ids.shape}, mask={attention_mask.shape}")
 
     # Save the sequential input_ids and attention_mask
-    input_ids_path = os.path.join(inputs_dir, "input_ids.npy")
-    attention_mask_path = os.path.join(inputs_dir, "attention_mask.npy")
-    
-    # Save as Int64 (Standard for PyTorch)
-    np.save(input_ids_path, input_ids.cpu().numpy().astype(np.int64))
-    np.save(attention_mask_path, attention_mask.cpu().numpy().astype(np.int64))
-    print(f"[INFO] ✓ Inputs saved to {inputs_dir}")
+    if not inputs_fresh:
+        # Save as Int64 (Standard for PyTorch)
+        np.save(input_ids_path, input_ids.cpu().numpy().astype(np.int64))
+        np.save(attention_mask_path, attention_mask.cpu().numpy().astype(np.int64))
+        cache.record(input_ids_path, inputs_key)
+        cache.record(attention_mask_path, inputs_key)
+        print(f"[INFO] ✓ Inputs saved to {inputs_dir}")
 
-    # 5. Trace and Save (.pt)
-    print(f"\n[INFO] Tracing model to TorchScript...")
     wrapped_model = TanaosModelWrapper(model).eval()
 
-    try:
-        with torch.no_grad():
-            # Trace the model
-            traced_model = torch.jit.trace(
-                wrapped_model,
-                (input_ids, attention_mask),
-                strict=False,
-                check_trace=False
-            )
-        
-        # Save the traced model
-        pt_filename = f"{project_name}.pt"
-        pt_path = os.path.join(model_dir, pt_filename)
-        
-        torch.jit.save(traced_model, pt_path)
-        print(f"[INFO] ✓ TorchScript model saved to {pt_path}")
-        
-        # Verify reload
-        print(f"[INFO] Verifying reload...")
-        test_model = torch.jit.load(pt_path)
-        test_output = test_model(input_ids, attention_mask)
-        print(f"[INFO] ✓ Inference successful. Output shape: {test_output.shape}")
-        
+    # 5. Trace and Save (.pt)
+    if not fresh["torchscript"]:
+        print(f"\n[INFO] Tracing model to TorchScript...")
+        try:
+            with torch.no_grad():
+                # Trace the model
+                traced_model = torch.jit.trace(
+                    wrapped_model,
+                    (input_ids, attention_mask),
+                    strict=False,
+                    check_trace=False
+                )
 
-        # 6. Print Test Command
-        print("\n" + "="*60)
-        print("READY TO RUN TEST")
-        print("="*60)
-        print("Copy and run this command:")
-        print(f"./unit_test/test_bash/test_qnn_converter.sh \\")
-        print(f"  {pt_path} \\")
-        print(f"  {input_ids_path},{attention_mask_path} \\")
-        print(f"  {base_dir}/output_results")
-        print("="*60)
+            # Save the traced model
+            torch.jit.save(traced_model, pt_path)
+            print(f"[INFO] ✓ TorchScript model saved to {pt_path}")
 
-    except Exception as e:
-        print(f"[ERROR] Failed to trace model: {e}")
-        import traceback
-        traceback.print_exc()
+            # Verify reload
+            print(f"[INFO] Verifying reload...")
+            test_model = torch.jit.load(pt_path)
+            test_output = test_model(input_ids, attention_mask)
+            print(f"[INFO] ✓ Inference successful. Output shape: {test_output.shape}")
+            cache.record(pt_path, format_keys["torchscript"])
+
+        except Exception as e:
+            print(f"[ERROR] Failed to trace model: {e}")
+            import traceback
+            traceback.print_exc()
+            exit(1)
+
+    # The dynamic-axis exports get a batch of 2: a size-1 example would specialize the batch axis
+    example_inputs = (input_ids.repeat(2, 1), attention_mask.repeat(2, 1))
+
+    # Formats whose export failed in this run: an artifact left by an earlier run is stale
+    failed = set()
+
+    # 6. Exported Program (.pt2)
+    if not fresh["pt2"]:
+        print(f"\n[INFO] Exporting to Exported Program ({paths['pt2']})...")
+        try:
+            with torch.no_grad():
+                export_pt2(wrapped_model, example_inputs, paths["pt2"])
+            cache.record(paths["pt2"], format_keys["pt2"])
+            print(f"[INFO] ✓ Exported Program saved to {paths['pt2']}")
+        except Exception as e:
+            print(f"[ERROR] Exported Program export failed: {e}")
+            failed.add("pt2")
+
+    # 7. ONNX (.onnx)
+    if not fresh["onnx"]:
+        print(f"\n[INFO] Exporting to ONNX ({paths['onnx']})...")
+        try:
+            with torch.no_grad():
+                export_onnx(wrapped_model, example_inputs, paths["onnx"])
+            cache.record(paths["onnx"], format_keys["onnx"])
+            print(f"[INFO] ✓ ONNX model saved to {paths['onnx']}")
+        except Exception as e:
+            print(f"[ERROR] ONNX export failed: {e}")
+            # The int8 model is quantized from this graph
+            failed.update(("onnx", "onnx-int8"))
+
+    # 8. Dynamic int8 ONNX, kept only if its entity F1 stays within f1_delta of fp32
+    from evaluate_variants import evaluate_variants, print_report, write_report
+
+    results = {}
+    int8_accepted = fresh["onnx-int8"]
+    if not fresh["onnx-int8"] and "onnx" not in failed and os.path.exists(paths["onnx"]):
+        print(f"\n[INFO] Quantizing ONNX to dynamic int8...")
+        candidate_path = paths["onnx-int8"].replace(".onnx", ".candidate.onnx")
+        try:
+            quantize_int8(paths["onnx"], candidate_path)
+            results = evaluate_variants({"onnx": paths["onnx"], "onnx-int8": candidate_path}, model_id, eval_corpus)
+            f1_drop = results["onnx"]["f1"] - results["onnx-int8"]["f1"]
+            print(f"[INFO] Entity F1: fp32 {results['onnx']['f1']:.4f}, int8 {results['onnx-int8']['f1']:.4f} "
+                  f"(drop {f1_drop:+.4f}, allowed {f1_delta:.4f})")
+            int8_accepted = f1_drop <= f1_delta + 1e-9  # one span of the resolution must pass
+            if int8_accepted:
+                os.replace(candidate_path, paths["onnx-int8"])
+                cache.record(paths["onnx-int8"], format_keys["onnx-int8"])
+                print(f"[INFO] ✓ int8 ONNX model accepted: {paths['onnx-int8']}")
+            else:
+                del results["onnx-int8"]
+                if os.path.exists(paths["onnx-int8"]):
+                    os.remove(paths["onnx-int8"])  # a stale accepted model must not be shipped
+                print(f"[WARN] int8 ONNX model rejected: entity F1 dropped by more than {f1_delta:.4f}.")
+        except Exception as e:
+            print(f"[ERROR] int8 quantization failed: {e}")
+            failed.add("onnx-int8")
+        finally:
+            if os.path.exists(candidate_path):
+                os.remove(candidate_path)
+
+    # 9. Size / CPU latency / entity F1 of every variant
+    print(f"\n[INFO] Evaluating variants on {eval_corpus}...")
+    pending = {name: path for name, path in paths.items() if name not in results and name not in failed}
+    results.update(evaluate_variants(pending, model_id, eval_corpus))
+    results = {name: results[name] for name in paths if name in results}
+    print_report(results)
+    write_report(report_path, results, model_id=model_id, corpus=os.path.basename(eval_corpus),
+                 f1_delta=f1_delta, int8_accepted=int8_accepted)
+    print(f"[INFO] ✓ Report saved to {report_path}")
+
+    cache.write_manifest()
+
+    # 10. Print Test Command
+    print_test_command(base_dir, pt_path, input_ids_path, attention_mask_path)
+
+    if failed:
+        print(f"[ERROR] Export failed for: {', '.join(sorted(failed))}")
         exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Trace tanaos-text-anonymizer-v1 to TorchScript, PT2 and ONNX.")
+    parser.add_argument("--force", action="store_true", help="Rebuild every artifact, ignoring the export cache.")
+    parser.add_argument("--f1-delta", type=float, default=None,
+                        help="Largest entity-F1 drop (vs fp32 ONNX) accepted for the int8 model "
+                             "(default: 0.01, or one span's worth of F1 on a smaller corpus).")
+    parser.add_argument("--eval-corpus", default=EVAL_CORPUS,
+                        help="Labeled JSONL corpus for the int8 acceptance check and the report.")
+    args = parser.parse_args()
+    main(force=args.force, f1_delta=args.f1_delta, eval_corpus=args.eval_corpus)
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Sliding-window anonymization of texts longer than the model's 128 tokens.
+
+The exported model (and the apps' modelMaxLength) sees at most MAX_LENGTH tokens, so
+plain truncation never looks at PII past token 128. This script:
+1. Tokenizes the whole document once and tiles it into MAX_LENGTH-token windows
+   (special tokens included) that start every --stride tokens
+2. Runs all windows of the document through the traced / ONNX model in one batch
+3. Decodes the spans of every window in document character offsets and merges the
+   spans that overlap in the shared tokens
+4. Replaces the merged spans with the placeholders
+
+Tokenization, the forward pass and the merge are all linear in the document length
+(a window per --stride tokens).
+
+Usage:
+    python long_text_anonymize.py --input report.txt --output report.anonymized.txt
+    python long_text_anonymize.py --input report.txt --stride 64 --entities
+    python long_text_anonymize.py --input report.txt --benchmark
+"""
+
+import argparse
+import json
+import sys
+import time
+
+from transformers import AutoTokenizer
+
+from batch_anonymize import DEFAULT_MODEL_PATH, BatchAnonymizer, load_labels, load_runner
+from extract_tanaos_trace import MAX_LENGTH, MODEL_ID
+from span_decoder import mask_text, padded_offsets
+
+DEFAULT_STRIDE = 96  # 30 tokens of overlap between 126-token windows
+
+
+def merge_spans(spans):
+    """
+    Merges spans found by several windows into one span per entity occurrence.
+    Overlapping spans are joined; if their labels disagree, the longer span's label
+    wins. Touching spans are joined only when the label is the same.
+    """
+    merged = []
+    for span in sorted(spans, key=lambda s: (s["start"], -s["end"])):
+        last = merged[-1] if merged else None
+        if last and (span["start"] < last["end"] or
+                     (span["start"] == last["end"] and span["label"] == last["label"])):
+            if span["end"] - span["start"] > last["end"] - last["start"]:
+                last["label"] = span["label"]
+            last["end"] = max(last["end"], span["end"])
+        else:
+            merged.append(dict(span))
+    return merged
+
+
+class LongTextAnonymizer:
+    """anonymize(text) -> (masked_text, spans), for texts of any length."""
+
+    def __init__(self, anonymizer, stride=DEFAULT_STRIDE):
+        self.anonymizer = anonymizer
+        self.tokenizer = anonymizer.tokenizer
+        self.window = anonymizer.buckets[-1]
+        content = self.window - self.tokenizer.num_special_tokens_to_add()
+        if not 0 < stride <= content:
+            raise ValueError(f"stride must be in [1, {content}] for {self.window}-token windows")
+        self.stride = stride
+        # Hugging Face's `stride` is the number of tokens shared by consecutive windows
+        self.overlap = content - stride
+
+    def windows(self, text):
+        """Token ids (without padding) and character offsets of every window of the text."""
+        encoded = self.tokenizer(text, truncation=True, max_length=self.window, stride=self.overlap,
+                                 return_overflowing_tokens=True, return_offsets_mapping=True)
+        return encoded["input_ids"], encoded["offset_mapping"]
+
+    def spans(self, text):
+        rows, offsets = self.windows(text)
+        # One forward pass over all windows (split only if the model has a static batch size)
+        step = self.anonymizer.static_batch or len(rows)
+        decoder = self.anonymizer.decoder
+        spans = []
+        for begin in range(0, len(rows), step):
+            logits = self.anonymizer.forward(rows[begin:begin + step])
+            window_spans = decoder.decode(logits, padded_offsets(offsets[begin:begin + step], logits.shape[1]))
+            spans.extend(span for row in decoder.to_lists(window_spans, len(logits)) for span in row)
+        return merge_spans(spans), len(rows)
+
+    def anonymize(self, text):
+        spans, _ = self.spans(text)
+        return mask_text(text, spans), spans
+
+
+def benchmark(long_anonymizer, text, scales=(1, 2, 4, 8)):
+    """Prints the latency of the document repeated `scales` times (should grow linearly)."""
+    print(f"\n{'copies':>8}{'chars':>10}{'windows':>9}{'ms':>10}{'ms / 1k chars':>15}")
+    for scale in scales:
+        document = "\n".join([text] * scale)
+        long_anonymizer.spans(document)  # warm-up for this batch shape
+        t0 = time.perf_counter()
+        _, n_windows = long_anonymizer.spans(document)
+        ms = (time.perf_counter() - t0) * 1000
+        print(f"{scale:>8}{len(document):>10}{n_windows:>9}{ms:>10.1f}{ms / len(document) * 1000:>15.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Anonymize long texts with overlapping 128-token windows.")
+    parser.add_argument("--input", default="-", help="Text file ('-' = stdin).")
+    parser.add_argument("--output", default="-", help="Anonymized text ('-' = stdout).")
+    parser.add_argument("--stride", type=int, default=DEFAULT_STRIDE,
+                        help="Tokens between the starts of consecutive windows (default: 96).")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Traced .pt, .pt2 or .onnx model.")
+    parser.add_argument("--model-id", default=MODEL_ID, help="Tokenizer and label set.")
+    parser.add_argument("--threads", type=int, default=None, help="Intra-op threads of the model.")
+    parser.add_argument("--entities", action="store_true", help="Print the merged spans as JSON to stderr.")
+    parser.add_argument("--benchmark", action="store_true", help="Time 1x/2x/4x/8x copies of the input.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    log = sys.stderr
+    print(f"[INFO] Loading {args.model}...", file=log)
+    run, static_shape = load_runner(args.model, args.threads)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    anonymizer = BatchAnonymizer(run, tokenizer, load_labels(args.model_id), buckets=(MAX_LENGTH,),
+                                 static_shape=static_shape)
+    long_anonymizer = LongTextAnonymizer(anonymizer, args.stride)
+
+    with (sys.stdin if args.input == "-" else open(args.input, "r", encoding="utf-8")) as f:
+        text = f.read()
+
+    if args.benchmark:
+        benchmark(long_anonymizer, text)
+        return
+
+    t0 = time.perf_counter()
+    spans, n_windows = long_anonymizer.spans(text)
+    masked = mask_text(text, spans)
+    elapsed = time.perf_counter() - t0
+
+    # What plain truncation to the first window would have left unmasked
+    first_window_end = max(end for _, end in long_anonymizer.windows(text)[1][0])
+    missed = sum(span["start"] >= first_window_end for span in spans)
+    print(f"[INFO] ✓ {len(text)} chars, {n_windows} windows (stride {args.stride}), {len(spans)} entities "
+          f"in {elapsed * 1000:.1f} ms", file=log)
+    if missed:
+        print(f"[INFO] {missed} entities lie past the first {MAX_LENGTH} tokens (missed by truncation).", file=log)
+    if args.entities:
+        print(json.dumps(spans, ensure_ascii=False), file=log)
+
+    if args.output == "-":
+        sys.stdout.write(masked)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(masked)
+        print(f"[INFO] ✓ Saved to {args.output}", file=log)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+Logits -> entity spans -> masked text, for whole batches at once with NumPy.
+
+This is the host-side reference of the apps' extractSpansFromLogits / applyPlaceholders:
+- argmax and softmax over [batch, seq_len, num_labels] logits in one call
+- BIO span assembly with run-length operations on the flattened non-special
+  tokens: a run breaks at a row, entity or B- tag change, and O runs are dropped
+- token -> character spans through the tokenizer's offset mapping
+- placeholders applied to every text of the batch in one pass
+
+decode_spans / mask_text are the plain per-token loops, kept as the readable
+definition that the vectorized SpanDecoder must match.
+
+Usage (needs the exported model, see extract_tanaos_trace.py):
+    python span_decoder.py --corpus texts.txt --golden anonymizer_golden.json
+    python span_decoder.py --corpus texts.txt --benchmark
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+# Same placeholders as the apps (README "Supported PII Types")
+PLACEHOLDERS = {
+    "EMAIL": "[Email]",
+    "PHONE_NUMBER": "[Phone number]",
+    "CREDIT_CARD_NUMBER": "[Credit card]",
+    "SSN": "[SSN]",
+    "NRP": "[NRP]",
+    "PERSON": "[Person]",
+    "ADDRESS": "[Address]",
+    "LOCATION": "[Location]",
+    "DATE": "[Date]",
+    "OTHER": "[Sensitive]",
+}
+DEFAULT_PLACEHOLDER = "[Sensitive]"
+
+# Parallel arrays, one entry per span, sorted by (row, start); label indexes SpanDecoder.entities
+Spans = namedtuple("Spans", ["row", "label", "start", "end", "score"])
+
+
+def split_label(label):
+    """'B-PERSON' -> ('B', 'PERSON'), 'PERSON' -> ('I', 'PERSON'), 'O' -> ('O', None)."""
+    if label == "O":
+        return "O", None
+    if label[:2] in ("B-", "I-"):
+        return label[0], label[2:]
+    return "I", label
+
+
+# -------------------------------------------------------------------------
+# REFERENCE LOOPS
+# -------------------------------------------------------------------------
+def decode_spans(label_ids, offsets, labels):
+    """
+    Groups consecutive tokens with the same entity into character spans, like the app's
+    extractSpansFromLogits; a B- tag always starts a new span. Special and padding
+    tokens have an empty (0, 0) offset and are skipped.
+    """
+    spans = []
+    previous = None
+    for label_id, (start, end) in zip(label_ids, offsets):
+        if start == end:
+            continue
+        tag, entity = split_label(labels[label_id])
+        if entity is not None and entity == previous and tag != "B":
+            spans[-1]["end"] = int(end)
+        elif entity is not None:
+            spans.append({"label": entity, "start": int(start), "end": int(end)})
+        previous = entity
+    return spans
+
+def mask_text(text, spans):
+    """Replaces every (non-overlapping) span with its placeholder, in one pass over the text."""
+    pieces = []
+    cursor = 0
+    for span in sorted(spans, key=lambda s: s["start"]):
+        pieces.append(text[cursor:span["start"]])
+        pieces.append(PLACEHOLDERS.get(span["label"], DEFAULT_PLACEHOLDER))
+        cursor = span["end"]
+    pieces.append(text[cursor:])
+    return "".join(pieces)
+
+# -------------------------------------------------------------------------
+# VECTORIZED
+# -------------------------------------------------------------------------
+def padded_offsets(offset_lists, length):
+    """Offset mappings of different lengths -> int64 [rows, length, 2], padded with (0, 0)."""
+    offsets = np.zeros((len(offset_lists), length, 2), dtype=np.int64)
+    for row, row_offsets in enumerate(offset_lists):
+        if row_offsets:
+            offsets[row, :len(row_offsets)] = row_offsets
+    return offsets
+
+class SpanDecoder:
+    """Vectorized decode_spans + mask_text for a label set (BIO-tagged or plain)."""
+
+    def __init__(self, labels):
+        tags, entities = zip(*(split_label(label) for label in labels))
+        self.labels = list(labels)
+        self.entities = sorted({entity for entity in entities if entity is not None})
+        self.placeholders = [PLACEHOLDERS.get(entity, DEFAULT_PLACEHOLDER) for entity in self.entities]
+        # label id -> entity index (-1 = O) and -> "starts a new span"
+        self.entity_of = np.array([-1 if e is None else self.entities.index(e) for e in entities], dtype=np.int64)
+        self.begins = np.array([tag == "B" for tag in tags])
+
+    def decode(self, logits, offsets):
+        """
+        logits [batch, seq_len, num_labels], offsets [batch, seq_len, 2] (character
+        offsets, (0, 0) for special / padding tokens) -> Spans. The score of a span is
+        the highest softmax probability of its tokens.
+        """
+        label_ids = logits.argmax(axis=-1)
+        # Batched softmax, reduced to its maximum: 1 / sum(exp(logits - max))
+        probs = 1.0 / np.exp(logits - logits.max(axis=-1, keepdims=True)).sum(axis=-1)
+
+        rows, cols = np.nonzero(offsets[..., 1] > offsets[..., 0])
+        if rows.size == 0:
+            return Spans(*(np.zeros(0, dtype=np.int64) for _ in range(4)), np.zeros(0, dtype=np.float32))
+        token_labels = label_ids[rows, cols]
+        entity = self.entity_of[token_labels]
+
+        # Run-length encode (row, entity) with a forced break at every B- tag
+        breaks = np.ones(rows.size, dtype=bool)
+        breaks[1:] = (rows[1:] != rows[:-1]) | (entity[1:] != entity[:-1]) | self.begins[token_labels[1:]]
+        run_starts = np.flatnonzero(breaks)
+        run_ends = np.append(run_starts[1:], rows.size) - 1
+        score = np.maximum.reduceat(probs[rows, cols], run_starts)
+
+        keep = entity[run_starts] >= 0
+        run_starts, run_ends, score = run_starts[keep], run_ends[keep], score[keep]
+        return Spans(
+            row=rows[run_starts],
+            label=entity[run_starts],
+            start=offsets[rows[run_starts], cols[run_starts], 0],
+            end=offsets[rows[run_ends], cols[run_ends], 1],
+            score=score.astype(np.float32),
+        )
+
+    def apply_placeholders(self, texts, spans):
+        """Masked texts of the whole batch, built in one pass over texts and spans."""
+        bounds = np.searchsorted(spans.row, np.arange(len(texts) + 1)).tolist()
+        starts, ends, labels = spans.start.tolist(), spans.end.tolist(), spans.label.tolist()
+        masked = []
+        for row, text in enumerate(texts):
+            pieces = []
+            cursor = 0
+            for k in range(bounds[row], bounds[row + 1]):
+                pieces.append(text[cursor:starts[k]])
+                pieces.append(self.placeholders[labels[k]])
+                cursor = ends[k]
+            pieces.append(text[cursor:])
+            masked.append("".join(pieces))
+        return masked
+
+    def to_lists(self, spans, n_rows, with_score=False):
+        """Spans -> one list of {"label", "start", "end"[, "score"]} dicts per row."""
+        result = [[] for _ in range(n_rows)]
+        for row, label, start, end, score in zip(*(array.tolist() for array in spans)):
+            span = {"label": self.entities[label], "start": start, "end": end}
+            if with_score:
+                span["score"] = round(score, 4)
+            result[row].append(span)
+        return result
+
+
+def byte_offsets(text, positions):
+    """Character positions -> UTF-8 byte positions (the apps index the UTF-8 bytes)."""
+    widths = np.fromiter((len(char.encode("utf-8")) for char in text), dtype=np.int64, count=len(text))
+    cumulative = np.concatenate(([0], np.cumsum(widths)))
+    return cumulative[np.asarray(positions, dtype=np.int64)].tolist()
+
+
+# -------------------------------------------------------------------------
+# ORACLE / BENCHMARK
+# -------------------------------------------------------------------------
+def golden_cases(texts, encoded, logits, decoder):
+    """One test case per text: model inputs, per-token labels, spans (chars and bytes), masked text."""
+    offsets = padded_offsets(encoded["offset_mapping"], logits.shape[1])
+    spans = decoder.decode(logits, offsets)
+    masked = decoder.apply_placeholders(texts, spans)
+    label_ids = logits.argmax(axis=-1)
+    cases = []
+    for row, (text, row_spans) in enumerate(zip(texts, decoder.to_lists(spans, len(texts), with_score=True))):
+        ids = encoded["input_ids"][row]
+        positions = byte_offsets(text, [p for span in row_spans for p in (span["start"], span["end"])])
+        for span, byte_start, byte_end in zip(row_spans, positions[::2], positions[1::2]):
+            span["byte_start"], span["byte_end"] = byte_start, byte_end
+        cases.append({
+            "text": text,
+            "input_ids": ids,
+            "label_ids": label_ids[row, :len(ids)].tolist(),
+            "spans": row_spans,
+            "anonymized": masked[row],
+        })
+    return cases
+
+def benchmark(texts, encoded, logits, decoder, repeats=3):
+    """Times the reference loops against SpanDecoder on the same logits; returns False on a mismatch."""
+    offsets = padded_offsets(encoded["offset_mapping"], logits.shape[1])
+    labels = decoder.labels
+
+    def loops():
+        label_ids = logits.argmax(axis=-1)
+        spans = [decode_spans(label_ids[row], offsets[row], labels) for row in range(len(texts))]
+        return [mask_text(text, row_spans) for text, row_spans in zip(texts, spans)], spans
+
+    def vectorized():
+        spans = decoder.decode(logits, offsets)
+        return decoder.apply_placeholders(texts, spans), decoder.to_lists(spans, len(texts))
+
+    results, times = [], []
+    for run in (loops, vectorized):
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            result = run()
+            best = min(best, time.perf_counter() - t0)
+        results.append(result)
+        times.append(best)
+
+    print(f"\n{'decoder':<12}{'rows/s':>12}")
+    for name, seconds in zip(("loops", "vectorized"), times):
+        print(f"{name:<12}{len(texts) / seconds:>12,.0f}")
+    print(f"[INFO] Vectorized decoding is {times[0] / times[1]:.1f}x faster.")
+    return results[0] == results[1]
+
+
+def parse_args(argv=None):
+    from batch_anonymize import DEFAULT_MODEL_PATH
+    from extract_tanaos_trace import MODEL_ID
+
+    parser = argparse.ArgumentParser(description="Vectorized span decoding: golden cases and benchmark.")
+    parser.add_argument("--corpus", required=True, help="Texts, one per line.")
+    parser.add_argument("--golden", default=None, help="Write the golden test cases for the apps to this JSON file.")
+    parser.add_argument("--benchmark", action="store_true", help="Compare against the per-token loops.")
+    parser.add_argument("--model", default=DEFAULT_MODEL_PATH, help="Traced .pt, .pt2 or .onnx model.")
+    parser.add_argument("--model-id", default=MODEL_ID, help="Tokenizer and label set.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    from transformers import AutoTokenizer
+
+    from batch_anonymize import BatchAnonymizer, load_labels, load_runner
+    from extract_tanaos_trace import MAX_LENGTH
+
+    args = parse_args(argv)
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        texts = [line.rstrip("\n") for line in f if line.strip()]
+
+    run, static_shape = load_runner(args.model)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    labels = load_labels(args.model_id)
+    # Every text padded to MAX_LENGTH, as in the apps
+    anonymizer = BatchAnonymizer(run, tokenizer, labels, buckets=(MAX_LENGTH,), static_shape=static_shape)
+    encoded = tokenizer(texts, truncation=True, max_length=MAX_LENGTH, return_offsets_mapping=True)
+    step = anonymizer.batch_size
+    logits = np.concatenate([anonymizer.forward(encoded["input_ids"][i:i + step])
+                             for i in range(0, len(texts), step)])
+    decoder = SpanDecoder(labels)
+    print(f"[INFO] {len(texts)} texts, logits {logits.shape}")
+
+    if args.golden:
+        golden = {
+            "model_id": args.model_id,
+            "max_length": MAX_LENGTH,
+            "labels": labels,
+            "placeholders": dict(zip(decoder.entities, decoder.placeholders)),
+            "cases": golden_cases(texts, encoded, logits, decoder),
+        }
+        with open(args.golden, "w", encoding="utf-8") as f:
+            json.dump(golden, f, ensure_ascii=False, indent=1)
+        print(f"[INFO] ✓ {len(texts)} golden cases saved to {args.golden}")
+
+    if args.benchmark:
+        if not benchmark(texts, encoded, logits, decoder):
+            print("[ERROR] Vectorized spans differ from the reference loops.")
+            sys.exit(1)
+        print("[INFO] ✓ Vectorized spans and masked texts match the reference loops.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Batched grammar correction with the encoder / decoder-step KV-cache graphs.
+
+inference_torchscript.py corrects one sentence at a time, syncs with .item() and
+decodes a token to text on every step. This entry point:
+1. Sorts the sentences by token length and packs them into [B, L] encoder batches,
+   L being the smallest encoder bucket that holds the longest row of the batch
+2. Runs the encoder once per batch and greedy-decodes all rows together; a row
+   that emits EOS is finished and the batch (tokens, self/cross KV, mask) is
+   compacted to the remaining rows, so finished rows stop costing anything
+3. Decodes the generated ids to text once, at the end, in the input order
+
+Example:
+    python batch_correct.py --input tickets.txt --output corrected.txt --format onnx --batch-size 32
+"""
+
+import argparse
+import os
+import time
+
+import torch
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from encoder_buckets import ENCODER_BUCKETS, add_bucket_argument, select_bucket
+from export_kv_cache import DECODER_LENGTH, DEFAULT_MODEL_DIR, MODEL_ID, empty_self_kv
+from inference_kv_cache import BACKENDS, greedy_decode_kv, load_kv_runners
+
+PREFIX = "grammar: "
+DEFAULT_BATCH_SIZE = 32
+
+
+def greedy_decode_batch(encode, step, input_ids, attention_mask, start_token_id, eos_token_id,
+                        decoder_length=DECODER_LENGTH):
+    """
+    Greedy decoding of a [B, L] batch. Returns one list of generated ids per row
+    (up to and including EOS), identical to decoding each row on its own.
+    """
+    batch_size = input_ids.shape[0]
+    cross_kv = encode(input_ids, attention_mask)[0]
+    self_kv = empty_self_kv(cross_kv, decoder_length)
+    tokens = torch.full((batch_size, 1), start_token_id, dtype=torch.long)
+    # Original row index of every live row; unfinished rows keep the full output length
+    rows = torch.arange(batch_size)
+    generated = torch.zeros((batch_size, decoder_length - 1), dtype=torch.long)
+    lengths = torch.full((batch_size,), decoder_length - 1, dtype=torch.long)
+
+    for i in range(decoder_length - 1):
+        logits, self_kv = step(tokens, torch.tensor([i], dtype=torch.long), self_kv, cross_kv, attention_mask)
+        next_ids = torch.argmax(logits, dim=-1)
+        generated[rows, i] = next_ids
+        finished = next_ids == eos_token_id
+        if bool(finished.any()):
+            lengths[rows[finished]] = i + 1
+            live = ~finished
+            if not bool(live.any()):
+                break
+            # Compact: drop finished rows from every per-row tensor
+            rows, next_ids = rows[live], next_ids[live]
+            self_kv, cross_kv = self_kv[:, :, live], cross_kv[:, :, live]
+            attention_mask = attention_mask[live]
+        tokens = next_ids[:, None]
+    return [generated[row, :lengths[row]].tolist() for row in range(batch_size)]
+
+
+class BatchCorrector:
+    """Corrects lists of sentences with lazily loaded per-bucket KV-cache graphs."""
+
+    def __init__(self, fmt="onnx", model_dir=DEFAULT_MODEL_DIR, model_id=MODEL_ID, buckets=None,
+                 batch_size=DEFAULT_BATCH_SIZE, tokenizer=None, num_threads=None):
+        self.fmt = fmt
+        self.model_dir = model_dir
+        self.model_id = model_id
+        self.buckets = sorted(set(buckets or ENCODER_BUCKETS))
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.tokenizer = tokenizer or AutoTokenizer.from_pretrained(model_id)
+        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_id).eval() if fmt == "eager" else None
+        # T5 starts decoding from the pad token
+        self.start_token_id = self.tokenizer.pad_token_id
+        self._runners = {}
+        self.stats = {"sentences": 0, "batches": 0, "generated_tokens": 0, "truncated": 0}
+
+    def runners(self, encoder_length):
+        if encoder_length not in self._runners:
+            self._runners[encoder_length] = load_kv_runners(
+                self.fmt, self.model_dir, self.model_id, encoder_length, self.model, self.num_threads)
+        return self._runners[encoder_length]
+
+    def correct_ids(self, texts):
+        """Generated ids per text (input order)."""
+        max_length = self.buckets[-1]
+        token_ids = self.tokenizer([PREFIX + text for text in texts]).input_ids
+        truncated = [i for i, ids in enumerate(token_ids) if len(ids) > max_length]
+        if truncated:
+            # Longer texts need chunking (long_document.py); keep the EOS of the truncated rows
+            print(f"⚠️ {len(truncated)} text(s) longer than {max_length} tokens were truncated.")
+            for i in truncated:
+                token_ids[i] = token_ids[i][:max_length - 1] + token_ids[i][-1:]
+            self.stats["truncated"] += len(truncated)
+        # Length-sorted batches pad every row to (nearly) the same bucket
+        order = sorted(range(len(texts)), key=lambda i: len(token_ids[i]))
+        outputs = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch_rows = order[start:start + self.batch_size]
+            encoder_length = select_bucket(max(len(token_ids[i]) for i in batch_rows), self.buckets)
+            padded = self.tokenizer.pad(
+                {"input_ids": [token_ids[i] for i in batch_rows]},
+                padding="max_length", max_length=encoder_length, return_tensors="pt",
+            )
+            encode, step = self.runners(encoder_length)
+            generated = greedy_decode_batch(encode, step, padded["input_ids"], padded["attention_mask"],
+                                            self.start_token_id, self.tokenizer.eos_token_id)
+            for row, ids in zip(batch_rows, generated):
+                outputs[row] = ids
+            self.stats["batches"] += 1
+            self.stats["generated_tokens"] += sum(len(ids) for ids in generated)
+        self.stats["sentences"] += len(texts)
+        return outputs
+
+    def correct(self, texts):
+        """Corrected text per input text (input order); ids are decoded once, at the end."""
+        if not texts:
+            return []
+        return self.tokenizer.batch_decode(self.correct_ids(texts), skip_special_tokens=True)
+
+
+def correct_one_by_one(corrector, texts):
+    """The single-sentence loop (one sentence per encoder + decode), for comparison."""
+    outputs = []
+    for text in texts:
+        inputs = corrector.tokenizer(PREFIX + text, max_length=corrector.buckets[-1], truncation=True)
+        encoder_length = select_bucket(len(inputs.input_ids), corrector.buckets)
+        padded = corrector.tokenizer.pad({"input_ids": [inputs.input_ids]}, padding="max_length",
+                                         max_length=encoder_length, return_tensors="pt")
+        encode, step = corrector.runners(encoder_length)
+        outputs.append(greedy_decode_kv(encode, step, padded["input_ids"], padded["attention_mask"],
+                                        corrector.start_token_id, corrector.tokenizer.eos_token_id))
+    return outputs
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batched T5 grammar correction of a text file (one sentence per line).")
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", default=None, help="Corrected sentences, one per line (default: stdout).")
+    parser.add_argument("--format", choices=BACKENDS, default="onnx")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    add_bucket_argument(parser)
+    parser.add_argument("--compare-single", action="store_true",
+                        help="Also run the one-sentence-at-a-time loop and report the speedup.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    texts = read_lines(args.input)
+    corrector = BatchCorrector(args.format, args.model_dir, args.model_id, args.encoder_buckets, args.batch_size)
+    print(f"Correcting {len(texts)} sentences (format={args.format}, batch_size={args.batch_size})...")
+
+    t0 = time.perf_counter()
+    corrected = corrector.correct(texts)
+    elapsed = time.perf_counter() - t0
+    stats = corrector.stats
+    print(f"✅ {len(texts)} sentences in {elapsed:.2f}s ({len(texts) / elapsed:.1f} sentences/s, "
+          f"{stats['generated_tokens'] / elapsed:.1f} tokens/s, {stats['batches']} batches)")
+
+    if args.compare_single:
+        batched_ids = corrector.correct_ids(texts)
+        t0 = time.perf_counter()
+        single_ids = correct_one_by_one(corrector, texts)
+        single_elapsed = time.perf_counter() - t0
+        print(f"One by one: {single_elapsed:.2f}s ({len(texts) / single_elapsed:.1f} sentences/s), "
+              f"batched speedup {single_elapsed / elapsed:.2f}x")
+        mismatches = sum(a != b for a, b in zip(batched_ids, single_ids))
+        if mismatches:
+            print(f"❌ {mismatches}/{len(texts)} sentences decoded differently in a batch.")
+        else:
+            print("✅ Batched and one-by-one decoding produced identical tokens.")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in corrected)
+        print(f"Corrected sentences saved to {args.output}")
+    else:
+        for line in corrected:
+            print(line)
+
+if __name__ == "__main__":
+    main()
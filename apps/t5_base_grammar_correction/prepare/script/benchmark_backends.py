@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Cross-backend throughput and parity benchmark for the T5 artifacts.
+
+Every available artifact runs the same sentence corpus through the same greedy
+drivers of inference_kv_cache.py:
+  - full: the stateless full-buffer model of export.py (greedy_decode_full)
+  - kv:   the encoder / decoder-step graphs of export_kv_cache.py (greedy_decode_kv)
+for torchscript, pt2 and onnx, next to the PyTorch (eager) reference. Prompts are
+routed to the smallest exported encoder bucket.
+
+Each backend runs in its own process, so peak RSS is per backend. Reported per
+backend: tokens/s, p50 / p95 step latency (one model call per generated token),
+peak RSS and the exact-match rate of the generated ids against the eager
+reference. Results are written as stable, sorted JSON; --compare prints the
+difference to a previous run and exits non-zero on a regression.
+
+Usage:
+    python benchmark_backends.py --output ../model/benchmark.json
+    python benchmark_backends.py --corpus sentences.txt --output new.json --compare ../model/benchmark.json
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import signal
+import sys
+import time
+from queue import Empty
+
+import numpy as np
+import torch
+
+from encoder_buckets import add_bucket_argument, encode_to_bucket, stateless_path
+from export_kv_cache import DEFAULT_MODEL_DIR, EXTENSIONS, MODEL_ID, artifact_paths
+from inference_kv_cache import BENCHMARK_TEXTS, greedy_decode_full, greedy_decode_kv, load_full_runner, load_kv_runners
+
+PREFIX = "grammar: "
+VARIANTS = ("full", "kv")
+REFERENCE = "eager/full"
+DEFAULT_CORPUS = [text[len(PREFIX):] for text in BENCHMARK_TEXTS]
+DEFAULT_TOLERANCE = 0.10
+POLL_SECONDS = 1.0
+
+
+def read_corpus(path):
+    if path is None:
+        return DEFAULT_CORPUS
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+def timed(run, times):
+    """Wraps a model callable, appending the wall time of every call to `times`."""
+    def wrapper(*args):
+        t0 = time.perf_counter()
+        out = run(*args)
+        times.append(time.perf_counter() - t0)
+        return out
+    return wrapper
+
+def missing_artifacts(fmt, variant, model_dir, model_id, buckets):
+    if fmt == "eager":
+        return []
+    if variant == "kv":
+        paths = [path for length in buckets for path in artifact_paths(model_dir, fmt, model_id, length)]
+    else:
+        paths = [stateless_path(model_dir, model_id, EXTENSIONS[fmt], length) for length in buckets]
+    return [path for path in paths if not os.path.exists(path)]
+
+
+# -------------------------------------------------------------------------
+# ONE BACKEND (runs in a child process)
+# -------------------------------------------------------------------------
+def run_backend(fmt, variant, texts, model_dir, model_id, buckets):
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_id).eval() if fmt == "eager" else None
+    start_token_id = tokenizer.pad_token_id
+    prompts = [encode_to_bucket(tokenizer, PREFIX + text, buckets) for text in texts]
+
+    runners = {}
+    step_times, encode_times = [], []
+
+    def decode(input_ids, attention_mask, encoder_length):
+        if encoder_length not in runners:
+            if variant == "kv":
+                encode, step = load_kv_runners(fmt, model_dir, model_id, encoder_length, model)
+                runners[encoder_length] = timed(encode, encode_times), timed(step, step_times)
+            else:
+                runners[encoder_length] = timed(load_full_runner(fmt, model_dir, model_id, encoder_length, model),
+                                                step_times)
+        if variant == "kv":
+            encode, step = runners[encoder_length]
+            return greedy_decode_kv(encode, step, input_ids, attention_mask, start_token_id, tokenizer.eos_token_id)
+        return greedy_decode_full(runners[encoder_length], input_ids, attention_mask, start_token_id,
+                                  tokenizer.pad_token_id, tokenizer.eos_token_id)
+
+    # Warm-up: load every bucket the corpus needs and run one prompt through it
+    warmed = set()
+    for input_ids, attention_mask, encoder_length in prompts:
+        if encoder_length not in warmed:
+            decode(input_ids, attention_mask, encoder_length)
+            warmed.add(encoder_length)
+    step_times.clear()
+    encode_times.clear()
+
+    outputs = []
+    t0 = time.perf_counter()
+    for input_ids, attention_mask, encoder_length in prompts:
+        outputs.append(decode(input_ids, attention_mask, encoder_length))
+    elapsed = time.perf_counter() - t0
+
+    tokens = sum(len(ids) for ids in outputs)
+    steps_ms = np.array(step_times) * 1000
+    result = {
+        "tokens": tokens,
+        "seconds": elapsed,
+        "tokens_per_s": tokens / elapsed,
+        "step_ms_p50": float(np.percentile(steps_ms, 50)),
+        "step_ms_p95": float(np.percentile(steps_ms, 95)),
+        "outputs": outputs,
+    }
+    if encode_times:
+        result["encode_ms_p50"] = float(np.percentile(np.array(encode_times) * 1000, 50))
+    return result
+
+def _child(queue, *args):
+    try:
+        result = run_backend(*args)
+        # ru_maxrss is in KB on Linux, bytes on macOS
+        scale = 1 if sys.platform == "darwin" else 1024
+        result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+        queue.put(result)
+    except Exception as e:
+        queue.put({"error": f"{type(e).__name__}: {e}"})
+
+def measure(fmt, variant, texts, model_dir, model_id, buckets):
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_child, args=(queue, fmt, variant, texts, model_dir, model_id, buckets))
+    process.start()
+    # A hard crash (segfault, OOM kill) never puts a result: poll while the child lives
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=POLL_SECONDS)
+        except Empty:
+            if not process.is_alive():
+                try:
+                    result = queue.get(timeout=POLL_SECONDS)  # put just before exiting
+                except Empty:
+                    break
+    process.join()
+    if process.exitcode:
+        reason = (f"killed by {signal.Signals(-process.exitcode).name}" if process.exitcode < 0
+                  else f"exit code {process.exitcode}")
+        return {"error": f"backend process crashed ({reason})"}
+    return result or {"error": "backend process exited without a result"}
+
+
+# -------------------------------------------------------------------------
+# REPORT
+# -------------------------------------------------------------------------
+def rounded(result):
+    return {key: round(value, 3) if isinstance(value, float) else value for key, value in result.items()}
+
+def format_rate(rate):
+    return "n/a" if rate is None else f"{rate:.1%}"
+
+def print_table(results):
+    print(f"\n{'backend':<18}{'tokens/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'RSS MB':>9}{'exact match':>13}")
+    for name, result in results.items():
+        if "skipped" in result or "error" in result:
+            print(f"{name:<18}  {result.get('skipped') or '❌ ' + result['error']}")
+            continue
+        print(f"{name:<18}{result['tokens_per_s']:>10.1f}{result['step_ms_p50']:>9.2f}{result['step_ms_p95']:>9.2f}"
+              f"{result['peak_rss_mb']:>9.0f}{format_rate(result['exact_match']):>13}")
+
+def compare(results, previous, tolerance):
+    """Prints the change against a previous run; returns the list of regressions."""
+    regressions = []
+    print(f"\n{'backend':<18}{'tokens/s':>22}{'p95 ms':>20}{'exact match':>22}")
+    for name, result in results.items():
+        before = previous.get(name)
+        if before is None or "tokens_per_s" not in before or "tokens_per_s" not in result:
+            continue
+        speed = result["tokens_per_s"] / before["tokens_per_s"] - 1
+        p95 = result["step_ms_p95"] / before["step_ms_p95"] - 1
+        flags = []
+        if speed < -tolerance:
+            flags.append("tokens/s")
+        if None not in (result["exact_match"], before["exact_match"]) and result["exact_match"] < before["exact_match"]:
+            flags.append("parity")
+        if result["outputs_sha256"] != before.get("outputs_sha256"):
+            flags.append("outputs changed")
+        print(f"{name:<18}{before['tokens_per_s']:>9.1f} -> {result['tokens_per_s']:>7.1f} ({speed:+.0%})"
+              f"{p95:>+19.0%}{format_rate(before['exact_match']):>11} -> {format_rate(result['exact_match']):>6}"
+              f"  {'❌ ' + ', '.join(flags) if flags else '✅'}")
+        if "tokens/s" in flags or "parity" in flags:
+            regressions.append(name)
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput / latency / memory / parity benchmark of the T5 backends.")
+    parser.add_argument("--corpus", default=None, help="Sentences, one per line (default: the built-in prompts).")
+    parser.add_argument("--formats", nargs="+", choices=tuple(EXTENSIONS), default=list(EXTENSIONS))
+    parser.add_argument("--variants", nargs="+", choices=VARIANTS, default=list(VARIANTS))
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(parser)
+    parser.add_argument("--output", default=None, help="JSON results file.")
+    parser.add_argument("--compare", default=None, help="Previous JSON results to diff against.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Relative tokens/s drop reported as a regression (default: 0.10).")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    texts = read_corpus(args.corpus)
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    buckets = sorted({encode_to_bucket(tokenizer, PREFIX + text, args.encoder_buckets)[2] for text in texts})
+    print(f"Benchmarking {len(texts)} sentences (encoder buckets {buckets})...")
+
+    backends = [("eager", "full")] + [(fmt, variant) for fmt in args.formats for variant in args.variants]
+    results = {}
+    for fmt, variant in backends:
+        name = f"{fmt}/{variant}"
+        missing = missing_artifacts(fmt, variant, args.model_dir, args.model_id, buckets)
+        if missing:
+            print(f"  {name}: skipped ({len(missing)} artifact(s) missing, e.g. {missing[0]})")
+            results[name] = {"skipped": f"missing {os.path.basename(missing[0])}"}
+            continue
+        print(f"  {name}...")
+        results[name] = measure(fmt, variant, texts, args.model_dir, args.model_id, buckets)
+
+    reference = results[REFERENCE].get("outputs")
+    for result in results.values():
+        outputs = result.pop("outputs", None)
+        if outputs is None:
+            continue
+        result["outputs_sha256"] = hashlib.sha256(json.dumps(outputs).encode("utf-8")).hexdigest()
+        result["exact_match"] = (sum(a == b for a, b in zip(outputs, reference)) / len(texts)
+                                 if reference is not None else None)
+    results = {name: rounded(result) for name, result in results.items()}
+    print_table(results)
+
+    report = {
+        "meta": {
+            "model_id": args.model_id,
+            "corpus_sha256": hashlib.sha256("\n".join(texts).encode("utf-8")).hexdigest(),
+            "sentences": len(texts),
+            "encoder_buckets": buckets,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+        },
+        "results": results,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nResults saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous["meta"].get("corpus_sha256") != report["meta"]["corpus_sha256"]:
+            print("⚠️ The previous run used a different corpus; only speed is comparable.")
+        regressions = compare(results, previous["results"], args.tolerance)
+        if regressions:
+            print(f"❌ Regressions: {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ No regressions.")
+
+if __name__ == "__main__":
+    main()
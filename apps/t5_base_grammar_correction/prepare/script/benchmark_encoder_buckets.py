@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Per-bucket latency table of the encoder-bucketed T5 exports.
+
+For every encoder bucket exported by export.py (and, when present, by
+export_kv_cache.py) this times:
+  - one step of the stateless full-buffer model (encoder + [1, 128] decoder buffer),
+    i.e. the cost of every generated token in inference_torchscript.py
+  - the KV-cache encoder call (once per prompt) and one KV decoder step
+
+Usage:
+    python benchmark_encoder_buckets.py --format onnx
+    python benchmark_encoder_buckets.py --format torchscript --encoder-buckets 32 128 1024
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import torch
+from transformers import AutoTokenizer
+
+from encoder_buckets import MAX_ENCODER_LENGTH, add_bucket_argument, stateless_path
+from export_kv_cache import DECODER_LENGTH, DEFAULT_MODEL_DIR, EXTENSIONS, MODEL_ID, artifact_paths, empty_self_kv
+from inference_kv_cache import load_full_runner, load_graph
+
+SAMPLE_TEXT = "grammar: This sentences has has bads grammar. "
+
+
+def median_ms(fn, repeats, warmup=2):
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+def bucket_latencies(fmt, model_dir, model_id, tokenizer, encoder_length, repeats):
+    """{stateless, kv_encoder, kv_step} median ms of one bucket (None when not exported)."""
+    inputs = tokenizer(SAMPLE_TEXT * encoder_length, return_tensors="pt", max_length=encoder_length,
+                       padding="max_length", truncation=True)
+    input_ids, attention_mask = inputs.input_ids, inputs.attention_mask
+    start_token_id = tokenizer.pad_token_id
+    row = {"stateless": None, "kv_encoder": None, "kv_step": None}
+
+    if os.path.exists(stateless_path(model_dir, model_id, EXTENSIONS[fmt], encoder_length)):
+        run_full = load_full_runner(fmt, model_dir, model_id, encoder_length)
+        decoder_input_ids = torch.full((1, DECODER_LENGTH), start_token_id, dtype=torch.long)
+        row["stateless"] = median_ms(lambda: run_full(input_ids, attention_mask, decoder_input_ids), repeats)
+
+    encoder_path, step_path = artifact_paths(model_dir, fmt, model_id, encoder_length)
+    if os.path.exists(encoder_path) and os.path.exists(step_path):
+        encode, step = load_graph(fmt, encoder_path), load_graph(fmt, step_path)
+        cross_kv = encode(input_ids, attention_mask)[0]
+        self_kv = empty_self_kv(cross_kv, DECODER_LENGTH)
+        token = torch.full((1, 1), start_token_id, dtype=torch.long)
+        step_index = torch.zeros(1, dtype=torch.long)
+        row["kv_encoder"] = median_ms(lambda: encode(input_ids, attention_mask), repeats)
+        row["kv_step"] = median_ms(lambda: step(token, step_index, self_kv, cross_kv, attention_mask), repeats)
+    return row
+
+def print_table(rows):
+    def cell(value):
+        return f"{value:>12.2f}" if value is not None else f"{'-':>12}"
+    reference = rows.get(MAX_ENCODER_LENGTH, {}).get("stateless")
+    print(f"\n{'bucket':>8}{'step ms':>12}{'vs 1024':>10}{'kv enc ms':>12}{'kv step ms':>12}")
+    for length, row in sorted(rows.items()):
+        speedup = f"{reference / row['stateless']:>9.1f}x" if reference and row["stateless"] else f"{'-':>10}"
+        print(f"{length:>8}{cell(row['stateless'])}{speedup}{cell(row['kv_encoder'])}{cell(row['kv_step'])}")
+    print("step ms: one stateless full-buffer step (paid per generated token); "
+          "kv enc ms: once per prompt; kv step ms: per token with the KV cache.")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Latency per encoder bucket of the T5 exports.")
+    parser.add_argument("--format", choices=tuple(EXTENSIONS), default="onnx")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(parser)
+    parser.add_argument("--repeats", type=int, default=10)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    rows = {}
+    for encoder_length in sorted(set(args.encoder_buckets)):
+        print(f"\n===== Encoder bucket {encoder_length} =====")
+        rows[encoder_length] = bucket_latencies(args.format, args.model_dir, args.model_id, tokenizer,
+                                                encoder_length, args.repeats)
+    print_table(rows)
+
+if __name__ == "__main__":
+    main()
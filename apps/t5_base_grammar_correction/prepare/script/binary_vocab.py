@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Memory-mappable binary vocabulary for the T5 SentencePiece tokenizer.
+
+t5_vocab.json is a {"id": piece} dictionary that has to be fully parsed at
+startup. t5_vocab.bin holds the same pieces in a layout that can be mmapped and
+used as is (all integers little-endian):
+
+    header   magic "T5VB", version, vocab_size, table_size, blob_size, flags (FLAG_*),
+             pad_token_id, eos_token_id, unk_token_id    (9 x 4 bytes, padded to 40)
+    scores   float64[vocab_size]      unigram log-probabilities (0 for added tokens),
+                                      full precision so Viterbi ties resolve as in HF
+    offsets  uint32[vocab_size + 1]   piece i = blob[offsets[i]:offsets[i + 1]]
+    kinds    uint8[vocab_size]        KIND_NORMAL / KIND_CONTROL / KIND_UNKNOWN,
+                                      zero-padded to a multiple of 4 bytes
+    table    int32[table_size]        piece -> id hash table: FNV-1a 32 of the UTF-8
+                                      piece, linear probing, -1 = empty slot;
+                                      table_size is a power of two >= 2 x vocab_size
+    blob     UTF-8 pieces, concatenated
+
+BinaryVocab opens the file in O(1) (header parse + numpy views on the mmap);
+id -> piece and piece -> id are O(1) lookups that touch only the pages they need.
+"""
+
+import json
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b"T5VB"
+VERSION = 2
+HEADER = struct.Struct("<4sIIIIIiii")
+HEADER_SIZE = 40  # keeps the float64 scores 8-byte aligned
+FLAG_SCORES = 1
+FLAG_NFKC = 2  # the tokenizer normalizes its input (SentencePiece nmt_nfkc charsmap)
+
+KIND_NORMAL = 0
+KIND_CONTROL = 1
+KIND_UNKNOWN = 2
+
+FNV_OFFSET = 0x811C9DC5
+FNV_PRIME = 0x01000193
+
+
+def fnv1a(data):
+    h = FNV_OFFSET
+    for byte in data:
+        h = ((h ^ byte) * FNV_PRIME) & 0xFFFFFFFF
+    return h
+
+def _padded(n_bytes):
+    return (n_bytes + 3) & ~3
+
+
+# -------------------------------------------------------------------------
+# EXPORT
+# -------------------------------------------------------------------------
+def tokenizer_vocab(tokenizer):
+    """
+    (pieces, scores, kinds) for every id of the tokenizer, in one bulk call.
+    Scores come from the Unigram model of the fast tokenizer (added tokens get 0).
+    """
+    pieces = tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))
+    scores = np.zeros(len(pieces), dtype=np.float64)
+    kinds = np.full(len(pieces), KIND_CONTROL, dtype=np.uint8)
+    model = json.loads(tokenizer.backend_tokenizer.to_str())["model"]
+    if model["type"] == "Unigram":
+        n_scored = len(model["vocab"])
+        scores[:n_scored] = [score for _, score in model["vocab"]]
+        kinds[:n_scored] = KIND_NORMAL
+        if model.get("unk_id") is not None:
+            kinds[model["unk_id"]] = KIND_UNKNOWN
+    else:
+        kinds[:] = KIND_NORMAL
+    kinds[[i for i in tokenizer.all_special_ids if i != tokenizer.unk_token_id]] = KIND_CONTROL
+    return pieces, scores, kinds
+
+def tokenizer_normalizes(tokenizer):
+    return json.loads(tokenizer.backend_tokenizer.to_str()).get("normalizer") is not None
+
+def write_binary_vocab(path, pieces, scores=None, kinds=None, pad_token_id=-1, eos_token_id=-1, unk_token_id=-1,
+                       nfkc=False):
+    vocab_size = len(pieces)
+    encoded = [piece.encode("utf-8") for piece in pieces]
+    offsets = np.zeros(vocab_size + 1, dtype="<u4")
+    offsets[1:] = np.cumsum([len(data) for data in encoded])
+    blob = b"".join(encoded)
+
+    table_size = 1
+    while table_size < 2 * vocab_size:
+        table_size *= 2
+    table = np.full(table_size, -1, dtype="<i4")
+    mask = table_size - 1
+    for token_id, data in enumerate(encoded):
+        slot = fnv1a(data) & mask
+        while table[slot] != -1:
+            # Duplicate pieces keep their lowest id
+            if encoded[table[slot]] == data:
+                break
+            slot = (slot + 1) & mask
+        else:
+            table[slot] = token_id
+
+    flags = (FLAG_SCORES if scores is not None else 0) | (FLAG_NFKC if nfkc else 0)
+    scores = np.zeros(vocab_size, dtype="<f8") if scores is None else np.asarray(scores, dtype="<f8")
+    kinds = np.zeros(vocab_size, dtype=np.uint8) if kinds is None else np.asarray(kinds, dtype=np.uint8)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, vocab_size, table_size, len(blob), flags,
+                            pad_token_id, eos_token_id, unk_token_id))
+        f.write(b"\0" * (HEADER_SIZE - HEADER.size))
+        f.write(scores.tobytes())
+        f.write(offsets.tobytes())
+        f.write(kinds.tobytes() + b"\0" * (_padded(vocab_size) - vocab_size))
+        f.write(table.tobytes())
+        f.write(blob)
+
+
+# -------------------------------------------------------------------------
+# LOADER
+# -------------------------------------------------------------------------
+class BinaryVocab:
+    """mmapped t5_vocab.bin: vocab[i] -> piece, vocab.piece_to_id(piece) -> id."""
+
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.vocab_size, self.table_size, blob_size, self.flags,
+         self.pad_token_id, self.eos_token_id, self.unk_token_id) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} binary vocab")
+
+        offset = HEADER_SIZE
+        self.scores = np.frombuffer(self._mm, dtype="<f8", count=self.vocab_size, offset=offset)
+        offset += 8 * self.vocab_size
+        self.offsets = np.frombuffer(self._mm, dtype="<u4", count=self.vocab_size + 1, offset=offset)
+        offset += 4 * (self.vocab_size + 1)
+        self.kinds = np.frombuffer(self._mm, dtype=np.uint8, count=self.vocab_size, offset=offset)
+        offset += _padded(self.vocab_size)
+        self.table = np.frombuffer(self._mm, dtype="<i4", count=self.table_size, offset=offset)
+        self._blob_offset = offset + 4 * self.table_size
+        self._mask = self.table_size - 1
+
+    def __len__(self):
+        return self.vocab_size
+
+    def piece_bytes(self, token_id):
+        start = self._blob_offset + int(self.offsets[token_id])
+        return self._mm[start:self._blob_offset + int(self.offsets[token_id + 1])]
+
+    def __getitem__(self, token_id):
+        if not 0 <= token_id < self.vocab_size:
+            raise IndexError(f"token id {token_id} out of range [0, {self.vocab_size})")
+        return self.piece_bytes(token_id).decode("utf-8")
+
+    def piece_to_id(self, piece, default=None):
+        data = piece.encode("utf-8") if isinstance(piece, str) else piece
+        slot = fnv1a(data) & self._mask
+        while True:
+            token_id = int(self.table[slot])
+            if token_id == -1:
+                return default
+            if self.piece_bytes(token_id) == data:
+                return token_id
+            slot = (slot + 1) & self._mask
+
+    def __contains__(self, piece):
+        return self.piece_to_id(piece) is not None
+
+    def close(self):
+        # The numpy views must go before the mmap can be closed
+        self.offsets = self.scores = self.kinds = self.table = None
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
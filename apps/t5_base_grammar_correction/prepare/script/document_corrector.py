@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Incremental sentence-level grammar correction of edited documents.
+
+The editor integration re-sends the whole document after every edit. Instead of
+correcting it from scratch, DocumentCorrector:
+1. Splits the document into sentences (after . ! ? followed by whitespace, and at
+   line breaks), keeping the original whitespace between them
+2. Looks every sentence up in a SentenceCache keyed by sha256(model digest +
+   normalized sentence), where normalization is NFC + collapsed whitespace
+3. Corrects only the new or changed sentences, all in one batch (batch_correct.py)
+4. Re-assembles the document from cached and fresh corrections
+
+The work per call scales with the size of the edit, not the size of the document.
+The model digest covers the model id, the backend and the exported graphs (path,
+size, mtime), so re-exporting a model invalidates its cache entries.
+
+Usage:
+    python document_corrector.py --input doc.txt --output doc.corrected.txt --cache ../cache/sentences.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from batch_correct import DEFAULT_BATCH_SIZE, BatchCorrector
+from encoder_buckets import ENCODER_BUCKETS, add_bucket_argument
+from export_kv_cache import DEFAULT_MODEL_DIR, MODEL_ID, artifact_paths
+from inference_kv_cache import BACKENDS
+
+# Whitespace after sentence-final punctuation (optionally closed by a quote or
+# bracket), or any whitespace run containing a line break
+_BOUNDARY = re.compile(r"(?:(?<=[.!?])|(?<=[.!?][\"'”’)\]]))\s+|\s*\n\s*")
+_WHITESPACE = re.compile(r"\s+")
+DEFAULT_CACHE_ITEMS = 100_000
+
+
+def split_sentences(text):
+    """[(sentence, separator)] such that ''.join(s + sep) == text. The first sentence may be '' (leading space)."""
+    leading = re.match(r"\s*", text).group()
+    segments = [("", leading)] if leading else []
+    pos = len(leading)
+    for match in _BOUNDARY.finditer(text, pos):
+        if match.start() > pos:
+            segments.append((text[pos:match.start()], match.group()))
+            pos = match.end()
+    if pos < len(text):
+        segments.append((text[pos:], ""))
+    return segments
+
+def normalize_sentence(sentence):
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", sentence)).strip()
+
+def model_digest(fmt, model_dir, model_id, buckets=ENCODER_BUCKETS):
+    """Digest of the model id, backend and exported KV-cache graphs (path, size, mtime)."""
+    digest = hashlib.sha256(f"{model_id}\n{fmt}".encode("utf-8"))
+    if fmt != "eager":
+        for encoder_length in sorted(buckets):
+            for path in artifact_paths(model_dir, fmt, model_id, encoder_length):
+                if os.path.exists(path):
+                    stat = os.stat(path)
+                    digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SentenceCache:
+    """LRU map of sentence key -> corrected sentence, optionally persisted to a JSON file."""
+
+    def __init__(self, path=None, max_items=DEFAULT_CACHE_ITEMS):
+        self.path = path
+        self.max_items = max_items
+        self.entries = OrderedDict()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable sentence cache {path}: {e}")
+
+    @staticmethod
+    def key(digest, normalized):
+        return hashlib.sha256(f"{digest}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_items:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.path)
+
+
+class DocumentCorrector:
+    def __init__(self, corrector, cache=None, digest=None):
+        self.corrector = corrector
+        self.cache = cache if cache is not None else SentenceCache()
+        self.digest = digest or model_digest(corrector.fmt, corrector.model_dir, corrector.model_id,
+                                             corrector.buckets)
+
+    def correct(self, document):
+        """Returns (corrected document, stats) with stats = {sentences, cached, corrected}."""
+        segments = split_sentences(document)
+        # Corrections of this call: the cache only serves lookups and stores results,
+        # since a small LRU may evict this document's own sentences before reassembly
+        keys, corrections, pending = [], {}, {}
+        for sentence, _ in segments:
+            normalized = normalize_sentence(sentence)
+            key = self.cache.key(self.digest, normalized) if normalized else None
+            keys.append(key)
+            if key is None or key in corrections or key in pending:
+                continue
+            cached = self.cache.get(key)
+            if cached is None:
+                pending[key] = normalized
+            else:
+                corrections[key] = cached
+
+        # All new or changed sentences of this edit go through the model in one batch
+        if pending:
+            for key, corrected in zip(pending, self.corrector.correct(list(pending.values()))):
+                corrections[key] = corrected
+                self.cache.put(key, corrected)
+
+        parts = []
+        for (sentence, separator), key in zip(segments, keys):
+            parts.append((corrections[key] if key is not None else sentence) + separator)
+        n_sentences = sum(key is not None for key in keys)
+        stats = {"sentences": n_sentences, "cached": n_sentences - len(pending), "corrected": len(pending)}
+        return "".join(parts), stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental sentence-level T5 grammar correction of a document.")
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", default=None, help="Corrected document (default: stdout).")
+    parser.add_argument("--cache", default=None, help="Persistent sentence cache (JSON); kept in memory if omitted.")
+    parser.add_argument("--cache-items", type=int, default=DEFAULT_CACHE_ITEMS)
+    parser.add_argument("--format", choices=BACKENDS, default="onnx")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    add_bucket_argument(parser)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.input, "r", encoding="utf-8") as f:
+        document = f.read()
+    corrector = BatchCorrector(args.format, args.model_dir, args.model_id, args.encoder_buckets, args.batch_size)
+    document_corrector = DocumentCorrector(corrector, SentenceCache(args.cache, args.cache_items))
+
+    t0 = time.perf_counter()
+    corrected, stats = document_corrector.correct(document)
+    elapsed = time.perf_counter() - t0
+    document_corrector.cache.save()
+    print(f"✅ {stats['sentences']} sentences in {elapsed:.2f}s: {stats['corrected']} corrected, "
+          f"{stats['cached']} from cache")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(corrected)
+        print(f"Corrected document saved to {args.output}")
+    else:
+        print(corrected)
+
+if __name__ == "__main__":
+    main()
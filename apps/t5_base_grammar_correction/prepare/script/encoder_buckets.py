@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Static encoder-length buckets for the T5 grammar correction exports.
+
+The exports used to pad every prompt to 1024 tokens, so a 9-token prompt paid for
+encoder self-attention over ~1000 pad positions on every generation step. The
+exporters now write one static-shape graph per bucket, and the inference scripts
+pad each prompt only up to the smallest bucket that holds it.
+
+No torch / transformers import here, so the Core ML verification can use it too.
+"""
+
+import os
+
+ENCODER_BUCKETS = (32, 64, 128, 256, 512, 1024)
+MAX_ENCODER_LENGTH = ENCODER_BUCKETS[-1]
+
+
+def select_bucket(n_tokens, buckets=ENCODER_BUCKETS):
+    """Smallest bucket holding n_tokens (the largest one when the prompt gets truncated)."""
+    for length in sorted(buckets):
+        if n_tokens <= length:
+            return length
+    return max(buckets)
+
+def bucket_path(path, length):
+    """Artifact path of one bucket. The 1024 bucket keeps the original, unsuffixed name."""
+    if length == MAX_ENCODER_LENGTH:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-enc{length}{ext}"
+
+def stateless_path(model_dir, model_id, ext, length=MAX_ENCODER_LENGTH, vocab_suffix=""):
+    """Stateless full-buffer model of export.py for one bucket (ext: torchscript, pt2 or onnx)."""
+    safe_name = model_id.replace("/", "_")
+    return bucket_path(os.path.join(model_dir, f"{safe_name}{vocab_suffix}.{ext}"), length)
+
+def coreml_fixed_path(model_dir, model_id, length=MAX_ENCODER_LENGTH, decoder_length=128, vocab_suffix=""):
+    """Fixed-shape Core ML package of export_coreml_fixed.py for one bucket."""
+    safe_name = model_id.replace("/", "_")
+    name = f"{safe_name}-fixed-{MAX_ENCODER_LENGTH}-{decoder_length}{vocab_suffix}-fp32.mlpackage"
+    return bucket_path(os.path.join(model_dir, name), length)
+
+def encode_to_bucket(tokenizer, text, buckets=ENCODER_BUCKETS, return_tensors="pt"):
+    """Tokenizes text and pads it to its bucket. Returns (input_ids, attention_mask, bucket length)."""
+    n_tokens = len(tokenizer(text).input_ids)
+    if n_tokens > max(buckets):
+        print(f"⚠️ Prompt of {n_tokens} tokens truncated to {max(buckets)}; use long_document.py for long inputs.")
+    length = select_bucket(n_tokens, buckets)
+    inputs = tokenizer(text, return_tensors=return_tensors, max_length=length, padding="max_length", truncation=True)
+    return inputs["input_ids"], inputs["attention_mask"], length
+
+def add_bucket_argument(parser, default=ENCODER_BUCKETS):
+    parser.add_argument(
+        "--encoder-buckets", type=int, nargs="+", default=list(default),
+        help=f"Static encoder lengths to export / route to (default: {' '.join(map(str, default))}).",
+    )
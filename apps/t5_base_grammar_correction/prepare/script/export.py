@@ -1,9 +1,24 @@
 
+import argparse
+import sys
 import torch
 import numpy as np
 import os
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 
+from encoder_buckets import MAX_ENCODER_LENGTH, add_bucket_argument, stateless_path
+# export_cache.py is shared by the apps' prepare scripts (tools/ at the repository root)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "tools"))
+from export_cache import ExportCache, library_versions, source_digest
+from pruned_vocab import PrunedVocabWrapper, load_whitelist, pruned_suffix
+
+parser = argparse.ArgumentParser(description="Export T5 grammar correction to TorchScript, PT2 and ONNX.")
+parser.add_argument("--force", action="store_true", help="Rebuild every artifact, ignoring the export cache.")
+add_bucket_argument(parser)
+parser.add_argument("--vocab-whitelist", default=None,
+                    help="Token whitelist from pruned_vocab.py: export a reduced LM head ({safe_name}-vocab<K>).")
+args = parser.parse_args()
+
 # --- 1. Set paths ---
 script_dir = os.path.dirname(os.path.abspath(__file__))
 # "model is above export script model" -> ../model
@@ -29,113 +44,205 @@ class ModelWrapper(torch.nn.Module):
         )
         return (outputs.logits,)
 
-# --- 3. Load Model ---
+# --- Export cache ---
+# Artifacts are reused when the weights, the wrapper, the export settings and the
+# library versions are unchanged (see export_cache.py). --force rebuilds everything.
 model_name = "vennify/t5-base-grammar-correction"
+safe_name = model_name.replace("/", "_")
+# T5 uses relative positional embeddings, so it can handle longer sequences than n_positions (512).
+# Encoder lengths: one static-shape export per bucket (see encoder_buckets.py), up to 1024.
+# The 1024 bucket keeps the original artifact and input file names.
+encoder_buckets = sorted(set(args.encoder_buckets))
+decoder_length = 128
+text = "grammar: This sentences has has bads grammar." * 100 # Make it long enough
+ONNX_OPSET = 18
+FORMATS = ("torchscript", "pt2", "onnx")
+# Optional pruned output vocabulary: logits over the whitelist ids only
+vocab_ids = load_whitelist(args.vocab_whitelist) if args.vocab_whitelist else None
+vocab_suffix = pruned_suffix(vocab_ids) if vocab_ids else ""
+
+def bucket_input_dir(max_length):
+    if max_length == MAX_ENCODER_LENGTH:
+        return input_dir
+    return os.path.join(input_dir, f"enc{max_length}")
+
+def input_paths(max_length):
+    bucket_dir = bucket_input_dir(max_length)
+    return [
+        os.path.join(bucket_dir, "0_input_ids.npy"),
+        os.path.join(bucket_dir, "1_attention_mask.npy"),
+        os.path.join(bucket_dir, "2_decoder_input_ids.npy"),
+    ]
+
+def export_paths(max_length):
+    return {fmt: stateless_path(model_dir, model_name, fmt, max_length, vocab_suffix) for fmt in FORMATS}
+
+def export_cache_keys(cache, max_length):
+    """Cache keys of the inputs and of each format (None until the weights are local)."""
+    weights = cache.weights_digest(model_name)
+    inputs_key = cache.key(weights=weights, text=text, max_length=max_length, decoder_length=decoder_length)
+    wrapper = source_digest(PrunedVocabWrapper) if vocab_ids else source_digest(ModelWrapper)
+    common = dict(
+        weights=weights, wrapper=wrapper, vocab_ids=vocab_ids or "full", inputs=inputs_key,
+        versions=library_versions("torch", "onnx", "transformers"), dtype="float32",
+    )
+    format_keys = {
+        "torchscript": cache.key(format="torchscript", **common),
+        "pt2": cache.key(format="pt2", **common),
+        "onnx": cache.key(format="onnx", opset=ONNX_OPSET, dynamic_axes=True, **common),
+    }
+    return inputs_key, format_keys
+
+def bucket_is_fresh(cache, max_length):
+    inputs_key, format_keys = export_cache_keys(cache, max_length)
+    return (
+        all(cache.is_fresh(path, inputs_key) for path in input_paths(max_length))
+        and all(cache.is_fresh(path, format_keys[fmt]) for fmt, path in export_paths(max_length).items())
+    )
+
+cache = ExportCache(os.path.normpath(os.path.join(script_dir, "..")), force=args.force)
+if all(bucket_is_fresh(cache, max_length) for max_length in encoder_buckets):
+    for max_length in encoder_buckets:
+        inputs_key, format_keys = export_cache_keys(cache, max_length)
+        for path in input_paths(max_length):
+            cache.reuse(path, inputs_key)
+        for fmt, path in export_paths(max_length).items():
+            cache.reuse(path, format_keys[fmt])
+    print("✅ All artifacts are up to date, nothing to export (use --force to rebuild).")
+    cache.write_manifest()
+    sys.exit(0)
+
+# --- 3. Load Model ---
 print(f"Loading model: '{model_name}'...")
 
 tokenizer = AutoTokenizer.from_pretrained(model_name)
 hf_model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
 
-wrapped_model = ModelWrapper(hf_model)
+if vocab_ids:
+    wrapped_model = PrunedVocabWrapper(hf_model, vocab_ids)
+    print(f"LM head pruned to {len(vocab_ids)} of {hf_model.config.vocab_size} tokens.")
+else:
+    wrapped_model = ModelWrapper(hf_model)
 wrapped_model.eval()
 print("Model loaded and wrapped successfully.")
 
-# --- 4. Prepare Inputs ---
-# T5 uses relative positional embeddings, so it can handle longer sequences than n_positions (512).
-# User request: Max input length 1024
-max_length = 1024
-text = "grammar: This sentences has has bads grammar." * 100 # Make it long enough
-print(f"Preprocessing text to max_length={max_length}...")
-
-inputs = tokenizer(
-    text, 
-    return_tensors="pt", 
-    max_length=max_length, 
-    padding="max_length", 
-    truncation=True
-)
-input_ids = inputs.input_ids
-attention_mask = inputs.attention_mask
-
 # T5 uses pad_token_id as decoder_start_token_id if not explicitly set
 start_token = hf_model.config.decoder_start_token_id
 if start_token is None:
     start_token = hf_model.config.pad_token_id
 
-# --- CRITICAL FIX FOR COREML / TORCHSCRIPT ---
-# The model is STATELESS. If we export with [1, 1], it can only see the last token.
-# It instantly forgets history, leading to loops ("School School School").
-# We MUST export with a Fixed History Buffer (e.g. 128) so it can see previous tokens.
-decoder_length = 128
-decoder_input_ids = torch.full((1, decoder_length), 0, dtype=torch.long) # Fill with Pad (0)
-decoder_input_ids[0, 0] = start_token # Set first token to start
-
-print(f"\nCreated dummy inputs (Max Length {max_length}, Decoder Fixed {decoder_length}):")
-print(f" - input_ids shape: {input_ids.shape}")
-print(f" - attention_mask shape: {attention_mask.shape}")
-print(f" - decoder_input_ids shape: {decoder_input_ids.shape}")
-
-# --- 5. Save Inputs ---
-# (0_input0.npy, 1_input1.npy...) style as requested, but keeping meaningful names for clarity
-# while satisfying the numbering requirement.
-np.save(os.path.join(input_dir, "0_input_ids.npy"), input_ids.numpy())
-np.save(os.path.join(input_dir, "1_attention_mask.npy"), attention_mask.numpy())
-np.save(os.path.join(input_dir, "2_decoder_input_ids.npy"), decoder_input_ids.numpy())
-print(f"Input files have been saved to '{input_dir}'.")
-
-dummy_inputs = (input_ids, attention_mask, decoder_input_ids)
-safe_name = model_name.replace("/", "_")
-
-# --- 6. Export ---
-
-# (1) TorchScript (.torchscript)
-ts_path = os.path.join(model_dir, f"{safe_name}.torchscript")
-print(f"\nExporting to TorchScript ({ts_path})...")
-try:
-    traced_model = torch.jit.trace(wrapped_model, dummy_inputs)
-    traced_model.save(ts_path)
-    print("✅ TorchScript export success.")
-except Exception as e:
-    print(f"❌ TorchScript export failed: {e}")
-
-# (2) Exported Program (.pt2)
-pt2_path = os.path.join(model_dir, f"{safe_name}.pt2")
-print(f"\nExporting to Exported Program ({pt2_path})...")
-try:
-    if hasattr(torch, "export"):
-        ep = torch.export.export(wrapped_model, dummy_inputs)
-        torch.export.save(ep, pt2_path)
-        print("✅ Exported Program export success.")
-    else:
-        print("❌ torch.export not available (requires PyTorch 2.x).")
-except Exception as e:
-    print(f"❌ Exported Program export failed: {e}")
-
-# (3) ONNX (.onnx)
-onnx_path = os.path.join(model_dir, f"{safe_name}.onnx")
-print(f"\nExporting to ONNX ({onnx_path})...")
-try:
-    import inspect
-    sig = inspect.signature(torch.onnx.export)
-    export_kwargs = {}
-    if "dynamo" in sig.parameters:
-        export_kwargs["dynamo"] = False
-
-    torch.onnx.export(
-        wrapped_model,
-        dummy_inputs,
-        onnx_path,
-        input_names=["input_ids", "attention_mask", "decoder_input_ids"],
-        output_names=["logits"],
-        opset_version=18,
-        dynamic_axes={
-            "input_ids": {0: "batch", 1: "seq"},
-            "attention_mask": {0: "batch", 1: "seq"},
-            "decoder_input_ids": {0: "batch", 1: "dec_seq"},
-            "logits": {0: "batch", 1: "dec_seq"}
-        },
-        **export_kwargs
+def export_bucket(max_length):
+    # Keys are computed after loading: freshly downloaded weights can be digested now
+    inputs_key, format_keys = export_cache_keys(cache, max_length)
+    paths = export_paths(max_length)
+    print(f"\n===== Encoder bucket {max_length} =====")
+
+    # --- 4. Prepare Inputs ---
+    print(f"Preprocessing text to max_length={max_length}...")
+
+    inputs = tokenizer(
+        text, 
+        return_tensors="pt", 
+        max_length=max_length, 
+        padding="max_length", 
+        truncation=True
     )
-    print("✅ ONNX export success.")
-except Exception as e:
-    print(f"❌ ONNX export failed: {e}")
+    input_ids = inputs.input_ids
+    attention_mask = inputs.attention_mask
+
+    # --- CRITICAL FIX FOR COREML / TORCHSCRIPT ---
+    # The model is STATELESS. If we export with [1, 1], it can only see the last token.
+    # It instantly forgets history, leading to loops ("School School School").
+    # We MUST export with a Fixed History Buffer (e.g. 128) so it can see previous tokens.
+    decoder_input_ids = torch.full((1, decoder_length), 0, dtype=torch.long) # Fill with Pad (0)
+    decoder_input_ids[0, 0] = start_token # Set first token to start
+
+    print(f"\nCreated dummy inputs (Max Length {max_length}, Decoder Fixed {decoder_length}):")
+    print(f" - input_ids shape: {input_ids.shape}")
+    print(f" - attention_mask shape: {attention_mask.shape}")
+    print(f" - decoder_input_ids shape: {decoder_input_ids.shape}")
+
+    # --- 5. Save Inputs ---
+    # (0_input0.npy, 1_input1.npy...) style as requested, but keeping meaningful names for clarity
+    # while satisfying the numbering requirement.
+    bucket_dir = bucket_input_dir(max_length)
+    if all(cache.reuse(path, inputs_key) for path in input_paths(max_length)):
+        print(f"Input files in '{bucket_dir}' are up to date.")
+    else:
+        os.makedirs(bucket_dir, exist_ok=True)
+        for path, array in zip(input_paths(max_length), (input_ids, attention_mask, decoder_input_ids)):
+            np.save(path, array.numpy())
+            cache.record(path, inputs_key)
+        print(f"Input files have been saved to '{bucket_dir}'.")
+
+    dummy_inputs = (input_ids, attention_mask, decoder_input_ids)
+
+    # --- 6. Export ---
+
+    # (1) TorchScript (.torchscript)
+    ts_path = paths["torchscript"]
+    print(f"\nExporting to TorchScript ({ts_path})...")
+    try:
+        if cache.reuse(ts_path, format_keys["torchscript"]):
+            print("✅ TorchScript is up to date, skipped.")
+        else:
+            traced_model = torch.jit.trace(wrapped_model, dummy_inputs)
+            traced_model.save(ts_path)
+            cache.record(ts_path, format_keys["torchscript"])
+            print("✅ TorchScript export success.")
+    except Exception as e:
+        print(f"❌ TorchScript export failed: {e}")
+
+    # (2) Exported Program (.pt2)
+    pt2_path = paths["pt2"]
+    print(f"\nExporting to Exported Program ({pt2_path})...")
+    try:
+        if cache.reuse(pt2_path, format_keys["pt2"]):
+            print("✅ Exported Program is up to date, skipped.")
+        elif hasattr(torch, "export"):
+            ep = torch.export.export(wrapped_model, dummy_inputs)
+            torch.export.save(ep, pt2_path)
+            cache.record(pt2_path, format_keys["pt2"])
+            print("✅ Exported Program export success.")
+        else:
+            print("❌ torch.export not available (requires PyTorch 2.x).")
+    except Exception as e:
+        print(f"❌ Exported Program export failed: {e}")
+
+    # (3) ONNX (.onnx)
+    onnx_path = paths["onnx"]
+    print(f"\nExporting to ONNX ({onnx_path})...")
+    try:
+        if cache.reuse(onnx_path, format_keys["onnx"]):
+            print("✅ ONNX is up to date, skipped.")
+        else:
+            import inspect
+            sig = inspect.signature(torch.onnx.export)
+            export_kwargs = {}
+            if "dynamo" in sig.parameters:
+                export_kwargs["dynamo"] = False
+
+            torch.onnx.export(
+                wrapped_model,
+                dummy_inputs,
+                onnx_path,
+                input_names=["input_ids", "attention_mask", "decoder_input_ids"],
+                output_names=["logits"],
+                opset_version=ONNX_OPSET,
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "seq"},
+                    "attention_mask": {0: "batch", 1: "seq"},
+                    "decoder_input_ids": {0: "batch", 1: "dec_seq"},
+                    "logits": {0: "batch", 1: "dec_seq"}
+                },
+                **export_kwargs
+            )
+            cache.record(onnx_path, format_keys["onnx"])
+            print("✅ ONNX export success.")
+    except Exception as e:
+        print(f"❌ ONNX export failed: {e}")
+
+for max_length in encoder_buckets:
+    export_bucket(max_length)
+
+cache.write_manifest()
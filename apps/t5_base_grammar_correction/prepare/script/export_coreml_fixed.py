@@ -1,40 +1,78 @@
+import argparse
 import torch
 import coremltools as ct
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
 import os
+import sys
 import numpy as np
 
+from encoder_buckets import MAX_ENCODER_LENGTH, add_bucket_argument, coreml_fixed_path
+# export_cache.py is shared by the apps' prepare scripts (tools/ at the repository root)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "tools"))
+from export_cache import ExportCache, library_versions, source_digest
+from pruned_vocab import PrunedVocabWrapper, load_whitelist, pruned_suffix
+
 # Define Wrapper to ensure clean signature
 class T5Wrapper(torch.nn.Module):
-    def __init__(self, model):
+    def __init__(self, model, vocab_ids=None):
         super().__init__()
         self.model = model
+        # Reduced LM head over a mined token whitelist (pruned_vocab.py)
+        self.pruned = PrunedVocabWrapper(model, vocab_ids) if vocab_ids else None
 
     def forward(self, input_ids, attention_mask, decoder_input_ids):
-        outputs = self.model(
-            input_ids=input_ids,
-            attention_mask=attention_mask,
-            decoder_input_ids=decoder_input_ids
-        )
+        if self.pruned is not None:
+            logits = self.pruned(input_ids, attention_mask, decoder_input_ids)[0]
+        else:
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                decoder_input_ids=decoder_input_ids
+            )
+            logits = outputs.logits
         # FP16 ROBUSTNESS FIX:
         # T5 logits can exceed 65504 (FP16 max), causing "!!!!" garbage on ANE.
         # clamping to [-1000, 1000] is safe for argmax/softmax and prevents overflow.
-        logits = outputs.logits
         return torch.clamp(logits, min=-1000.0, max=1000.0)
 
-def export_model():
+def export_model(force=False, encoder_length=MAX_ENCODER_LENGTH, tokenizer=None, model=None, vocab_ids=None):
     model_name = "vennify/t5-base-grammar-correction"
-    print(f"Loading model: {model_name}")
-    
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-    model.eval()
-    
-    wrapper = T5Wrapper(model)
-    
+
     # FIXED LENGTH CONSTANTS
-    FIXED_ENC_LEN = 1024
+    FIXED_ENC_LEN = encoder_length
     FIXED_DEC_LEN = 128
+    vocab_suffix = pruned_suffix(vocab_ids) if vocab_ids else ""
+    # Written to the working directory; the 1024 bucket keeps its original name
+    save_path = coreml_fixed_path("", model_name, FIXED_ENC_LEN, FIXED_DEC_LEN, vocab_suffix)
+
+    # Reuse the .mlpackage when weights, wrapper and conversion settings are unchanged
+    cache = ExportCache(os.path.dirname(os.path.abspath(save_path)), force=force)
+    def cache_key():
+        return cache.key(
+            weights=cache.weights_digest(model_name), wrapper=source_digest(T5Wrapper, PrunedVocabWrapper),
+            vocab_ids=vocab_ids or "full",
+            versions=library_versions("torch", "coremltools", "transformers"),
+            shapes=[FIXED_ENC_LEN, FIXED_DEC_LEN], input_dtype="int32", precision="FLOAT32",
+            compute_units="ALL", target="iOS16",
+        )
+    mlpackage_key = cache_key()
+    if cache.reuse(save_path, mlpackage_key):
+        print(f"{save_path} is up to date, nothing to convert (use --force to rebuild).")
+        cache.write_manifest()
+        return tokenizer, model
+
+    if model is None:
+        print(f"Loading model: {model_name}")
+
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        model.eval()
+    
+    wrapper = T5Wrapper(model, vocab_ids)
+    if mlpackage_key is None:
+        # Weights were just downloaded: now they can be digested
+        mlpackage_key = cache_key()
+    
     print(f"Exporting with FIXED shapes: Encoder [1, {FIXED_ENC_LEN}], Decoder [1, {FIXED_DEC_LEN}]")
     
     # Create Dummy Inputs with Padding
@@ -73,9 +111,21 @@ def export_model():
         minimum_deployment_target=ct.target.iOS16
     )
     
-    save_path = "vennify_t5-base-grammar-correction-fixed-1024-128-fp32.mlpackage"
     mlmodel.save(save_path)
+    cache.record(save_path, mlpackage_key)
+    cache.write_manifest()
     print(f"Success! Model saved to {save_path}")
+    return tokenizer, model
 
 if __name__ == "__main__":
-    export_model()
+    parser = argparse.ArgumentParser(description="Convert T5 grammar correction to fixed-shape Core ML packages.")
+    parser.add_argument("--force", action="store_true", help="Rebuild the packages, ignoring the export cache.")
+    add_bucket_argument(parser)
+    parser.add_argument("--vocab-whitelist", default=None,
+                        help="Token whitelist from pruned_vocab.py: convert with a reduced LM head.")
+    args = parser.parse_args()
+    vocab_ids = load_whitelist(args.vocab_whitelist) if args.vocab_whitelist else None
+    # One package per static encoder length; the model is loaded once and shared
+    tokenizer, model = None, None
+    for encoder_length in sorted(set(args.encoder_buckets)):
+        tokenizer, model = export_model(args.force, encoder_length, tokenizer, model, vocab_ids)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Split encoder / decoder-step export of T5 grammar correction with an explicit KV cache.
+
+export.py exports a stateless model, so every generation step re-runs the [1, 1024]
+encoder and the whole [1, 128] decoder buffer. This script exports two static-shape
+graphs instead (TorchScript, PT2 and ONNX):
+
+  encoder:      input_ids [B, S], attention_mask [B, S]
+                -> cross_kv [L, 2, B, H, S, d]  (cross-attention keys/values of every layer)
+  decoder step: decoder_input_ids [B, 1], step [1], self_kv [L, 2, B, H, T, d],
+                cross_kv [L, 2, B, H, S, d], attention_mask [B, S]
+                -> logits [B, V], self_kv (slot `step` written)
+
+The self-attention cache has T = 128 fixed slots (the decoder buffer of export.py);
+slots after `step` are masked out. The encoder runs once per prompt and each new
+token costs one decoder-step call (see inference_kv_cache.py).
+
+Both graphs are exported once per encoder bucket (encoder_buckets.py), since the
+decoder step takes the bucket-length cross_kv and attention mask. The batch
+dimension B is dynamic (batched decoding in batch_correct.py).
+"""
+
+import argparse
+import os
+import sys
+
+import torch
+import torch.nn as nn
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from encoder_buckets import ENCODER_BUCKETS, MAX_ENCODER_LENGTH, add_bucket_argument
+# export_cache.py is shared by the apps' prepare scripts (tools/ at the repository root)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "tools"))
+from export_cache import ExportCache, library_versions, source_digest
+
+MODEL_ID = "vennify/t5-base-grammar-correction"
+ENCODER_LENGTH = MAX_ENCODER_LENGTH
+DECODER_LENGTH = 128
+ONNX_OPSET = 18
+FORMATS = ("torchscript", "pt2", "onnx")
+EXTENSIONS = {"torchscript": "torchscript", "pt2": "pt2", "onnx": "onnx"}
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MODEL_DIR = os.path.normpath(os.path.join(script_dir, "../model"))
+
+ENCODER_INPUTS = ["input_ids", "attention_mask"]
+ENCODER_OUTPUTS = ["cross_kv"]
+STEP_INPUTS = ["decoder_input_ids", "step", "self_kv", "cross_kv", "attention_mask"]
+STEP_OUTPUTS = ["logits", "new_self_kv"]
+# Batch axis of every input/output: the graphs take any batch size (batch_correct.py)
+ENCODER_BATCH_AXES = {"input_ids": 0, "attention_mask": 0, "cross_kv": 2}
+STEP_BATCH_AXES = {
+    "decoder_input_ids": 0, "self_kv": 2, "cross_kv": 2, "attention_mask": 0, "logits": 0, "new_self_kv": 2,
+}
+MAX_BATCH = 1024
+
+
+def artifact_paths(model_dir, fmt, model_id=MODEL_ID, encoder_length=ENCODER_LENGTH):
+    """(encoder path, decoder-step path) of one format."""
+    safe_name = model_id.replace("/", "_")
+    ext = EXTENSIONS[fmt]
+    return (
+        os.path.join(model_dir, f"{safe_name}-encoder-{encoder_length}.{ext}"),
+        os.path.join(model_dir, f"{safe_name}-decoder-step-{encoder_length}.{ext}"),
+    )
+
+def attention_bias(mask, dtype=torch.float32):
+    """[B, S] 1/0 mask -> [B, 1, 1, S] additive bias (0 or dtype min)."""
+    return (1.0 - mask[:, None, None, :].to(dtype)) * torch.finfo(dtype).min
+
+
+def decoder_output_scale(config):
+    """Tied-embedding T5 (v1.0) rescales the decoder output by d_model**-0.5 before the LM head."""
+    scale_outputs = getattr(config, "scale_decoder_outputs", None)
+    if scale_outputs is None:
+        scale_outputs = config.tie_word_embeddings
+    return config.d_model ** -0.5 if scale_outputs else 1.0
+
+
+# -------------------------------------------------------------------------
+# WRAPPERS
+# -------------------------------------------------------------------------
+class T5EncoderKV(nn.Module):
+    """Runs the encoder and projects its output to every decoder layer's cross-attention K/V."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+        self.cross_attentions = nn.ModuleList(block.layer[1].EncDecAttention for block in model.decoder.block)
+
+    def forward(self, input_ids, attention_mask):
+        hidden = self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        batch, length, _ = hidden.shape
+        layers = []
+        for attn in self.cross_attentions:
+            k = attn.k(hidden).view(batch, length, attn.n_heads, attn.key_value_proj_dim).transpose(1, 2)
+            v = attn.v(hidden).view(batch, length, attn.n_heads, attn.key_value_proj_dim).transpose(1, 2)
+            layers.append(torch.stack([k, v]))
+        return torch.stack(layers)
+
+
+class T5DecoderStepKV(nn.Module):
+    """
+    One decoder token against the fixed-slot self-attention cache. Re-implements the
+    T5 decoder block math (unscaled dot-product attention, relative position bias from
+    the first layer, pre-norm residuals) so every shape stays static.
+    """
+
+    def __init__(self, model, decoder_length=DECODER_LENGTH):
+        super().__init__()
+        self.embed_tokens = model.decoder.embed_tokens
+        self.blocks = model.decoder.block
+        self.final_layer_norm = model.decoder.final_layer_norm
+        self.lm_head = model.lm_head
+        self.decoder_length = decoder_length
+        self.position_attention = self.blocks[0].layer[0].SelfAttention
+        self.output_scale = decoder_output_scale(model.config)
+
+    def self_attention_bias(self, step):
+        """Relative position bias of query `step` against every slot, plus the causal mask: [1, H, 1, T]."""
+        attn = self.position_attention
+        slots = torch.arange(self.decoder_length, dtype=torch.long, device=step.device)
+        relative_position = slots - step
+        buckets = attn._relative_position_bucket(
+            relative_position,
+            bidirectional=False,
+            num_buckets=attn.relative_attention_num_buckets,
+            max_distance=attn.relative_attention_max_distance,
+        )
+        bias = attn.relative_attention_bias(buckets).transpose(0, 1)[None, :, None, :]
+        future = (slots > step).to(bias.dtype)[None, None, None, :]
+        return bias + future * torch.finfo(bias.dtype).min
+
+    @staticmethod
+    def attend(attn, query, keys, values, bias):
+        scores = torch.matmul(query, keys.transpose(-1, -2)) + bias
+        weights = torch.softmax(scores.float(), dim=-1).type_as(scores)
+        context = torch.matmul(weights, values)
+        batch = context.shape[0]
+        return attn.o(context.transpose(1, 2).reshape(batch, 1, attn.inner_dim))
+
+    def forward(self, decoder_input_ids, step, self_kv, cross_kv, attention_mask):
+        hidden = self.embed_tokens(decoder_input_ids)
+        batch = hidden.shape[0]
+        self_bias = self.self_attention_bias(step)
+        cross_bias = attention_bias(attention_mask, hidden.dtype)
+        write = (torch.arange(self.decoder_length, device=step.device) == step).to(hidden.dtype)[None, None, :, None]
+
+        new_layers = []
+        for i, block in enumerate(self.blocks):
+            self_layer, cross_layer, ff_layer = block.layer[0], block.layer[1], block.layer[2]
+
+            attn = self_layer.SelfAttention
+            normed = self_layer.layer_norm(hidden)
+            heads = (batch, 1, attn.n_heads, attn.key_value_proj_dim)
+            query = attn.q(normed).view(heads).transpose(1, 2)
+            key = attn.k(normed).view(heads).transpose(1, 2)
+            value = attn.v(normed).view(heads).transpose(1, 2)
+            # Write the new key/value into slot `step` (one-hot blend keeps the graph static)
+            keys = self_kv[i, 0] * (1.0 - write) + key * write
+            values = self_kv[i, 1] * (1.0 - write) + value * write
+            new_layers.append(torch.stack([keys, values]))
+            hidden = hidden + self.attend(attn, query, keys, values, self_bias)
+
+            attn = cross_layer.EncDecAttention
+            normed = cross_layer.layer_norm(hidden)
+            query = attn.q(normed).view(heads).transpose(1, 2)
+            hidden = hidden + self.attend(attn, query, cross_kv[i, 0], cross_kv[i, 1], cross_bias)
+
+            hidden = ff_layer(hidden)
+
+        hidden = self.final_layer_norm(hidden) * self.output_scale
+        logits = self.lm_head(hidden)[:, 0, :]
+        return logits, torch.stack(new_layers)
+
+
+def empty_self_kv(cross_kv, decoder_length=DECODER_LENGTH):
+    """Zeroed [L, 2, B, H, T, d] self-attention cache matching a cross_kv tensor."""
+    layers, _, batch, heads, _, head_dim = cross_kv.shape
+    return torch.zeros((layers, 2, batch, heads, decoder_length, head_dim), dtype=cross_kv.dtype)
+
+def load_model(model_id=MODEL_ID):
+    print(f"Loading model: '{model_id}'...")
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_id)
+    model.eval()
+    return tokenizer, model
+
+def example_inputs(tokenizer, model, encoder_length=ENCODER_LENGTH, decoder_length=DECODER_LENGTH, texts=None):
+    # Two rows of different lengths: batch 1 would get specialized by the exporters
+    texts = texts or ["grammar: This sentences has has bads grammar.", "grammar: He go to school"]
+    inputs = tokenizer(texts, return_tensors="pt", max_length=encoder_length, padding="max_length", truncation=True)
+    encoder = T5EncoderKV(model).eval()
+    with torch.no_grad():
+        cross_kv = encoder(inputs.input_ids, inputs.attention_mask)
+    start_token = model.config.decoder_start_token_id
+    if start_token is None:
+        start_token = model.config.pad_token_id
+    encoder_args = (inputs.input_ids, inputs.attention_mask)
+    step_args = (
+        torch.full((len(texts), 1), start_token, dtype=torch.long),
+        torch.zeros(1, dtype=torch.long),
+        empty_self_kv(cross_kv, decoder_length),
+        cross_kv,
+        inputs.attention_mask,
+    )
+    return encoder_args, step_args
+
+
+# -------------------------------------------------------------------------
+# EXPORT
+# -------------------------------------------------------------------------
+def export_graph(fmt, module, args, path, input_names, output_names, batch_axes=None):
+    """batch_axes: {input/output name: axis} exported as a dynamic batch dimension."""
+    batch_axes = batch_axes or {}
+    if fmt == "torchscript":
+        # Traced shape arithmetic stays symbolic, so the batch follows the inputs
+        with torch.no_grad():
+            traced = torch.jit.trace(module, args)
+        traced.save(path)
+    elif fmt == "pt2":
+        dynamic_shapes = None
+        if batch_axes:
+            batch = torch.export.Dim("batch", min=1, max=MAX_BATCH)
+            dynamic_shapes = tuple(
+                {batch_axes[name]: batch} if name in batch_axes else None for name in input_names
+            )
+        exported_program = torch.export.export(module, args, dynamic_shapes=dynamic_shapes, strict=False)
+        torch.export.save(exported_program, path)
+    elif fmt == "onnx":
+        import inspect
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+        torch.onnx.export(
+            module, args, path,
+            input_names=input_names, output_names=output_names,
+            opset_version=ONNX_OPSET,
+            dynamic_axes={name: {axis: "batch"} for name, axis in batch_axes.items()},
+            **export_kwargs
+        )
+    else:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {FORMATS}")
+
+def verify_step(model, encoder_args, step_args, decoder_length=DECODER_LENGTH, n_steps=8):
+    """Greedy tokens and logits of the KV wrappers against the stateless full-buffer model."""
+    encoder = T5EncoderKV(model).eval()
+    decoder_step = T5DecoderStepKV(model, decoder_length).eval()
+    input_ids, attention_mask = encoder_args
+    token, _, self_kv, _, _ = step_args
+    buffer = torch.full((token.shape[0], decoder_length), model.config.pad_token_id, dtype=torch.long)
+    buffer[:, 0] = token[:, 0]
+    max_diff = 0.0
+    with torch.no_grad():
+        cross_kv = encoder(input_ids, attention_mask)
+        for i in range(n_steps):
+            logits, self_kv = decoder_step(token, torch.tensor([i]), self_kv, cross_kv, attention_mask)
+            full = model(input_ids=input_ids, attention_mask=attention_mask, decoder_input_ids=buffer).logits[:, i, :]
+            max_diff = max(max_diff, (logits - full).abs().max().item())
+            token = full.argmax(-1, keepdim=True)
+            buffer[:, i + 1] = token[:, 0]
+    return max_diff
+
+def export_kv_cache(model_id=MODEL_ID, model_dir=DEFAULT_MODEL_DIR, formats=FORMATS,
+                    encoder_lengths=ENCODER_BUCKETS, decoder_length=DECODER_LENGTH, force=False):
+    os.makedirs(model_dir, exist_ok=True)
+    cache = ExportCache(os.path.dirname(model_dir), force=force)
+    jobs = []
+    for encoder_length in sorted(set(encoder_lengths)):
+        for fmt in formats:
+            encoder_path, step_path = artifact_paths(model_dir, fmt, model_id, encoder_length)
+            jobs.append((encoder_length, fmt, "encoder", encoder_path))
+            jobs.append((encoder_length, fmt, "decoder-step", step_path))
+
+    # The decoder step is traced with cross_kv / attention_mask of the encoder length,
+    # so both graphs are keyed on both lengths
+    def job_key(encoder_length, fmt, graph):
+        return cache.key(
+            weights=cache.weights_digest(model_id), versions=library_versions("torch", "onnx", "transformers"),
+            wrappers=source_digest(T5EncoderKV, T5DecoderStepKV, attention_bias, decoder_output_scale), format=fmt, graph=graph,
+            opset=ONNX_OPSET if fmt == "onnx" else "-", encoder_length=encoder_length, decoder_length=decoder_length,
+            dynamic_batch=MAX_BATCH,
+        )
+    stale = [job for job in jobs if not cache.reuse(job[3], job_key(*job[:3]))]
+    if not stale:
+        print("✅ All KV-cache artifacts are up to date (use --force to rebuild).")
+        cache.write_manifest()
+        return
+
+    tokenizer, model = load_model(model_id)
+    encoder = T5EncoderKV(model).eval()
+    decoder_step = T5DecoderStepKV(model, decoder_length).eval()
+    bucket_inputs = {}
+    for encoder_length, fmt, graph, path in stale:
+        if encoder_length not in bucket_inputs:
+            encoder_args, step_args = example_inputs(tokenizer, model, encoder_length, decoder_length)
+            max_diff = verify_step(model, encoder_args, step_args, decoder_length)
+            print(f"\n[{encoder_length}] KV-cache step vs stateless model: max logits diff {max_diff:.3e}")
+            if max_diff > 1e-3:
+                print("❌ KV-cache wrappers do not match the stateless model.")
+                return
+            bucket_inputs[encoder_length] = encoder_args, step_args
+        encoder_args, step_args = bucket_inputs[encoder_length]
+
+        print(f"\nExporting {graph} to {fmt.upper()} ({path})...")
+        try:
+            if graph == "encoder":
+                export_graph(fmt, encoder, encoder_args, path, ENCODER_INPUTS, ENCODER_OUTPUTS, ENCODER_BATCH_AXES)
+            else:
+                export_graph(fmt, decoder_step, step_args, path, STEP_INPUTS, STEP_OUTPUTS, STEP_BATCH_AXES)
+            cache.record(path, job_key(encoder_length, fmt, graph))
+            print(f"✅ {fmt} {graph} export success.")
+        except Exception as e:
+            print(f"❌ {fmt} {graph} export failed: {e}")
+    cache.write_manifest()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export T5 as encoder + decoder-step graphs with a KV cache.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(parser)
+    parser.add_argument("--decoder-length", type=int, default=DECODER_LENGTH)
+    parser.add_argument("--force", action="store_true", help="Rebuild every artifact, ignoring the export cache.")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    export_kv_cache(args.model_id, args.model_dir, args.formats, args.encoder_buckets, args.decoder_length, args.force)
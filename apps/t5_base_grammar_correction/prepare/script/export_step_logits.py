@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Position-gathered logits head for the fixed-buffer T5 export.
+
+The stateless export of export.py returns logits for all 128 decoder positions
+([1, 128, 32128] float32, ~16 MB) on every generation step, and the greedy loops
+read exactly one row of it (logits[0, i, :]). This variant takes the step index as
+a fourth input, gathers the decoder hidden state of that position before the LM
+head and returns:
+
+  head=logits  logits [B, V]                       (128x smaller output and LM-head matmul)
+  head=argmax  token [B] int64                     (greedy step fused on-graph)
+  head=topk    values [B, k], indices [B, k] int64
+
+The inputs are otherwise unchanged (input_ids, attention_mask, decoder_input_ids
+[1, 128]), so it drops into the existing fixed-buffer loop. One artifact per
+format, head and encoder bucket: {safe_name}-step-{head}[-enc<length>].{ext}.
+"""
+
+import argparse
+import os
+import sys
+
+import torch
+import torch.nn as nn
+
+from encoder_buckets import ENCODER_BUCKETS, add_bucket_argument, bucket_path
+# export_cache.py is shared by the apps' prepare scripts (tools/ at the repository root)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "..", "tools"))
+from export_cache import ExportCache, library_versions, source_digest
+from export_kv_cache import (
+    DECODER_LENGTH, DEFAULT_MODEL_DIR, EXTENSIONS, FORMATS, MODEL_ID, ONNX_OPSET,
+    decoder_output_scale, export_graph, load_model,
+)
+
+HEADS = ("logits", "argmax", "topk")
+DEFAULT_TOP_K = 5
+STEP_LOGITS_INPUTS = ["input_ids", "attention_mask", "decoder_input_ids", "step"]
+HEAD_OUTPUTS = {"logits": ["logits"], "argmax": ["token"], "topk": ["values", "indices"]}
+
+
+def artifact_path(model_dir, fmt, head, model_id=MODEL_ID, encoder_length=ENCODER_BUCKETS[-1]):
+    safe_name = model_id.replace("/", "_")
+    return bucket_path(os.path.join(model_dir, f"{safe_name}-step-{head}.{EXTENSIONS[fmt]}"), encoder_length)
+
+
+class StepLogitsWrapper(nn.Module):
+    """Stateless T5 that only runs the LM head on decoder position `step`."""
+
+    def __init__(self, model, head="logits", top_k=DEFAULT_TOP_K):
+        super().__init__()
+        if head not in HEADS:
+            raise ValueError(f"Unknown head '{head}', expected one of {HEADS}")
+        self.model = model
+        self.head = head
+        self.top_k = top_k
+        self.output_scale = decoder_output_scale(model.config)
+
+    def forward(self, input_ids, attention_mask, decoder_input_ids, step):
+        encoder_hidden = self.model.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        hidden = self.model.decoder(
+            input_ids=decoder_input_ids,
+            encoder_hidden_states=encoder_hidden,
+            encoder_attention_mask=attention_mask,
+        ).last_hidden_state
+        # [B, 128, D] -> [B, 1, D] before the [D, V] LM head
+        hidden = torch.index_select(hidden, 1, step) * self.output_scale
+        logits = self.model.lm_head(hidden)[:, 0, :]
+        if self.head == "argmax":
+            return torch.argmax(logits, dim=-1)
+        if self.head == "topk":
+            values, indices = torch.topk(logits, self.top_k, dim=-1)
+            return values, indices
+        return logits
+
+
+def example_inputs(tokenizer, model, encoder_length, decoder_length=DECODER_LENGTH):
+    text = "grammar: This sentences has has bads grammar." * 100
+    inputs = tokenizer(text, return_tensors="pt", max_length=encoder_length, padding="max_length", truncation=True)
+    start_token = model.config.decoder_start_token_id
+    if start_token is None:
+        start_token = model.config.pad_token_id
+    decoder_input_ids = torch.full((1, decoder_length), model.config.pad_token_id, dtype=torch.long)
+    decoder_input_ids[0, 0] = start_token
+    return inputs.input_ids, inputs.attention_mask, decoder_input_ids, torch.zeros(1, dtype=torch.long)
+
+def verify_heads(model, args):
+    """Max |diff| of the gathered logits against logits[:, step] of the full model, at a few steps."""
+    input_ids, attention_mask, decoder_input_ids, _ = args
+    wrapper = StepLogitsWrapper(model, "logits").eval()
+    max_diff = 0.0
+    with torch.no_grad():
+        full = model(input_ids=input_ids, attention_mask=attention_mask, decoder_input_ids=decoder_input_ids).logits
+        for i in (0, 1, decoder_input_ids.shape[1] - 1):
+            logits = wrapper(input_ids, attention_mask, decoder_input_ids, torch.tensor([i]))
+            max_diff = max(max_diff, (logits - full[:, i, :]).abs().max().item())
+    return max_diff
+
+def export_step_logits(model_id=MODEL_ID, model_dir=DEFAULT_MODEL_DIR, formats=FORMATS, heads=("logits", "argmax"),
+                       encoder_lengths=ENCODER_BUCKETS, top_k=DEFAULT_TOP_K, force=False):
+    os.makedirs(model_dir, exist_ok=True)
+    cache = ExportCache(os.path.dirname(model_dir), force=force)
+    jobs = [
+        (encoder_length, fmt, head, artifact_path(model_dir, fmt, head, model_id, encoder_length))
+        for encoder_length in sorted(set(encoder_lengths)) for fmt in formats for head in heads
+    ]
+
+    def job_key(encoder_length, fmt, head):
+        return cache.key(
+            weights=cache.weights_digest(model_id), versions=library_versions("torch", "onnx", "transformers"),
+            wrapper=source_digest(StepLogitsWrapper, decoder_output_scale), format=fmt, head=head,
+            top_k=top_k if head == "topk" else "-", opset=ONNX_OPSET if fmt == "onnx" else "-",
+            encoder_length=encoder_length, decoder_length=DECODER_LENGTH,
+        )
+    stale = [job for job in jobs if not cache.reuse(job[3], job_key(*job[:3]))]
+    if not stale:
+        print("✅ All step-logits artifacts are up to date (use --force to rebuild).")
+        cache.write_manifest()
+        return
+
+    tokenizer, model = load_model(model_id)
+    bucket_inputs = {}
+    for encoder_length, fmt, head, path in stale:
+        if encoder_length not in bucket_inputs:
+            bucket_inputs[encoder_length] = example_inputs(tokenizer, model, encoder_length)
+            max_diff = verify_heads(model, bucket_inputs[encoder_length])
+            print(f"\n[{encoder_length}] Gathered logits vs full logits: max diff {max_diff:.3e}")
+            if max_diff > 1e-4:
+                print("❌ Gathered head does not match the full model.")
+                return
+        args = bucket_inputs[encoder_length]
+
+        print(f"\nExporting {head} head to {fmt.upper()} ({path})...")
+        try:
+            wrapper = StepLogitsWrapper(model, head, top_k).eval()
+            export_graph(fmt, wrapper, args, path, STEP_LOGITS_INPUTS, HEAD_OUTPUTS[head])
+            cache.record(path, job_key(encoder_length, fmt, head))
+            print(f"✅ {fmt} {head} head export success.")
+        except Exception as e:
+            print(f"❌ {fmt} {head} head export failed: {e}")
+    cache.write_manifest()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export the fixed-buffer T5 with a position-gathered logits head.")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--heads", nargs="+", choices=HEADS, default=["logits", "argmax"])
+    parser.add_argument("--top-k", type=int, default=DEFAULT_TOP_K)
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(parser)
+    parser.add_argument("--force", action="store_true", help="Rebuild every artifact, ignoring the export cache.")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    export_step_logits(args.model_id, args.model_dir, args.formats, args.heads, args.encoder_buckets,
+                       args.top_k, args.force)
@@ -2,7 +2,7 @@
 """
 Export T5 tokenizer data for iOS app.
 This script exports:
-1. Enhanced vocabulary with token frequencies and special tokens info
+1. Vocabulary (t5_vocab.json / t5_vocab.bin, through export_vocab.py)
 2. Test cases for validation
 3. Tokenizer configuration
 """
@@ -12,6 +12,8 @@ import os
 from pathlib import Path
 from transformers import AutoTokenizer
 
+from export_vocab import export_vocab
+
 def export_tokenizer_data():
     """Export all tokenizer data needed for iOS app."""
     
@@ -35,32 +37,10 @@ def export_tokenizer_data():
     ios_view_dir = project_root / "iOS" / "T5GrammarCorrection-iOS" / "View"
     ios_view_dir.mkdir(parents=True, exist_ok=True)
     
-    # 1. Export enhanced vocabulary with metadata
-    print("\n1. Exporting enhanced vocabulary...")
-    vocab_data = {
-        "vocab_size": tokenizer.vocab_size,
-        "pad_token_id": int(tokenizer.pad_token_id),
-        "eos_token_id": int(tokenizer.eos_token_id),
-        "unk_token_id": int(tokenizer.unk_token_id),
-        "vocab": {}
-    }
-    
-    vocab_size = tokenizer.vocab_size
-    for i in range(vocab_size):
-        try:
-            token_str = tokenizer.convert_ids_to_tokens(i)
-            vocab_data["vocab"][str(i)] = token_str
-        except:
-            vocab_data["vocab"][str(i)] = f"<unknown_{i}>"
-        
-        if (i + 1) % 5000 == 0:
-            print(f"   Progress: {i + 1}/{vocab_size} tokens...")
-    
+    # 1. Export the vocabulary (t5_vocab.json + t5_vocab.bin); export_vocab.py is its only writer
+    print("\n1. Exporting vocabulary...")
+    export_vocab(model_id, ios_view_dir)
     vocab_file = ios_view_dir / "t5_vocab.json"
-    with open(vocab_file, "w", encoding="utf-8") as f:
-        json.dump(vocab_data, f, ensure_ascii=False, indent=2)
-    print(f"✅ Vocabulary saved to: {vocab_file}")
-    print(f"   File size: {vocab_file.stat().st_size / 1024 / 1024:.2f} MB")
     
     # 2. Export test cases for validation
     print("\n2. Exporting test cases...")
@@ -193,7 +173,7 @@ def export_tokenizer_data():
     print("✅ Tokenizer data export completed!")
     print("="*60)
     print(f"\nExported files:")
-    print(f"  1. {vocab_file.name} - Full vocabulary")
+    print(f"  1. {vocab_file.name} / t5_vocab.bin - Full vocabulary")
     print(f"  2. {test_file.name} - Test cases for validation")
     print(f"  3. {config_file.name} - Tokenizer configuration")
     print(f"  4. {patterns_file.name} - Common token patterns")
@@ -1,121 +1,108 @@
 #!/usr/bin/env python3
 """
-Export T5 tokenizer vocabulary to JSON file for iOS app.
+Export T5 tokenizer vocabulary for the iOS app.
 This script exports the vocabulary from the T5 grammar correction model
-and saves it to the iOS app's View directory.
+and saves it to the iOS app's View directory:
+- t5_vocab.json: {"id": piece} dictionary read by the app's Tokenizer.swift
+- t5_vocab.bin:  memory-mappable binary vocab with unigram scores and a
+                 piece -> id hash table (see binary_vocab.py)
+All pieces are fetched with a single bulk convert_ids_to_tokens call.
 """
 
+import argparse
 import json
-import os
 import sys
+import time
 from pathlib import Path
+
+import numpy as np
 from transformers import AutoTokenizer
 
-def export_vocab():
-    """Export T5 tokenizer vocabulary to JSON file."""
-    
-    # Model ID - same as used in the app
-    model_id = "vennify/t5-base-grammar-correction"
-    
+from binary_vocab import BinaryVocab, tokenizer_normalizes, tokenizer_vocab, write_binary_vocab
+
+MODEL_ID = "vennify/t5-base-grammar-correction"
+OUTPUT_DIR = Path(__file__).parent.parent.parent / "iOS" / "T5GrammarCorrection-iOS" / "View"
+
+
+def compare_load_times(json_path, bin_path, lookups=1000, repeats=5):
+    """Best-of-repeats seconds to load each file and resolve `lookups` random ids."""
+    ids = np.random.default_rng(0).integers(0, 32000, lookups).tolist()
+
+    def load_json():
+        with open(json_path, "r", encoding="utf-8") as f:
+            vocab = {int(k): v for k, v in json.load(f).items()}
+        return [vocab.get(i) for i in ids]
+
+    def load_bin():
+        with BinaryVocab(bin_path) as vocab:
+            return [vocab[i] for i in ids if i < len(vocab)]
+
+    times = []
+    for load in (load_json, load_bin):
+        best = float("inf")
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            load()
+            best = min(best, time.perf_counter() - t0)
+        times.append(best)
+    return times
+
+def export_vocab(model_id=MODEL_ID, output_dir=OUTPUT_DIR):
+    """Export T5 tokenizer vocabulary to JSON and binary files."""
+
     print(f"Loading tokenizer from: {model_id}")
     try:
         tokenizer = AutoTokenizer.from_pretrained(model_id)
         print(f"✅ Tokenizer loaded successfully.")
-        print(f"   Vocab size: {tokenizer.vocab_size}")
+        print(f"   Vocab size: {tokenizer.vocab_size} ({len(tokenizer)} with added tokens)")
     except Exception as e:
         print(f"❌ Failed to load tokenizer: {e}")
         sys.exit(1)
-    
-    # Export vocabulary
+
+    # One bulk call for all ids instead of 32k convert_ids_to_tokens calls
     print("\nExporting vocabulary...")
-    vocab_dict = {}
-    
-    # T5 uses SentencePiece, so we need to iterate through all token IDs
-    vocab_size = tokenizer.vocab_size
-    for i in range(vocab_size):
-        try:
-            # Get token string for this ID
-            token_str = tokenizer.convert_ids_to_tokens(i)
-            vocab_dict[str(i)] = token_str  # Use string key for JSON compatibility
-        except Exception as e:
-            # Skip invalid token IDs
-            print(f"   Warning: Failed to get token for ID {i}: {e}")
-            continue
-        
-        # Progress indicator
-        if (i + 1) % 1000 == 0:
-            print(f"   Progress: {i + 1}/{vocab_size} tokens exported...")
-    
-    print(f"✅ Exported {len(vocab_dict)} tokens.")
-    
-    # Determine output path
-    # Get the script directory
-    script_dir = Path(__file__).parent
-    # Go up to prepare/, then to iOS/View/
-    project_root = script_dir.parent.parent
-    ios_view_dir = project_root / "iOS" / "T5GrammarCorrection-iOS" / "View"
-    
-    # Create directory if it doesn't exist
-    ios_view_dir.mkdir(parents=True, exist_ok=True)
-    
-    output_path = ios_view_dir / "t5_vocab.json"
-    
-    print(f"\nSaving vocabulary to: {output_path}")
+    pieces, scores, kinds = tokenizer_vocab(tokenizer)
+    vocab_dict = {str(i): piece for i, piece in enumerate(pieces[:tokenizer.vocab_size])}
+    print(f"✅ Exported {len(pieces)} tokens.")
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    json_path = output_dir / "t5_vocab.json"
+    bin_path = output_dir / "t5_vocab.bin"
+
+    print(f"\nSaving vocabulary to: {json_path}, {bin_path}")
     try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(vocab_dict, f, ensure_ascii=False, indent=2)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(vocab_dict, f, ensure_ascii=False, separators=(",", ":"))
+        write_binary_vocab(bin_path, pieces, scores, kinds, tokenizer.pad_token_id,
+                           tokenizer.eos_token_id, tokenizer.unk_token_id, tokenizer_normalizes(tokenizer))
         print(f"✅ Vocabulary saved successfully!")
-        print(f"   File size: {output_path.stat().st_size / 1024 / 1024:.2f} MB")
     except Exception as e:
         print(f"❌ Failed to save vocabulary: {e}")
         sys.exit(1)
-    
-    # Verify critical tokens
-    print("\nVerifying critical tokens...")
-    critical_tokens = {
-        "grammar": "grammar",
-        "pad": "<pad>",
-        "eos": "</s>",
-        "unk": "<unk>",
-    }
-    
-    # Also check for tokens with space prefix (T5 SentencePiece format)
-    test_text = "grammar: He go to school"
-    try:
-        encoded = tokenizer(test_text, return_tensors="np", padding=False, truncation=True)
-        token_ids = encoded["input_ids"][0].tolist()
-        print(f"   Test encoding '{test_text}': {token_ids[:10]}...")
-        
-        # Check if we can find "grammar" token
-        for token_id in token_ids[:5]:
-            token_str = tokenizer.convert_ids_to_tokens(int(token_id))
-            if "grammar" in token_str.lower():
-                print(f"   ✅ Found 'grammar' token: ID={token_id}, token='{token_str}'")
-                break
-    except Exception as e:
-        print(f"   Warning: Could not verify encoding: {e}")
-    
-    # Verify the exported file
-    print("\nVerifying exported file...")
-    try:
-        with open(output_path, "r", encoding="utf-8") as f:
-            loaded_vocab = json.load(f)
-        
-        print(f"   ✅ File verification successful!")
-        print(f"   Loaded {len(loaded_vocab)} tokens from file")
-        
-        # Check a few key tokens
-        if "0" in loaded_vocab:
-            print(f"   Token ID 0: '{loaded_vocab['0']}'")
-        if "1" in loaded_vocab:
-            print(f"   Token ID 1: '{loaded_vocab['1']}'")
-        if "2" in loaded_vocab:
-            print(f"   Token ID 2: '{loaded_vocab['2']}'")
-            
-    except Exception as e:
-        print(f"   ❌ File verification failed: {e}")
+
+    # Verify the binary file round-trips every id and piece
+    print("\nVerifying exported files...")
+    with BinaryVocab(bin_path) as vocab:
+        bad_ids = [i for i, piece in enumerate(pieces) if vocab[i] != piece]
+        first_ids = {}
+        for i, piece in enumerate(pieces):
+            first_ids.setdefault(piece, i)
+        bad_pieces = [piece for piece, i in first_ids.items() if vocab.piece_to_id(piece) != i]
+        grammar_id = vocab.piece_to_id("▁grammar")
+    if bad_ids or bad_pieces:
+        print(f"   ❌ {len(bad_ids)} ids / {len(bad_pieces)} pieces do not round-trip through {bin_path.name}")
         sys.exit(1)
-    
+    print(f"   ✅ All {len(pieces)} ids and pieces round-trip through {bin_path.name}")
+    if grammar_id is not None:
+        print(f"   ✅ Found '▁grammar' token: ID={grammar_id}")
+
+    json_s, bin_s = compare_load_times(json_path, bin_path)
+    print(f"\n{'file':<16}{'size (KB)':>12}{'load + 1000 lookups (ms)':>28}")
+    print(f"{json_path.name:<16}{json_path.stat().st_size / 1024:>12.1f}{json_s * 1000:>28.2f}")
+    print(f"{bin_path.name:<16}{bin_path.stat().st_size / 1024:>12.1f}{bin_s * 1000:>28.2f}")
+    print(f"Binary vocab loads {json_s / bin_s:.0f}x faster.")
+
     print("\n" + "="*60)
     print("✅ Vocabulary export completed successfully!")
     print("="*60)
@@ -123,7 +110,7 @@ def export_vocab():
     print(f"1. Open Xcode project")
     print(f"2. Right-click on 'View' folder in T5GrammarCorrection-iOS")
     print(f"3. Select 'Add Files to T5GrammarCorrection-iOS...'")
-    print(f"4. Select the file: {output_path}")
+    print(f"4. Select the file: {json_path}")
     print(f"5. Make sure 'Copy items if needed' is UNCHECKED")
     print(f"6. Make sure 'T5GrammarCorrection-iOS' target is CHECKED")
     print(f"7. Click 'Add'")
@@ -131,4 +118,8 @@ def export_vocab():
     print("="*60)
 
 if __name__ == "__main__":
-    export_vocab()
+    parser = argparse.ArgumentParser(description="Export the T5 vocabulary as JSON and memory-mappable binary.")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--output-dir", default=str(OUTPUT_DIR))
+    args = parser.parse_args()
+    export_vocab(args.model_id, args.output_dir)
@@ -12,28 +12,7 @@ model_id = "vennify/t5-base-grammar-correction"
 print(f"Loading tokenizer: {model_id}")
 try:
     tokenizer = AutoTokenizer.from_pretrained(model_id)
-    
-    # DUMP VOCAB for iOS
-    import json
-    print("Dumping vocabulary to t5_vocab.json...")
-    # T5 uses spiece, so generic get_vocab might not imply order.
-    # Best way: Iterate 0 to vocab_size
-    vocab_size = tokenizer.vocab_size
-    vocab_dict = {}
-    for i in range(vocab_size):
-        # decode single token
-        # This is slow but accurate
-        try:
-           # sp_model.id_to_piece(id) is best if available
-           token_str = tokenizer.convert_ids_to_tokens(i)
-           vocab_dict[i] = token_str
-        except:
-           pass
-           
-    with open("t5_vocab.json", "w") as f:
-        json.dump(vocab_dict, f, ensure_ascii=False)
-    print("Vocab dump complete.")
-    
+    # The iOS vocabulary files (t5_vocab.json / t5_vocab.bin) are written by export_vocab.py
 except Exception as e:
     print(f"Failed to load tokenizer: {e}")
     exit(1)
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Greedy decoding with the encoder / decoder-step graphs of export_kv_cache.py.
+
+The encoder runs once per prompt; every new token is one decoder-step call that
+reads and updates the fixed 128-slot self-attention cache, so a token costs the
+same at step 0 and at step 126. inference_torchscript.py instead re-runs the
+full model (encoder + 128-token decoder buffer) for every token.
+
+Prompts are padded to the smallest exported encoder bucket that holds them
+(encoder_buckets.py); --benchmark pads to a single --encoder-length.
+
+Usage:
+    python inference_kv_cache.py --format onnx --text "grammar: He go to school"
+    python inference_kv_cache.py --format torchscript --benchmark
+"""
+
+import argparse
+import time
+
+import torch
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from encoder_buckets import add_bucket_argument, encode_to_bucket, stateless_path
+from export_kv_cache import (
+    DECODER_LENGTH, DEFAULT_MODEL_DIR, ENCODER_LENGTH, EXTENSIONS, MODEL_ID,
+    T5DecoderStepKV, T5EncoderKV, artifact_paths, empty_self_kv,
+)
+
+BACKENDS = ("eager",) + tuple(EXTENSIONS)
+BENCHMARK_TEXTS = [
+    "grammar: He go to school",
+    "grammar: This sentences has has bads grammar.",
+    "grammar: She don't like apples and he have three cat.",
+    "grammar: Me and him goes to the park yesterday because it were sunny.",
+]
+
+
+# -------------------------------------------------------------------------
+# BACKENDS
+# -------------------------------------------------------------------------
+def load_graph(fmt, path, num_threads=None):
+    """Callable taking/returning torch tensors (always a tuple of outputs). num_threads caps ONNX Runtime intra-op threads."""
+    if fmt == "onnx":
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        sess = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        input_names = [i.name for i in sess.get_inputs()]
+
+        def run(*args):
+            feeds = {name: arg.numpy() for name, arg in zip(input_names, args)}
+            return tuple(torch.from_numpy(out) for out in sess.run(None, feeds))
+        return run
+
+    if fmt == "torchscript":
+        module = torch.jit.load(path)
+        module.eval()
+    elif fmt == "pt2":
+        module = torch.export.load(path).module()
+    else:
+        raise ValueError(f"Unknown format '{fmt}', expected one of {BACKENDS}")
+
+    def run(*args):
+        with torch.no_grad():
+            out = module(*args)
+        return out if isinstance(out, tuple) else (out,)
+    return run
+
+def load_kv_runners(fmt, model_dir=DEFAULT_MODEL_DIR, model_id=MODEL_ID, encoder_length=ENCODER_LENGTH, model=None,
+                    num_threads=None):
+    """(encode, step) callables for an exported format, or for the eager wrappers."""
+    if fmt == "eager":
+        encoder = T5EncoderKV(model).eval()
+        decoder_step = T5DecoderStepKV(model).eval()
+
+        def encode(*args):
+            with torch.no_grad():
+                return (encoder(*args),)
+
+        def step(*args):
+            with torch.no_grad():
+                return decoder_step(*args)
+        return encode, step
+    encoder_path, step_path = artifact_paths(model_dir, fmt, model_id, encoder_length)
+    print(f"Loading {fmt} graphs: {encoder_path}, {step_path}")
+    return load_graph(fmt, encoder_path, num_threads), load_graph(fmt, step_path, num_threads)
+
+def load_full_runner(fmt, model_dir=DEFAULT_MODEL_DIR, model_id=MODEL_ID, encoder_length=ENCODER_LENGTH, model=None):
+    """The stateless (input_ids, attention_mask, decoder_input_ids) -> (logits,) model of export.py."""
+    if fmt == "eager":
+        def run(input_ids, attention_mask, decoder_input_ids):
+            with torch.no_grad():
+                return (model(input_ids=input_ids, attention_mask=attention_mask,
+                              decoder_input_ids=decoder_input_ids).logits,)
+        return run
+    path = stateless_path(model_dir, model_id, EXTENSIONS[fmt], encoder_length)
+    print(f"Loading stateless {fmt} model: {path}")
+    return load_graph(fmt, path)
+
+
+# -------------------------------------------------------------------------
+# GREEDY LOOPS
+# -------------------------------------------------------------------------
+def greedy_decode_kv(encode, step, input_ids, attention_mask, start_token_id, eos_token_id,
+                     decoder_length=DECODER_LENGTH):
+    """Encoder once, then one decoder-step call per token. Returns the generated ids."""
+    cross_kv = encode(input_ids, attention_mask)[0]
+    self_kv = empty_self_kv(cross_kv, decoder_length)
+    token = torch.full((1, 1), start_token_id, dtype=torch.long)
+    generated_ids = []
+    for i in range(decoder_length - 1):
+        logits, self_kv = step(token, torch.tensor([i], dtype=torch.long), self_kv, cross_kv, attention_mask)
+        predicted_id = int(torch.argmax(logits[0]))
+        generated_ids.append(predicted_id)
+        if predicted_id == eos_token_id:
+            break
+        token[0, 0] = predicted_id
+    return generated_ids
+
+def greedy_decode_full(run_full, input_ids, attention_mask, start_token_id, pad_token_id, eos_token_id,
+                       decoder_length=DECODER_LENGTH, id_map=None):
+    """
+    The inference_torchscript.py loop: full model on the whole decoder buffer per token.
+    id_map maps the logits index to the vocabulary id (pruned LM head, pruned_vocab.py).
+    """
+    decoder_input_ids = torch.full((1, decoder_length), pad_token_id, dtype=torch.long)
+    decoder_input_ids[0, 0] = start_token_id
+    generated_ids = []
+    for i in range(decoder_length - 1):
+        logits = run_full(input_ids, attention_mask, decoder_input_ids)[0]
+        predicted_id = torch.argmax(logits[0, i, :])
+        predicted_id = int(id_map[predicted_id] if id_map is not None else predicted_id)
+        decoder_input_ids[0, i + 1] = predicted_id
+        generated_ids.append(predicted_id)
+        if predicted_id == eos_token_id:
+            break
+    return generated_ids
+
+
+# -------------------------------------------------------------------------
+# BENCHMARK
+# -------------------------------------------------------------------------
+def time_loop(decode, prompts, repeats):
+    """Returns (tokens per second, generated ids per prompt)."""
+    outputs = [decode(*prompt) for prompt in prompts]  # warm-up
+    n_tokens = 0
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        for prompt in prompts:
+            n_tokens += len(decode(*prompt))
+    elapsed = time.perf_counter() - t0
+    return n_tokens / elapsed, outputs
+
+def benchmark(tokenizer, encode, step, run_full, texts, repeats, encoder_length, start_token_id):
+    prompts = []
+    for text in texts:
+        inputs = tokenizer(text, return_tensors="pt", max_length=encoder_length, padding="max_length", truncation=True)
+        prompts.append((inputs.input_ids, inputs.attention_mask))
+
+    print(f"\nBenchmarking {len(prompts)} prompts x {repeats} repeats (encoder length {encoder_length})...")
+    kv_rate, kv_outputs = time_loop(
+        lambda ids, mask: greedy_decode_kv(encode, step, ids, mask, start_token_id, tokenizer.eos_token_id),
+        prompts, repeats)
+    full_rate, full_outputs = time_loop(
+        lambda ids, mask: greedy_decode_full(run_full, ids, mask, start_token_id, tokenizer.pad_token_id,
+                                             tokenizer.eos_token_id),
+        prompts, repeats)
+
+    print(f"{'loop':<14}{'tokens/s':>12}{'ms/token':>12}")
+    print(f"{'full buffer':<14}{full_rate:>12.1f}{1000 / full_rate:>12.2f}")
+    print(f"{'kv cache':<14}{kv_rate:>12.1f}{1000 / kv_rate:>12.2f}")
+    print(f"Speedup: {kv_rate / full_rate:.2f}x")
+    mismatches = sum(a != b for a, b in zip(kv_outputs, full_outputs))
+    if mismatches:
+        print(f"❌ {mismatches}/{len(prompts)} prompts decoded differently with the KV cache.")
+    else:
+        print("✅ KV-cache and full-buffer loops produced identical tokens.")
+    return kv_rate, full_rate
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="T5 grammar correction with the encoder / decoder-step KV-cache graphs.")
+    parser.add_argument("--format", choices=BACKENDS, default="torchscript")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(parser)
+    parser.add_argument("--encoder-length", type=int, default=ENCODER_LENGTH, help="Encoder length of --benchmark.")
+    parser.add_argument("--text", default="grammar: He go to school")
+    parser.add_argument("--benchmark", action="store_true", help="Compare tokens/s against the full-buffer loop.")
+    parser.add_argument("--repeats", type=int, default=3)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Loading tokenizer: {args.model_id}")
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    model = None
+    if args.format == "eager":
+        model = AutoModelForSeq2SeqLM.from_pretrained(args.model_id).eval()
+    # T5 starts decoding from the pad token
+    start_token_id = tokenizer.pad_token_id
+
+    if args.benchmark:
+        encode, step = load_kv_runners(args.format, args.model_dir, args.model_id, args.encoder_length, model)
+        run_full = load_full_runner(args.format, args.model_dir, args.model_id, args.encoder_length, model)
+        benchmark(tokenizer, encode, step, run_full, BENCHMARK_TEXTS, args.repeats, args.encoder_length, start_token_id)
+        return
+
+    input_ids, attention_mask, encoder_length = encode_to_bucket(tokenizer, args.text, args.encoder_buckets)
+    print(f"Prompt routed to encoder bucket {encoder_length}")
+    encode, step = load_kv_runners(args.format, args.model_dir, args.model_id, encoder_length, model)
+    t0 = time.perf_counter()
+    generated_ids = greedy_decode_kv(encode, step, input_ids, attention_mask, start_token_id, tokenizer.eos_token_id)
+    elapsed = time.perf_counter() - t0
+    print(f"Generated {len(generated_ids)} tokens in {elapsed * 1000:.1f} ms")
+    print(f"\nFinal Result: '{tokenizer.decode(generated_ids, skip_special_tokens=True)}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Fixed-buffer greedy decoding with the position-gathered heads of export_step_logits.py.
+
+Same loop as inference_torchscript.py (full [1, 128] decoder buffer per step), but
+the model returns only the logits of the current step (head=logits) or the next
+token itself (head=argmax) instead of [1, 128, 32128] logits.
+
+Usage:
+    python inference_step_logits.py --format onnx --head argmax
+    python inference_step_logits.py --format torchscript --benchmark
+"""
+
+import argparse
+import time
+
+import torch
+from transformers import AutoTokenizer
+
+from encoder_buckets import add_bucket_argument, encode_to_bucket
+from export_kv_cache import DECODER_LENGTH, DEFAULT_MODEL_DIR, EXTENSIONS, MODEL_ID
+from export_step_logits import HEADS, artifact_path
+from inference_kv_cache import BENCHMARK_TEXTS, greedy_decode_full, load_full_runner, load_graph
+
+
+def next_token(head, outputs):
+    if head == "argmax":
+        return int(outputs[0][0])
+    if head == "topk":
+        return int(outputs[1][0, 0])
+    return int(torch.argmax(outputs[0][0]))
+
+def greedy_decode_step_head(run, head, input_ids, attention_mask, start_token_id, pad_token_id, eos_token_id,
+                            decoder_length=DECODER_LENGTH):
+    """Fixed-buffer greedy loop; `run` takes the step index as a fourth input."""
+    decoder_input_ids = torch.full((1, decoder_length), pad_token_id, dtype=torch.long)
+    decoder_input_ids[0, 0] = start_token_id
+    generated_ids = []
+    for i in range(decoder_length - 1):
+        predicted_id = next_token(head, run(input_ids, attention_mask, decoder_input_ids,
+                                            torch.tensor([i], dtype=torch.long)))
+        decoder_input_ids[0, i + 1] = predicted_id
+        generated_ids.append(predicted_id)
+        if predicted_id == eos_token_id:
+            break
+    return generated_ids
+
+
+# -------------------------------------------------------------------------
+# BENCHMARK
+# -------------------------------------------------------------------------
+def time_steps(run_step, prompts, repeats):
+    """Median ms per step and output bytes of one step."""
+    output_bytes = sum(out.numel() * out.element_size() for out in run_step(*prompts[0], 0))
+    times = []
+    for _ in range(repeats):
+        for prompt in prompts:
+            for i in (0, 16, 64):
+                t0 = time.perf_counter()
+                run_step(*prompt, i)
+                times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return times[len(times) // 2], output_bytes
+
+def benchmark(tokenizer, fmt, model_dir, model_id, heads, buckets, repeats):
+    start_token_id = tokenizer.pad_token_id
+    # Route all benchmark prompts to the bucket of the longest one
+    prompts, encoder_length = [], None
+    for text in BENCHMARK_TEXTS:
+        encoder_length = max(encoder_length or 0, encode_to_bucket(tokenizer, text, buckets)[2])
+    for text in BENCHMARK_TEXTS:
+        prompts.append(encode_to_bucket(tokenizer, text, [encoder_length])[:2])
+    decoder_input_ids = torch.full((1, DECODER_LENGTH), tokenizer.pad_token_id, dtype=torch.long)
+    decoder_input_ids[0, 0] = start_token_id
+    print(f"\nBenchmarking {len(prompts)} prompts (encoder bucket {encoder_length})...")
+
+    run_full = load_full_runner(fmt, model_dir, model_id, encoder_length)
+    reference = [
+        greedy_decode_full(run_full, ids, mask, start_token_id, tokenizer.pad_token_id, tokenizer.eos_token_id)
+        for ids, mask in prompts
+    ]
+    rows = [("full logits",) + time_steps(
+        lambda ids, mask, i: run_full(ids, mask, decoder_input_ids), prompts, repeats)]
+    mismatched = []
+    for head in heads:
+        run = load_graph(fmt, artifact_path(model_dir, fmt, head, model_id, encoder_length))
+        rows.append((f"step {head}",) + time_steps(
+            lambda ids, mask, i: run(ids, mask, decoder_input_ids, torch.tensor([i], dtype=torch.long)),
+            prompts, repeats))
+        outputs = [
+            greedy_decode_step_head(run, head, ids, mask, start_token_id, tokenizer.pad_token_id,
+                                    tokenizer.eos_token_id)
+            for ids, mask in prompts
+        ]
+        if outputs != reference:
+            mismatched.append(head)
+
+    base_ms = rows[0][1]
+    print(f"{'variant':<14}{'ms/step':>10}{'speedup':>10}{'output bytes':>14}")
+    for name, ms, output_bytes in rows:
+        print(f"{name:<14}{ms:>10.2f}{base_ms / ms:>9.2f}x{output_bytes:>14}")
+    if mismatched:
+        print(f"❌ Heads decoding differently from the full-logits loop: {', '.join(mismatched)}")
+    else:
+        print("✅ All heads produced the same tokens as the full-logits loop.")
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fixed-buffer T5 greedy decoding with a position-gathered head.")
+    parser.add_argument("--format", choices=tuple(EXTENSIONS), default="torchscript")
+    parser.add_argument("--head", choices=HEADS, default="argmax")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(parser)
+    parser.add_argument("--text", default="grammar: He go to school")
+    parser.add_argument("--benchmark", action="store_true", help="Compare per-step latency against the full-logits model.")
+    parser.add_argument("--benchmark-heads", nargs="+", choices=HEADS, default=["logits", "argmax"])
+    parser.add_argument("--repeats", type=int, default=5)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Loading tokenizer: {args.model_id}")
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    if args.benchmark:
+        benchmark(tokenizer, args.format, args.model_dir, args.model_id, args.benchmark_heads,
+                  args.encoder_buckets, args.repeats)
+        return
+
+    input_ids, attention_mask, encoder_length = encode_to_bucket(tokenizer, args.text, args.encoder_buckets)
+    path = artifact_path(args.model_dir, args.format, args.head, args.model_id, encoder_length)
+    print(f"Loading {args.format} {args.head} head: {path}")
+    run = load_graph(args.format, path)
+    t0 = time.perf_counter()
+    generated_ids = greedy_decode_step_head(run, args.head, input_ids, attention_mask, tokenizer.pad_token_id,
+                                            tokenizer.pad_token_id, tokenizer.eos_token_id)
+    elapsed = time.perf_counter() - t0
+    print(f"Generated {len(generated_ids)} tokens in {elapsed * 1000:.1f} ms")
+    print(f"\nFinal Result: '{tokenizer.decode(generated_ids, skip_special_tokens=True)}'")
+
+if __name__ == "__main__":
+    main()
@@ -4,41 +4,42 @@ import numpy as np
 import os
 from transformers import AutoTokenizer
 
-# Paths
+from encoder_buckets import ENCODER_BUCKETS, MAX_ENCODER_LENGTH, encode_to_bucket, stateless_path
+
+# Paths (export.py writes ../model/<name>[-enc<length>].torchscript)
 script_dir = os.path.dirname(os.path.abspath(__file__))
-model_path = os.path.join(script_dir, "vennify_t5-base-grammar-correction.pt")
+model_dir = os.path.join(script_dir, "../model")
 model_id = "vennify/t5-base-grammar-correction"
+model_path = stateless_path(model_dir, model_id, "torchscript")
 
 print(f"Loading tokenizer: {model_id}")
 tokenizer = AutoTokenizer.from_pretrained(model_id)
 
-print(f"Loading TorchScript model: {model_path}")
+# Input text
+text = "grammar: He go to school"
+print(f"\nScanning text: '{text}'")
+
+# Encode input
+# export.py writes one static encoder length per bucket (32 ... 1024): pad the prompt
+# only up to the smallest bucket that holds it. Fall back to the 1024 model when the
+# bucket was not exported.
+input_ids, attention_mask, max_length = encode_to_bucket(tokenizer, text, ENCODER_BUCKETS)
+bucket_model_path = stateless_path(model_dir, model_id, "torchscript", max_length)
+if not os.path.exists(bucket_model_path):
+    print(f"Bucket {max_length} model not found ({bucket_model_path}), padding to {MAX_ENCODER_LENGTH}.")
+    input_ids, attention_mask, max_length = encode_to_bucket(tokenizer, text, [MAX_ENCODER_LENGTH])
+    bucket_model_path = model_path
+
+print(f"Loading TorchScript model: {bucket_model_path}")
 try:
-    model = torch.jit.load(model_path)
+    model = torch.jit.load(bucket_model_path)
     model.eval()
     print("✅ Model loaded successfully.")
 except Exception as e:
     print(f"❌ Failed to load model: {e}")
     exit(1)
 
-# Input text
-text = "grammar: He go to school"
-print(f"\nScanning text: '{text}'")
-
-# Encode input
-# Max length from export was 1024
-max_length = 1024
-inputs = tokenizer(
-    text, 
-    return_tensors="pt", 
-    max_length=max_length, 
-    padding="max_length", 
-    truncation=True
-)
-input_ids = inputs.input_ids
-attention_mask = inputs.attention_mask
-
-print(f"Input shape: {input_ids.shape}")
+print(f"Input shape: {input_ids.shape} (encoder bucket {max_length})")
 
 # Decoder setup
 # The user changed export to use a fixed buffer of 128
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Long-document grammar correction without truncation.
+
+The exports and inference scripts tokenize with truncation=True, max_length=1024,
+so anything past the largest encoder bucket is dropped. The decoder buffer (128
+tokens) is the tighter limit anyway: a correction is about as long as its input,
+so a 1024-token prompt can never be corrected in one pass. This mode:
+1. Splits the document on sentence boundaries (document_corrector.split_sentences)
+   and packs consecutive sentences into chunks of at most --max-chunk-tokens
+   tokens (prefix and EOS included); a chunk never spans a line break, and a
+   single sentence that is too long is split between words
+2. Corrects the chunks with batched inference (batch_correct.BatchCorrector) in a
+   pool of --workers processes, each pinned to cpu_count / workers threads;
+   length-sorted groups of --batch-size chunks are dealt out to the workers
+3. Stitches the corrected chunks back in order with the original whitespace
+
+Usage:
+    python long_document.py --input report.txt --output report.corrected.txt --workers 8
+    python long_document.py --input report.txt --benchmark-workers 1 2 4 8
+"""
+
+import argparse
+import math
+import multiprocessing
+import os
+import time
+
+import torch
+from transformers import AutoTokenizer
+
+from batch_correct import DEFAULT_BATCH_SIZE, PREFIX, BatchCorrector
+from document_corrector import split_sentences
+from encoder_buckets import add_bucket_argument
+from export_kv_cache import DECODER_LENGTH, DEFAULT_MODEL_DIR, MODEL_ID
+from inference_kv_cache import BACKENDS
+
+# Leaves the decoder room for corrections that are longer than their input
+DEFAULT_MAX_CHUNK_TOKENS = DECODER_LENGTH * 3 // 4
+
+
+# -------------------------------------------------------------------------
+# CHUNKING
+# -------------------------------------------------------------------------
+def _split_words(tokenizer, sentence, budget):
+    """Splits an over-long sentence between words into pieces of at most ~budget tokens."""
+    words = sentence.split(" ")
+    lengths = [len(ids) for ids in tokenizer(words, add_special_tokens=False).input_ids]
+    pieces, current, current_tokens = [], [], 0
+    for word, n_tokens in zip(words, lengths):
+        if current and current_tokens + n_tokens > budget:
+            pieces.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(word)
+        current_tokens += n_tokens
+    pieces.append(" ".join(current))
+    return pieces
+
+def chunk_document(tokenizer, text, max_chunk_tokens=DEFAULT_MAX_CHUNK_TOKENS):
+    """[(chunk text, separator)] such that ''.join(chunk + sep) == text (before correction)."""
+    segments = split_sentences(text)
+    if not segments:
+        return []
+    # Prefix + EOS are added to every chunk by the corrector
+    budget = max_chunk_tokens - len(tokenizer(PREFIX).input_ids)
+    lengths = [len(ids) for ids in tokenizer([s for s, _ in segments], add_special_tokens=False).input_ids]
+
+    chunks, current, current_tokens = [], [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            text = "".join(s + sep for s, sep in current[:-1]) + current[-1][0]
+            chunks.append((text, current[-1][1]))
+        current, current_tokens = [], 0
+
+    for (sentence, separator), n_tokens in zip(segments, lengths):
+        if not sentence:
+            flush()
+            chunks.append(("", separator))
+            continue
+        if n_tokens > budget:
+            flush()
+            pieces = _split_words(tokenizer, sentence, budget)
+            chunks.extend((piece, " ") for piece in pieces[:-1])
+            chunks.append((pieces[-1], separator))
+            continue
+        if current and current_tokens + n_tokens > budget:
+            flush()
+        current.append((sentence, separator))
+        current_tokens += n_tokens
+        # T5 drops line breaks, so paragraphs end a chunk
+        if "\n" in separator:
+            flush()
+    flush()
+    return chunks
+
+
+# -------------------------------------------------------------------------
+# WORKER POOL
+# -------------------------------------------------------------------------
+_worker_corrector = None
+
+def _init_worker(fmt, model_dir, model_id, buckets, batch_size, num_threads):
+    global _worker_corrector
+    torch.set_num_threads(num_threads)
+    _worker_corrector = BatchCorrector(fmt, model_dir, model_id, buckets, batch_size, num_threads=num_threads)
+
+def _correct_group(group):
+    rows, texts = group
+    return rows, _worker_corrector.correct(texts)
+
+
+class ParallelCorrector:
+    """BatchCorrector in `workers` processes (in-process when workers == 1)."""
+
+    def __init__(self, fmt="onnx", model_dir=DEFAULT_MODEL_DIR, model_id=MODEL_ID, buckets=None,
+                 batch_size=DEFAULT_BATCH_SIZE, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.num_threads = max(1, (os.cpu_count() or 1) // self.workers)
+        init_args = (fmt, model_dir, model_id, buckets, batch_size, self.num_threads)
+        if self.workers == 1:
+            self.pool = None
+            self.corrector = BatchCorrector(*init_args[:5])
+        else:
+            # spawn: forking a process that already holds torch / ORT thread pools is unsafe
+            context = multiprocessing.get_context("spawn")
+            self.pool = context.Pool(self.workers, initializer=_init_worker, initargs=init_args)
+
+    def correct(self, texts):
+        """Corrected text per input text (input order)."""
+        if self.pool is None:
+            return self.corrector.correct(texts)
+        # Length-sorted groups keep every batch in (nearly) one encoder bucket; groups are
+        # capped at an even share per worker, so a 40-chunk document still uses every process
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        group_size = max(1, min(self.batch_size, math.ceil(len(order) / self.workers)))
+        groups = []
+        for start in range(0, len(order), group_size):
+            rows = order[start:start + group_size]
+            groups.append((rows, [texts[i] for i in rows]))
+        outputs = [None] * len(texts)
+        for rows, corrected in self.pool.imap_unordered(_correct_group, groups):
+            for row, text in zip(rows, corrected):
+                outputs[row] = text
+        return outputs
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def correct_document(corrector, tokenizer, document, max_chunk_tokens=DEFAULT_MAX_CHUNK_TOKENS):
+    """Returns (corrected document, number of chunks corrected)."""
+    chunks = chunk_document(tokenizer, document, max_chunk_tokens)
+    rows = [i for i, (text, _) in enumerate(chunks) if text.strip()]
+    corrected = dict(zip(rows, corrector.correct([chunks[i][0] for i in rows])))
+    stitched = "".join(corrected.get(i, text) + separator for i, (text, separator) in enumerate(chunks))
+    return stitched, len(rows)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Chunked, multi-process T5 grammar correction of long documents.")
+    parser.add_argument("--input", required=True)
+    parser.add_argument("--output", default=None, help="Corrected document (default: stdout).")
+    parser.add_argument("--format", choices=BACKENDS, default="onnx")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-chunk-tokens", type=int, default=DEFAULT_MAX_CHUNK_TOKENS,
+                        help=f"Tokens per chunk, prefix and EOS included (default: {DEFAULT_MAX_CHUNK_TOKENS}).")
+    add_bucket_argument(parser)
+    parser.add_argument("--benchmark-workers", type=int, nargs="+", default=None,
+                        help="Time the document with each worker count (speedup relative to the first one).")
+    return parser.parse_args(argv)
+
+def run(args, document, tokenizer, workers):
+    with ParallelCorrector(args.format, args.model_dir, args.model_id, args.encoder_buckets,
+                           args.batch_size, workers) as corrector:
+        # Warm-up: worker start-up and graph loading are not part of the throughput
+        corrector.correct(["Warm up."] * corrector.workers)
+        t0 = time.perf_counter()
+        corrected, n_chunks = correct_document(corrector, tokenizer, document, args.max_chunk_tokens)
+        return corrected, n_chunks, time.perf_counter() - t0
+
+def main(argv=None):
+    args = parse_args(argv)
+    with open(args.input, "r", encoding="utf-8") as f:
+        document = f.read()
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    n_tokens = len(tokenizer(document).input_ids)
+
+    if args.benchmark_workers:
+        print(f"{'workers':>8}{'seconds':>10}{'chunks/s':>10}{'speedup':>9}")
+        outputs, base_s = [], None
+        for workers in args.benchmark_workers:
+            corrected, n_chunks, elapsed = run(args, document, tokenizer, workers)
+            base_s = base_s or elapsed
+            print(f"{workers:>8}{elapsed:>10.2f}{n_chunks / elapsed:>10.1f}{base_s / elapsed:>8.2f}x")
+            outputs.append(corrected)
+        if all(output == outputs[0] for output in outputs):
+            print("✅ Identical output for every worker count.")
+        else:
+            print("❌ The output depends on the worker count.")
+        return
+
+    corrected, n_chunks, elapsed = run(args, document, tokenizer, args.workers)
+    print(f"✅ {n_tokens} tokens in {n_chunks} chunks corrected in {elapsed:.2f}s "
+          f"({args.workers} workers, {n_chunks / elapsed:.1f} chunks/s)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(corrected)
+        print(f"Corrected document saved to {args.output}")
+    else:
+        print(corrected)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Pruned output vocabulary for the T5 grammar correction LM head.
+
+The model projects to the full 32128-piece SentencePiece vocabulary on every step,
+but English grammar correction only emits a small subset of it. This module:
+1. mine:     builds a token whitelist from a corpus (one sentence per line): the
+             special tokens, the pieces of every input sentence (also capitalized
+             and lowercased), common punctuation and, with --with-model-outputs,
+             every piece the full model generates for the corpus
+2. export:   PrunedVocabWrapper is the stateless fixed-buffer model with the LM head
+             reduced to the whitelist rows; export.py / export_coreml_fixed.py take
+             --vocab-whitelist and write {safe_name}-vocab<K> artifacts
+3. evaluate: greedy-decodes a held-out corpus with the full and the pruned model
+             (reduced ids are mapped back through the whitelist) and reports the
+             exact-match rate, step latency and logits size
+
+Usage:
+    python pruned_vocab.py mine --corpus tickets.txt --output ../model/vocab_whitelist.json --with-model-outputs
+    python export.py --vocab-whitelist ../model/vocab_whitelist.json
+    python pruned_vocab.py evaluate --whitelist ../model/vocab_whitelist.json --corpus heldout.txt --format onnx
+"""
+
+import argparse
+import json
+import os
+import time
+
+import torch
+import torch.nn as nn
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from encoder_buckets import add_bucket_argument, encode_to_bucket, stateless_path
+from export_kv_cache import DECODER_LENGTH, DEFAULT_MODEL_DIR, EXTENSIONS, MODEL_ID, decoder_output_scale
+from inference_kv_cache import greedy_decode_full, load_full_runner, load_graph
+
+PREFIX = "grammar: "
+PUNCTUATION = ". , ! ? ; : ' \" ( ) - ... n't 's"
+
+
+# -------------------------------------------------------------------------
+# WHITELIST
+# -------------------------------------------------------------------------
+def mine_whitelist(tokenizer, texts, model=None, batch_size=16, max_new_tokens=127):
+    """Sorted token ids that the corrections of texts can use."""
+    ids = set(tokenizer.all_special_ids)
+    ids.update(tokenizer(PUNCTUATION).input_ids)
+    for text in texts:
+        for variant in (text, text.lower(), text[:1].upper() + text[1:]):
+            ids.update(tokenizer(PREFIX + variant).input_ids)
+    if model is not None:
+        for start in range(0, len(texts), batch_size):
+            batch = [PREFIX + text for text in texts[start:start + batch_size]]
+            inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True, max_length=1024)
+            with torch.no_grad():
+                outputs = model.generate(**inputs, max_new_tokens=max_new_tokens, do_sample=False, num_beams=1)
+            ids.update(outputs.flatten().tolist())
+    return sorted(ids)
+
+def save_whitelist(path, ids, model_id, vocab_size):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"model_id": model_id, "vocab_size": vocab_size, "ids": ids}, f)
+
+def load_whitelist(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["ids"]
+
+def pruned_suffix(ids):
+    return f"-vocab{len(ids)}"
+
+
+# -------------------------------------------------------------------------
+# WRAPPER
+# -------------------------------------------------------------------------
+class PrunedVocabWrapper(nn.Module):
+    """Stateless fixed-buffer T5 returning logits over the whitelist only: (logits [B, T, K],)."""
+
+    def __init__(self, model, vocab_ids):
+        super().__init__()
+        self.model = model
+        self.output_scale = decoder_output_scale(model.config)
+        weight = model.lm_head.weight.detach()[torch.tensor(vocab_ids, dtype=torch.long)]
+        self.pruned_head = nn.Linear(weight.shape[1], weight.shape[0], bias=False)
+        self.pruned_head.weight = nn.Parameter(weight.clone(), requires_grad=False)
+
+    def forward(self, input_ids, attention_mask, decoder_input_ids):
+        encoder_hidden = self.model.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+        hidden = self.model.decoder(
+            input_ids=decoder_input_ids,
+            encoder_hidden_states=encoder_hidden,
+            encoder_attention_mask=attention_mask,
+        ).last_hidden_state
+        return (self.pruned_head(hidden * self.output_scale),)
+
+
+# -------------------------------------------------------------------------
+# EVALUATION
+# -------------------------------------------------------------------------
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+def evaluate(tokenizer, texts, ids, fmt, model_dir, model_id, buckets, model=None):
+    id_map = torch.tensor(ids, dtype=torch.long)
+    runners = {}
+
+    def bucket_runners(encoder_length):
+        if encoder_length not in runners:
+            if fmt == "eager":
+                pruned = PrunedVocabWrapper(model, ids).eval()
+
+                def run_pruned(*args):
+                    with torch.no_grad():
+                        return pruned(*args)
+            else:
+                path = stateless_path(model_dir, model_id, EXTENSIONS[fmt], encoder_length, pruned_suffix(ids))
+                print(f"Loading pruned {fmt} model: {path}")
+                run_pruned = load_graph(fmt, path)
+            runners[encoder_length] = load_full_runner(fmt, model_dir, model_id, encoder_length, model), run_pruned
+        return runners[encoder_length]
+
+    start_token_id = tokenizer.pad_token_id
+    exact, full_s, pruned_s, full_steps, pruned_steps = 0, 0.0, 0.0, 0, 0
+    for text in texts:
+        input_ids, attention_mask, encoder_length = encode_to_bucket(tokenizer, PREFIX + text, buckets)
+        run_full, run_pruned = bucket_runners(encoder_length)
+        t0 = time.perf_counter()
+        full_ids = greedy_decode_full(run_full, input_ids, attention_mask, start_token_id,
+                                      tokenizer.pad_token_id, tokenizer.eos_token_id)
+        full_s += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        pruned_ids = greedy_decode_full(run_pruned, input_ids, attention_mask, start_token_id,
+                                        tokenizer.pad_token_id, tokenizer.eos_token_id, id_map=id_map)
+        pruned_s += time.perf_counter() - t0
+        full_steps += len(full_ids)
+        pruned_steps += len(pruned_ids)
+        if full_ids == pruned_ids:
+            exact += 1
+        else:
+            print(f"  differs: '{tokenizer.decode(full_ids, skip_special_tokens=True)}' -> "
+                  f"'{tokenizer.decode(pruned_ids, skip_special_tokens=True)}'")
+
+    vocab_size = model.config.vocab_size if model is not None else len(tokenizer)
+    print(f"\nWhitelist: {len(ids)} / {vocab_size} tokens ({len(ids) / vocab_size:.1%} of the LM head)")
+    print(f"{'model':<10}{'ms/step':>10}{'logits bytes/step':>20}")
+    print(f"{'full':<10}{full_s * 1000 / full_steps:>10.2f}{DECODER_LENGTH * vocab_size * 4:>20}")
+    print(f"{'pruned':<10}{pruned_s * 1000 / pruned_steps:>10.2f}{DECODER_LENGTH * len(ids) * 4:>20}")
+    rate = exact / len(texts)
+    print(f"Exact match vs full vocab: {exact}/{len(texts)} ({rate:.1%})")
+    return rate
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mine a vocabulary whitelist and evaluate the pruned T5 LM head.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    mine = subparsers.add_parser("mine", help="Build a token whitelist from a corpus.")
+    mine.add_argument("--corpus", required=True, help="Text file, one sentence per line.")
+    mine.add_argument("--output", default=os.path.join(DEFAULT_MODEL_DIR, "vocab_whitelist.json"))
+    mine.add_argument("--with-model-outputs", action="store_true",
+                      help="Also whitelist every token the full model generates for the corpus.")
+    mine.add_argument("--model-id", default=MODEL_ID)
+
+    evaluation = subparsers.add_parser("evaluate", help="Exact-match rate of the pruned head vs the full vocab.")
+    evaluation.add_argument("--whitelist", required=True)
+    evaluation.add_argument("--corpus", required=True, help="Held-out text file, one sentence per line.")
+    evaluation.add_argument("--format", choices=("eager",) + tuple(EXTENSIONS), default="onnx")
+    evaluation.add_argument("--model-id", default=MODEL_ID)
+    evaluation.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(evaluation)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    texts = read_lines(args.corpus)
+
+    if args.command == "mine":
+        model = None
+        if args.with_model_outputs:
+            model = AutoModelForSeq2SeqLM.from_pretrained(args.model_id).eval()
+        ids = mine_whitelist(tokenizer, texts, model)
+        vocab_size = model.config.vocab_size if model is not None else len(tokenizer)
+        save_whitelist(args.output, ids, args.model_id, vocab_size)
+        print(f"✅ Whitelist of {len(ids)} tokens mined from {len(texts)} sentences, saved to {args.output}")
+        return
+
+    ids = load_whitelist(args.whitelist)
+    model = AutoModelForSeq2SeqLM.from_pretrained(args.model_id).eval()
+    evaluate(tokenizer, texts, ids, args.format, args.model_dir, args.model_id, args.encoder_buckets, model)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Prompt-lookup speculative decoding on the fixed 128-token decoder buffer.
+
+A grammar correction is mostly a copy of its input ("He go to school yesterday"
+-> "He went to school yesterday."), but the greedy loops produce one token per
+full forward pass. Here every pass:
+1. Drafts up to --max-draft tokens: the longest suffix n-gram of the output so far
+   is looked up in the input ids, and the tokens that follow it there are proposed
+2. Writes the draft into the decoder buffer after the last accepted token and runs
+   the stateless model once; the logits at positions pos .. pos+k are the greedy
+   predictions for every draft position (the decoder is causal, so a position only
+   sees the accepted tokens and the draft tokens before it)
+3. Accepts the longest prefix of the draft that matches those predictions, plus the
+   model's own token at the first mismatch
+
+The output is identical to greedy decoding; only the number of forward passes changes.
+
+Usage:
+    python speculative_decode.py --format onnx --text "grammar: He go to school yesterday"
+    python speculative_decode.py --format torchscript --benchmark
+"""
+
+import argparse
+import time
+
+import torch
+from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+from encoder_buckets import add_bucket_argument, encode_to_bucket
+from export_kv_cache import DECODER_LENGTH, DEFAULT_MODEL_DIR, MODEL_ID
+from inference_kv_cache import BACKENDS, BENCHMARK_TEXTS, greedy_decode_full, load_full_runner
+
+DEFAULT_MAX_DRAFT = 8
+DEFAULT_MAX_NGRAM = 3
+
+
+def find_draft(context_ids, generated_ids, max_ngram=DEFAULT_MAX_NGRAM, max_draft=DEFAULT_MAX_DRAFT):
+    """Tokens that follow the longest suffix n-gram of generated_ids in context_ids ([] when none)."""
+    for n in range(min(max_ngram, len(generated_ids)), 0, -1):
+        suffix = generated_ids[-n:]
+        for start in range(len(context_ids) - n):
+            if context_ids[start:start + n] == suffix:
+                return context_ids[start + n:start + n + max_draft]
+    return []
+
+def speculative_decode(run_full, input_ids, attention_mask, start_token_id, pad_token_id, eos_token_id,
+                       decoder_length=DECODER_LENGTH, max_ngram=DEFAULT_MAX_NGRAM, max_draft=DEFAULT_MAX_DRAFT):
+    """
+    Greedy-equivalent decoding with prompt-lookup drafts. Returns (generated ids, stats)
+    with stats = {forward_passes, drafted, accepted}.
+    """
+    context_ids = input_ids[0, attention_mask[0].bool()].tolist()
+    decoder_input_ids = torch.full((1, decoder_length), pad_token_id, dtype=torch.long)
+    decoder_input_ids[0, 0] = start_token_id
+    max_tokens = decoder_length - 1
+    generated_ids = []
+    stats = {"forward_passes": 0, "drafted": 0, "accepted": 0}
+
+    while len(generated_ids) < max_tokens:
+        pos = len(generated_ids)  # decoder_input_ids[0, pos] is the last accepted token
+        # Leave room for the model's own token after the draft
+        draft = find_draft(context_ids, generated_ids, max_ngram, max_draft)[:max_tokens - pos - 1]
+        if draft:
+            decoder_input_ids[0, pos + 1:pos + 1 + len(draft)] = torch.tensor(draft, dtype=torch.long)
+        logits = run_full(input_ids, attention_mask, decoder_input_ids)[0]
+        predictions = torch.argmax(logits[0, pos:pos + len(draft) + 1], dim=-1).tolist()
+        stats["forward_passes"] += 1
+        stats["drafted"] += len(draft)
+
+        finished = False
+        for j, predicted_id in enumerate(predictions):
+            generated_ids.append(predicted_id)
+            decoder_input_ids[0, pos + 1 + j] = predicted_id
+            if predicted_id == eos_token_id:
+                finished = True
+                break
+            if j == len(draft) or predicted_id != draft[j]:
+                break
+            stats["accepted"] += 1
+        # Clear the rejected part of the draft
+        decoder_input_ids[0, len(generated_ids) + 1:] = pad_token_id
+        if finished:
+            break
+    return generated_ids, stats
+
+
+# -------------------------------------------------------------------------
+# BENCHMARK
+# -------------------------------------------------------------------------
+def benchmark(tokenizer, run_for_bucket, texts, buckets, max_ngram, max_draft):
+    start_token_id = tokenizer.pad_token_id
+    totals = {"tokens": 0, "greedy_passes": 0, "greedy_s": 0.0, "spec_s": 0.0,
+              "forward_passes": 0, "drafted": 0, "accepted": 0}
+    mismatches = 0
+    for text in texts:
+        input_ids, attention_mask, encoder_length = encode_to_bucket(tokenizer, text, buckets)
+        run_full = run_for_bucket(encoder_length)
+
+        t0 = time.perf_counter()
+        greedy_ids = greedy_decode_full(run_full, input_ids, attention_mask, start_token_id,
+                                        tokenizer.pad_token_id, tokenizer.eos_token_id)
+        totals["greedy_s"] += time.perf_counter() - t0
+        t0 = time.perf_counter()
+        spec_ids, stats = speculative_decode(run_full, input_ids, attention_mask, start_token_id,
+                                             tokenizer.pad_token_id, tokenizer.eos_token_id,
+                                             max_ngram=max_ngram, max_draft=max_draft)
+        totals["spec_s"] += time.perf_counter() - t0
+
+        totals["tokens"] += len(greedy_ids)
+        totals["greedy_passes"] += len(greedy_ids)
+        for key in ("forward_passes", "drafted", "accepted"):
+            totals[key] += stats[key]
+        mismatches += spec_ids != greedy_ids
+        print(f"  {stats['forward_passes']:>4} passes for {len(spec_ids):>4} tokens: "
+              f"'{tokenizer.decode(spec_ids, skip_special_tokens=True)}'")
+
+    tokens = totals["tokens"]
+    print(f"\n{'loop':<14}{'passes/token':>14}{'tokens/s':>12}")
+    print(f"{'greedy':<14}{totals['greedy_passes'] / tokens:>14.3f}{tokens / totals['greedy_s']:>12.1f}")
+    print(f"{'speculative':<14}{totals['forward_passes'] / tokens:>14.3f}{tokens / totals['spec_s']:>12.1f}")
+    acceptance = totals["accepted"] / totals["drafted"] if totals["drafted"] else 0.0
+    print(f"Draft acceptance: {totals['accepted']}/{totals['drafted']} ({acceptance:.1%}), "
+          f"speedup {totals['greedy_s'] / totals['spec_s']:.2f}x")
+    if mismatches:
+        print(f"❌ {mismatches}/{len(texts)} prompts decoded differently from greedy.")
+    else:
+        print("✅ Speculative decoding produced the greedy output for every prompt.")
+    return totals
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prompt-lookup speculative decoding for T5 grammar correction.")
+    parser.add_argument("--format", choices=BACKENDS, default="torchscript")
+    parser.add_argument("--model-id", default=MODEL_ID)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    add_bucket_argument(parser)
+    parser.add_argument("--max-draft", type=int, default=DEFAULT_MAX_DRAFT)
+    parser.add_argument("--max-ngram", type=int, default=DEFAULT_MAX_NGRAM)
+    parser.add_argument("--text", default="grammar: He go to school yesterday")
+    parser.add_argument("--benchmark", action="store_true", help="Forward passes per token against plain greedy.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Loading tokenizer: {args.model_id}")
+    tokenizer = AutoTokenizer.from_pretrained(args.model_id)
+    model = AutoModelForSeq2SeqLM.from_pretrained(args.model_id).eval() if args.format == "eager" else None
+    runners = {}
+
+    def run_for_bucket(encoder_length):
+        if encoder_length not in runners:
+            runners[encoder_length] = load_full_runner(args.format, args.model_dir, args.model_id, encoder_length, model)
+        return runners[encoder_length]
+
+    if args.benchmark:
+        benchmark(tokenizer, run_for_bucket, BENCHMARK_TEXTS, args.encoder_buckets, args.max_ngram, args.max_draft)
+        return
+
+    input_ids, attention_mask, encoder_length = encode_to_bucket(tokenizer, args.text, args.encoder_buckets)
+    t0 = time.perf_counter()
+    generated_ids, stats = speculative_decode(run_for_bucket(encoder_length), input_ids, attention_mask,
+                                              tokenizer.pad_token_id, tokenizer.pad_token_id, tokenizer.eos_token_id,
+                                              max_ngram=args.max_ngram, max_draft=args.max_draft)
+    elapsed = time.perf_counter() - t0
+    print(f"Generated {len(generated_ids)} tokens in {stats['forward_passes']} forward passes "
+          f"({elapsed * 1000:.1f} ms, {stats['accepted']}/{stats['drafted']} draft tokens accepted)")
+    print(f"\nFinal Result: '{tokenizer.decode(generated_ids, skip_special_tokens=True)}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+"""
+Reference SentencePiece unigram tokenizer for T5, built from t5_vocab.bin.
+
+export_tokenizer_data.py only writes ids for 14 hard-coded strings, so the app
+tokenizers (Tokenizer.swift / Tokenizer.kt) have no high-volume reference. This
+is a pure-Python / NumPy re-implementation of the Hugging Face T5 pipeline that
+produces the same ids:
+1. Added tokens (<pad>, </s>, <unk>, <extra_id_N>) are split out first
+2. Normalization: NFKC when the exported tokenizer normalizes (FLAG_NFKC); this
+   approximates the nmt_nfkc charsmap of the T5 SentencePiece model, and `verify`
+   shows any line where the two differ
+3. Pre-tokenization: split on whitespace, prefix every word with '▁' and split
+   again before every '▁' (Metaspace)
+4. Each word is segmented with Viterbi over a double-array trie of the vocab
+   pieces. Ties keep the earliest-starting piece, characters without a
+   single-character piece become <unk> with score min_score - 10, and runs of
+   <unk> are fused, all as in tokenizers' Unigram model. Word segmentations are
+   memoized
+5. </s> is appended (add_special_tokens)
+
+Usage:
+    python unigram_tokenizer.py encode --text "grammar: He go to school"
+    python unigram_tokenizer.py golden --corpus corpus.txt --output golden.jsonl --workers 8
+    python unigram_tokenizer.py golden --corpus corpus.txt --output tokenizer_test_cases.json
+    python unigram_tokenizer.py verify --corpus corpus.txt --model-id vennify/t5-base-grammar-correction
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import time
+import unicodedata
+
+import numpy as np
+
+from binary_vocab import FLAG_NFKC, KIND_NORMAL, BinaryVocab
+
+DEFAULT_VOCAB = os.path.join(os.path.dirname(__file__), "..", "..", "iOS", "T5GrammarCorrection-iOS", "View",
+                             "t5_vocab.bin")
+SPACE = "▁"
+UNK_PENALTY = 10.0
+
+
+# -------------------------------------------------------------------------
+# DOUBLE-ARRAY TRIE
+# -------------------------------------------------------------------------
+class DoubleArrayTrie:
+    """
+    Double-array trie over piece characters: child of state s on code c is
+    t = base[s] + c if check[t] == s; value[t] is the id of the piece ending there.
+    """
+
+    def __init__(self, pieces_and_ids):
+        pieces_and_ids = list(pieces_and_ids)
+        # Frequent characters get small codes, so sibling sets are dense and pack tightly
+        counts = {}
+        for piece, _ in pieces_and_ids:
+            for ch in piece:
+                counts[ch] = counts.get(ch, 0) + 1
+        self.codes = {ch: code for code, ch in enumerate(sorted(counts, key=counts.get, reverse=True), start=1)}
+
+        root = {}
+        for piece, token_id in pieces_and_ids:
+            node = root
+            for ch in piece:
+                node = node.setdefault(self.codes[ch], {})
+            node.setdefault(None, token_id)
+
+        # Free slots form a circular doubly linked list (slot 0, the root, is the sentinel),
+        # so the first-fit search only visits free slots
+        base, check, value = [0], [0], [-1]
+        next_free, prev_free = [0], [0]
+
+        def grow(size):
+            for slot in range(len(check), size):
+                base.append(0)
+                check.append(-1)
+                value.append(-1)
+                last = prev_free[0]
+                next_free.append(0)
+                prev_free.append(last)
+                next_free[last] = slot
+                prev_free[0] = slot
+
+        def occupy(slot):
+            next_free[prev_free[slot]] = next_free[slot]
+            prev_free[next_free[slot]] = prev_free[slot]
+
+        queue = [(root, 0)]
+        for node, state in queue:
+            if None in node:
+                value[state] = node[None]
+            children = sorted(code for code in node if code is not None)
+            if not children:
+                continue
+            slot = next_free[0]
+            while True:
+                if slot == 0:
+                    # No free slot fits: append room after the end of the array
+                    slot = len(check)
+                    grow(slot + children[-1] - children[0] + 1)
+                b = slot - children[0]
+                if b >= 1:
+                    if b + children[-1] >= len(check):
+                        grow(b + children[-1] + 1)
+                    if all(check[b + code] == -1 for code in children):
+                        break
+                slot = next_free[slot]
+            base[state] = b
+            for code in children:
+                check[b + code] = state
+                occupy(b + code)
+                queue.append((node[code], b + code))
+
+        self.n_states = len(queue)
+        # Plain lists: per-element access from the Viterbi loop is much faster than on numpy arrays
+        self.base = np.asarray(base, dtype=np.int32).tolist()
+        self.check = check
+        self.value = value
+
+    def prefixes(self, text, start):
+        """(end, id) for every piece that is a prefix of text[start:], shortest first."""
+        base, check, value, codes = self.base, self.check, self.value, self.codes
+        size = len(check)
+        state = 0
+        for end in range(start, len(text)):
+            code = codes.get(text[end])
+            if code is None:
+                return
+            t = base[state] + code
+            if t >= size or check[t] != state:
+                return
+            state = t
+            if value[state] >= 0:
+                yield end + 1, value[state]
+
+
+# -------------------------------------------------------------------------
+# TOKENIZER
+# -------------------------------------------------------------------------
+class UnigramTokenizer:
+    def __init__(self, vocab_path=DEFAULT_VOCAB):
+        with BinaryVocab(vocab_path) as vocab:
+            pieces = [vocab[i] for i in range(len(vocab))]
+            scores = vocab.scores.copy()
+            kinds = vocab.kinds.copy()
+            self.eos_token_id = vocab.eos_token_id
+            self.unk_token_id = vocab.unk_token_id
+            self.nfkc = bool(vocab.flags & FLAG_NFKC)
+        self.pieces = pieces
+        self.scores = scores.tolist()
+        normal = kinds == KIND_NORMAL
+        self.unk_score = float(scores[normal].min()) - UNK_PENALTY
+        self.trie = DoubleArrayTrie((pieces[i], i) for i in np.nonzero(normal)[0].tolist())
+
+        special = {pieces[i]: i for i in np.nonzero(kinds != KIND_NORMAL)[0].tolist()}
+        self.special_ids = special
+        self._special_re = re.compile("|".join(map(re.escape, sorted(special, key=len, reverse=True))))
+        self._cache = {}
+
+    def _viterbi(self, word):
+        n = len(word)
+        best = [float("-inf")] * (n + 1)
+        back = [None] * (n + 1)
+        best[0] = 0.0
+        scores, unk_score, unk_id = self.scores, self.unk_score, self.unk_token_id
+        for start in range(n):
+            score_here = best[start]
+            if score_here == float("-inf"):
+                continue
+            has_single = False
+            for end, token_id in self.trie.prefixes(word, start):
+                if end == start + 1:
+                    has_single = True
+                score = score_here + scores[token_id]
+                if score > best[end]:
+                    best[end], back[end] = score, (start, token_id)
+            if not has_single:
+                score = score_here + unk_score
+                if score > best[start + 1]:
+                    best[start + 1], back[start + 1] = score, (start, unk_id)
+
+        ids, pos = [], n
+        while pos > 0:
+            start, token_id = back[pos]
+            # Consecutive unknown characters become a single <unk>
+            if not (token_id == unk_id and ids and ids[-1] == unk_id):
+                ids.append(token_id)
+            pos = start
+        ids.reverse()
+        return ids
+
+    def _encode_word(self, word):
+        ids = self._cache.get(word)
+        if ids is None:
+            ids = self._cache[word] = self._viterbi(word)
+        return ids
+
+    def _encode_text(self, text, ids):
+        if self.nfkc:
+            text = unicodedata.normalize("NFKC", text)
+        for word in text.split():
+            if not word.startswith(SPACE):
+                word = SPACE + word
+            for part in word.split(SPACE)[1:]:
+                ids.extend(self._encode_word(SPACE + part))
+
+    def encode(self, text, add_special_tokens=True):
+        ids, pos = [], 0
+        if self.special_ids:
+            for match in self._special_re.finditer(text):
+                self._encode_text(text[pos:match.start()], ids)
+                ids.append(self.special_ids[match.group()])
+                pos = match.end()
+        self._encode_text(text[pos:], ids)
+        if add_special_tokens:
+            ids.append(self.eos_token_id)
+        return ids
+
+    def convert_ids_to_tokens(self, ids):
+        return [self.pieces[i] for i in ids]
+
+
+# -------------------------------------------------------------------------
+# GOLDEN VECTORS
+# -------------------------------------------------------------------------
+_worker_tokenizer = None
+
+def _init_worker(vocab_path):
+    global _worker_tokenizer
+    _worker_tokenizer = UnigramTokenizer(vocab_path)
+
+def _encode_lines(args):
+    lines, add_special_tokens = args
+    return [_worker_tokenizer.encode(line, add_special_tokens) for line in lines]
+
+def iter_golden(vocab_path, lines, add_special_tokens=True, workers=1, chunk_lines=2000, tokenizer=None):
+    """Yields the ids of every line, in order; workers > 1 encodes chunks in a process pool."""
+    if workers <= 1:
+        tokenizer = tokenizer or UnigramTokenizer(vocab_path)
+        for line in lines:
+            yield tokenizer.encode(line, add_special_tokens)
+        return
+    chunks = (lines[i:i + chunk_lines] for i in range(0, len(lines), chunk_lines))
+    with multiprocessing.get_context("spawn").Pool(workers, _init_worker, (vocab_path,)) as pool:
+        for chunk_ids in pool.imap(_encode_lines, ((chunk, add_special_tokens) for chunk in chunks)):
+            yield from chunk_ids
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.rstrip("\n") for line in f]
+
+def write_golden(path, lines, ids_iter, tokenizer=None):
+    """JSONL ({"text", "ids"} per line), or tokenizer_test_cases.json layout for a .json path."""
+    if path.endswith(".json"):
+        cases = {}
+        for text, ids in zip(lines, ids_iter):
+            cases[text] = {"ids": ids, "tokens": tokenizer.convert_ids_to_tokens(ids)}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cases, f, indent=2, ensure_ascii=False)
+        return len(cases)
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for text, ids in zip(lines, ids_iter):
+            f.write(json.dumps({"text": text, "ids": ids}, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+def verify(vocab_path, lines, model_id, add_special_tokens=True):
+    """Compares the ids with the Hugging Face tokenizer and reports both throughputs."""
+    from transformers import AutoTokenizer
+
+    hf_tokenizer = AutoTokenizer.from_pretrained(model_id)
+    t0 = time.perf_counter()
+    expected = hf_tokenizer(lines, add_special_tokens=add_special_tokens).input_ids
+    hf_s = time.perf_counter() - t0
+    sample = lines[:min(len(lines), 2000)]
+    t0 = time.perf_counter()
+    for line in sample:
+        hf_tokenizer(line, add_special_tokens=add_special_tokens)
+    hf_single_s = (time.perf_counter() - t0) * len(lines) / max(len(sample), 1)
+
+    t0 = time.perf_counter()
+    tokenizer = UnigramTokenizer(vocab_path)
+    load_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    actual = [tokenizer.encode(line, add_special_tokens) for line in lines]
+    ours_s = time.perf_counter() - t0
+
+    mismatches = [i for i, (a, b) in enumerate(zip(actual, expected)) if a != b]
+    print(f"Tokenizer load: {load_s * 1000:.0f} ms (trie of {tokenizer.trie.n_states} states)")
+    print(f"{'tokenizer':<28}{'lines/s':>12}")
+    print(f"{'HF, one line per call':<28}{len(lines) / hf_single_s:>12.0f}")
+    print(f"{'HF, batched':<28}{len(lines) / hf_s:>12.0f}")
+    print(f"{'unigram_tokenizer.py':<28}{len(lines) / ours_s:>12.0f}")
+    for i in mismatches[:10]:
+        print(f"  ❌ {lines[i]!r}\n     HF:   {expected[i]}\n     ours: {actual[i]}")
+    if mismatches:
+        print(f"❌ {len(mismatches)}/{len(lines)} lines differ from the HF tokenizer.")
+    else:
+        print(f"✅ Identical ids for all {len(lines)} lines.")
+    return not mismatches
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Reference T5 unigram tokenizer and golden id vectors.")
+    parser.add_argument("--vocab", default=DEFAULT_VOCAB, help="t5_vocab.bin written by export_vocab.py.")
+    parser.add_argument("--no-special-tokens", action="store_true", help="Do not append </s>.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    encode = subparsers.add_parser("encode", help="Print the ids and pieces of one text.")
+    encode.add_argument("--text", required=True)
+
+    golden = subparsers.add_parser("golden", help="Write golden id vectors for a corpus (one text per line).")
+    golden.add_argument("--corpus", required=True)
+    golden.add_argument("--output", required=True, help=".jsonl, or .json for the tokenizer_test_cases.json layout.")
+    golden.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+
+    check = subparsers.add_parser("verify", help="Compare against the Hugging Face tokenizer.")
+    check.add_argument("--corpus", required=True)
+    check.add_argument("--model-id", default="vennify/t5-base-grammar-correction")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    add_special_tokens = not args.no_special_tokens
+
+    if args.command == "encode":
+        tokenizer = UnigramTokenizer(args.vocab)
+        ids = tokenizer.encode(args.text, add_special_tokens)
+        print(f"ids:    {ids}")
+        print(f"tokens: {tokenizer.convert_ids_to_tokens(ids)}")
+        return
+
+    lines = read_lines(args.corpus)
+    if args.command == "verify":
+        verify(args.vocab, lines, args.model_id, add_special_tokens)
+        return
+
+    t0 = time.perf_counter()
+    tokenizer = UnigramTokenizer(args.vocab) if args.output.endswith(".json") else None
+    workers = 1 if tokenizer is not None else args.workers
+    ids_iter = iter_golden(args.vocab, lines, add_special_tokens, workers, tokenizer=tokenizer)
+    count = write_golden(args.output, lines, ids_iter, tokenizer)
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {count} golden id vectors written to {args.output} in {elapsed:.1f}s ({count / elapsed:.0f} lines/s)")
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,18 @@
+import argparse
 import coremltools as ct
 import numpy as np
 import os
 
-def run_verification():
-    model_path = "apps/t5_base_grammar_correction/iOS/vennify_t5-base-grammar-correction_stateless1024.mlpackage"
-    print(f"Loading model: {model_path}")
-    
-    try:
-        model = ct.models.MLModel(model_path)
-    except Exception as e:
-        print(f"Failed to load model: {e}")
-        return
+from encoder_buckets import ENCODER_BUCKETS, MAX_ENCODER_LENGTH, coreml_fixed_path, select_bucket
 
-    print("Model loaded.")
-    
+MODEL_ID = "vennify/t5-base-grammar-correction"
+
+def run_verification(model_dir=""):
     # --- FULL GENERATION LOOP ---
     from transformers import AutoTokenizer
     
     try:
-        tokenizer = AutoTokenizer.from_pretrained("vennify/t5-base-grammar-correction")
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_ID)
     except:
         print("Transformers/Tokenizer not found or failed to load. Cannot verify text output without it.")
         return
@@ -26,12 +20,28 @@ def run_verification():
     text = "He go to school yesterday"
     print(f"\n--- Generating for: '{text}' ---")
     
-    # 1. Prepare Encoder Input (Fixed 1024)
+    # 1. Prepare Encoder Input (smallest fixed bucket that holds the prompt, up to 1024)
     input_text = "grammar: " + text
-    enc = tokenizer(input_text, return_tensors="np")
+    enc = tokenizer(input_text, return_tensors="np", max_length=MAX_ENCODER_LENGTH, truncation=True)
     original_input_ids = enc["input_ids"]
     
-    input_len = 1024
+    input_len = select_bucket(original_input_ids.shape[1], ENCODER_BUCKETS)
+    # One fixed-shape package per encoder bucket, named like export_coreml_fixed.py writes them
+    model_path = coreml_fixed_path(model_dir, MODEL_ID, input_len)
+    if not os.path.exists(model_path):
+        print(f"Bucket {input_len} package not found ({model_path}), padding to {MAX_ENCODER_LENGTH}.")
+        input_len = MAX_ENCODER_LENGTH
+        model_path = coreml_fixed_path(model_dir, MODEL_ID, input_len)
+    print(f"Loading model: {model_path}")
+    
+    try:
+        model = ct.models.MLModel(model_path)
+    except Exception as e:
+        print(f"Failed to load model: {e}")
+        return
+
+    print("Model loaded.")
+    
     input_ids = np.zeros((1, input_len), dtype=np.int32)
     current_len = original_input_ids.shape[1]
     input_ids[0, :current_len] = original_input_ids
@@ -105,4 +115,8 @@ def run_verification():
         print(f"⚠️ Result differs from expected '{expected}'. Check model weights.")
 
 if __name__ == "__main__":
-    run_verification()
+    parser = argparse.ArgumentParser(description="Greedy generation with the fixed-shape Core ML packages.")
+    parser.add_argument("--model-dir", default="",
+                        help="Directory of the packages (default: the working directory export_coreml_fixed.py wrote to).")
+    args = parser.parse_args()
+    run_verification(args.model_dir)
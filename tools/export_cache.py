@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Incremental export cache for the prepare scripts.
+
+Export scripts download, trace and re-serialize their model on every run. ExportCache
+keys each output artifact (.pt / .pt2 / .onnx / .npy / .mlpackage) on
+  - the model weights digest (weight, config and tokenizer files of the snapshot),
+  - the wrapper/patch source,
+  - the export settings (opset, shapes, dtype, ...),
+  - the torch/onnx/... versions,
+and skips an export when the artifact on disk was produced with the same key.
+Every run writes export_manifest.json next to the artifacts, listing which
+artifacts were reused and which were rebuilt.
+
+This is the one copy shared by the apps' prepare scripts; they add tools/ to sys.path
+before importing it.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from importlib import metadata
+
+MANIFEST_NAME = "export_manifest.json"
+_CHUNK_SIZE = 1 << 20
+_WEIGHT_SUFFIXES = (".safetensors", ".bin", ".json", ".model", ".txt")
+
+
+def library_versions(*names):
+    """Installed distribution versions (None when missing)."""
+    versions = {}
+    for name in names:
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+def source_digest(*items):
+    """sha256 of source files (str paths) and/or functions and classes (inspect.getsource)."""
+    digest = hashlib.sha256()
+    for item in items:
+        if isinstance(item, str):
+            with open(item, "rb") as f:
+                digest.update(f.read())
+        else:
+            digest.update(inspect.getsource(item).encode("utf-8"))
+    return digest.hexdigest()
+
+def _path_size(path):
+    """Size of a file, or total size of a directory artifact such as an .mlpackage."""
+    if os.path.isdir(path):
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(path) for name in files
+        )
+    return os.path.getsize(path)
+
+
+class ExportCache:
+    def __init__(self, output_dir, force=False):
+        self.output_dir = output_dir
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self.force = force
+        self.reused = []
+        self.rebuilt = []
+        self.manifest = {"artifacts": {}, "file_digests": {}}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path, "r", encoding="utf-8") as f:
+                    self.manifest.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"[Cache] Ignoring unreadable manifest {self.manifest_path}: {e}")
+
+    def _entry_name(self, path):
+        return os.path.relpath(os.path.abspath(path), os.path.abspath(self.output_dir))
+
+    # --- key parts ---
+    def file_digest(self, path):
+        """sha256 of a file, memoized in the manifest by (size, mtime) so large weights hash once."""
+        real_path = os.path.realpath(path)
+        stat = os.stat(real_path)
+        memo = self.manifest["file_digests"].get(real_path)
+        if memo and memo["size"] == stat.st_size and memo["mtime_ns"] == stat.st_mtime_ns:
+            return memo["sha256"]
+        digest = hashlib.sha256()
+        with open(real_path, "rb") as f:
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        self.manifest["file_digests"][real_path] = {
+            "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest(),
+        }
+        return digest.hexdigest()
+
+    def weights_digest(self, model_id):
+        """
+        Digest of a local model directory or of the cached Hugging Face snapshot.
+        Returns None when the model is not available locally yet (cache miss).
+        """
+        model_dir = model_id
+        if not os.path.isdir(model_dir):
+            try:
+                from huggingface_hub import snapshot_download
+                model_dir = snapshot_download(model_id, local_files_only=True)
+            except Exception:
+                return None
+        digest = hashlib.sha256()
+        for root, _, files in sorted(os.walk(model_dir)):
+            for name in sorted(files):
+                if name.endswith(_WEIGHT_SUFFIXES):
+                    digest.update(name.encode("utf-8"))
+                    digest.update(self.file_digest(os.path.join(root, name)).encode("utf-8"))
+        return digest.hexdigest()
+
+    def key(self, **parts):
+        """Artifact key from JSON-serializable parts. None if any part is None (unknown)."""
+        if any(value is None for value in parts.values()):
+            return None
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    # --- artifacts ---
+    def is_fresh(self, path, key):
+        if self.force or key is None or not os.path.exists(path):
+            return False
+        entry = self.manifest["artifacts"].get(self._entry_name(path))
+        return entry is not None and entry["key"] == key and entry["size"] == _path_size(path)
+
+    def reuse(self, path, key):
+        """True (and recorded as reused) when the artifact on disk matches key."""
+        if not self.is_fresh(path, key):
+            return False
+        self.reused.append(self._entry_name(path))
+        print(f"[Cache] Reusing {path}")
+        return True
+
+    def record(self, path, key):
+        """Records a freshly built artifact. Call only after it was written (and verified)."""
+        name = self._entry_name(path)
+        self.manifest["artifacts"][name] = {"key": key, "size": _path_size(path), "built_at": time.time()}
+        self.rebuilt.append(name)
+
+    def write_manifest(self):
+        self.manifest["last_run"] = {"time": time.time(), "reused": self.reused, "rebuilt": self.rebuilt}
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+        print(f"[Cache] {len(self.reused)} artifact(s) reused, {len(self.rebuilt)} rebuilt "
+              f"(manifest: {self.manifest_path})")